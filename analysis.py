@@ -8,22 +8,82 @@ This module implements the empirical testing loop:
   4. Run ablation studies
   5. Compare performance
 
-Requires: numpy, pandas, scikit-learn (optional: xgboost, lightgbm)
+Requires: numpy (optional: scikit-learn, lightgbm as model backends; see
+model_backends.py)
 """
 
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Callable, Iterable, Iterator, Union
+from concurrent.futures import ThreadPoolExecutor
+import os
 import numpy as np
 from dataclasses import dataclass
 
 from data_schema import Dataset, Pair
 from base_model import CompatibilityModel
+from quantile_sketch import KLLSketch, SketchView
+from model_backends import ModelBackend, RidgeBackend, get_backend
+from metrics import (
+    regression_scores,
+    confusion_matrices,
+    classification_scores,
+    average_precision,
+    best_f1_thresholds,
+    prevalence_thresholds,
+    precision_recall,
+    pr_auc,
+    f1_threshold,
+)
+from ridge import (
+    DEFAULT_ALPHA,
+    DEFAULT_ALPHA_GRID,
+    GramAccumulator,
+    pair_key,
+    hash_test_mask,
+    hash_folds,
+    permutation_gains,
+    permutation_p_value,
+    with_intercept,
+    ridge_solve,
+    regression_metrics,
+    gcv_scores,
+    select_alpha_gcv,
+    resolve_alpha,
+)
 
 
 @dataclass
 class DecisionThresholds:
     """Thresholds for KEEP/DISCARD decisions"""
     r2_min_delta_keep: float = 0.001  # 0.1% R² improvement
-    f1_min_delta_keep: float = 0.0   # F1 improvement (can be tuned)
+    f1_min_delta_keep: float = 0.005  # F1 improvement at the tuned soulmate threshold (can be tuned)
+    max_p_value: Optional[float] = None  # If set, KEEP iff permutation p-value <= this (when available)
+
+
+def meets_keep_thresholds(
+    delta_r2: np.ndarray,
+    delta_f1: np.ndarray,
+    r2_min_delta_keep: np.ndarray,
+    f1_min_delta_keep: np.ndarray,
+) -> np.ndarray:
+    """
+    KEEP rule for ΔR²/ΔF1 against the comparison model, broadcast over
+    arrays of deltas and thresholds (NaN ΔF1 = no classification metrics),
+    so a whole threshold grid can be decided at once.
+    """
+    delta_r2 = np.asarray(delta_r2, dtype=float)
+    delta_f1 = np.asarray(delta_f1, dtype=float)
+    r2_min_delta_keep = np.asarray(r2_min_delta_keep, dtype=float)
+    
+    # KEEP if R² improvement meets threshold OR F1 improvement meets threshold
+    # CRITICAL: delta_r2 must be POSITIVE (improvement, not degradation)
+    r2_meets_threshold = (delta_r2 > 0) & (delta_r2 >= r2_min_delta_keep)
+    f1_meets_threshold = (delta_f1 > 0) & (delta_f1 >= f1_min_delta_keep)
+    
+    # For very low thresholds, be more lenient with positive improvements:
+    # accept positive improvements even if slightly below threshold
+    lenient = (r2_min_delta_keep < 0.0005) & (delta_r2 > 0) & (delta_r2 >= r2_min_delta_keep * 0.3)
+    
+    return r2_meets_threshold | lenient | f1_meets_threshold
 
 
 @dataclass
@@ -43,6 +103,123 @@ class ModelResults:
     classification_f1: Optional[float] = None
     classification_predictions: Optional[np.ndarray] = None
     classification_actual: Optional[np.ndarray] = None
+    classification_threshold: Optional[float] = None
+    classification_pr_auc: Optional[float] = None
+    # Permutation test of the theory features against the baseline
+    permutation_p_value: Optional[float] = None
+    # Ridge penalty used (differs from the default when chosen by GCV)
+    ridge_alpha: Optional[float] = None
+    # Model backend and its timings
+    backend: Optional[str] = None
+    fit_seconds: Optional[float] = None
+    predict_seconds: Optional[float] = None
+
+
+def set_classification_metrics(result: ModelResults, tp: float, fp: float, fn: float, tn: float) -> None:
+    """Fill accuracy/precision/recall/F1 on `result` from confusion counts"""
+    scores = classification_scores([tp, fp, fn, tn])
+    result.classification_accuracy = float(scores["accuracy"])
+    result.classification_precision = float(scores["precision"])
+    result.classification_recall = float(scores["recall"])
+    result.classification_f1 = float(scores["f1"])
+
+
+def set_model_info(result: ModelResults, model: ModelBackend) -> None:
+    """Record which backend produced `result` and how long it took"""
+    result.backend = model.name
+    result.fit_seconds = model.fit_seconds
+    result.predict_seconds = model.predict_seconds
+    result.ridge_alpha = getattr(model, "alpha_", None)
+
+
+# How the soulmate decision threshold on S_hat is chosen:
+#   "f1"         - maximize F1 on the training fold
+#   "prevalence" - flag the same share of pairs as are soulmates in the training fold
+#   "median"     - split test predictions at their median (the original rule)
+THRESHOLD_METHODS = ("f1", "prevalence", "median")
+DEFAULT_THRESHOLD_METHOD = "f1"
+
+
+def classification_threshold(
+    train_scores: np.ndarray,
+    train_labels: np.ndarray,
+    method: str = DEFAULT_THRESHOLD_METHOD,
+) -> Optional[np.ndarray]:
+    """
+    Decision threshold on S_hat chosen on the training fold (see
+    THRESHOLD_METHODS), one per row for a (n_models, n_train) batch of
+    training predictions. None for "median", which is taken on the test
+    predictions instead.
+    """
+    if method not in THRESHOLD_METHODS:
+        raise ValueError(f"Unknown threshold method {method!r}; expected one of {THRESHOLD_METHODS}")
+    if method == "median":
+        return None
+    if method == "prevalence":
+        return prevalence_thresholds(train_scores, float(np.mean(train_labels)) if len(train_labels) else 0.0)
+    return best_f1_thresholds(train_scores, train_labels)
+
+
+def evaluate_prediction_batch(
+    model_names: List[str],
+    y_test: np.ndarray,
+    y_pred: np.ndarray,
+    y_class_test: Optional[np.ndarray] = None,
+    thresholds: Optional[np.ndarray] = None,
+) -> List[ModelResults]:
+    """
+    evaluate_predictions for several models' predictions on the same test
+    rows, `y_pred` of shape (n_models, n_test), with all metrics computed
+    for the whole batch at once (see metrics.py).
+    """
+    y_pred = np.atleast_2d(y_pred)
+    regression = regression_scores(y_test, y_pred)
+    results = [
+        ModelResults(
+            model_name=name,
+            r2_score=float(regression["r2"][i]),
+            mse=float(regression["mse"][i]),
+            mae=float(regression["mae"][i]),
+            predictions=y_pred[i],
+            actual=y_test,
+        )
+        for i, name in enumerate(model_names)
+    ]
+    
+    if y_class_test is not None:
+        if thresholds is None:
+            thresholds = np.median(y_pred, axis=1)
+        thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), (len(y_pred),))
+        y_class_pred = (y_pred >= thresholds[:, None]).astype(int)
+        scores = classification_scores(confusion_matrices(y_class_test, y_class_pred))
+        pr_aucs = average_precision(y_pred, y_class_test)
+        for i, result in enumerate(results):
+            result.classification_accuracy = float(scores["accuracy"][i])
+            result.classification_precision = float(scores["precision"][i])
+            result.classification_recall = float(scores["recall"][i])
+            result.classification_f1 = float(scores["f1"][i])
+            result.classification_predictions = y_class_pred[i]
+            result.classification_actual = y_class_test
+            result.classification_threshold = float(thresholds[i])
+            result.classification_pr_auc = float(pr_aucs[i])
+    
+    return results
+
+
+def evaluate_predictions(
+    model_name: str,
+    y_test: np.ndarray,
+    y_pred: np.ndarray,
+    y_class_test: Optional[np.ndarray] = None,
+    threshold: Optional[float] = None,
+) -> ModelResults:
+    """
+    Regression metrics for test predictions, plus classification metrics
+    against soulmate flags when `y_class_test` is given: predictions at or
+    above `threshold` (default: their median) are flagged, and PR-AUC is
+    computed from the raw predictions.
+    """
+    return evaluate_prediction_batch([model_name], y_test, y_pred, y_class_test, threshold)[0]
 
 
 class FeatureExtractor:
@@ -57,10 +234,14 @@ class FeatureExtractor:
         self,
         include_numerology: bool = False,
         include_astrology: bool = False,
+        feature_names: Optional[List[str]] = None,
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Extract feature matrix X and target vector y from dataset.
         
+        Pass `feature_names` to fix the columns (e.g. to keep chunks of one
+        dataset aligned); otherwise they are taken from the first pair.
+        
         Returns:
             X: (n_samples, n_features) feature matrix
             y: (n_samples,) target vector (S scores)
@@ -68,7 +249,7 @@ class FeatureExtractor:
         """
         features_list = []
         y_list = []
-        feature_names = []
+        feature_names = list(feature_names) if feature_names else []
         
         for pair in self.dataset.pairs:
             pair_features = self.dataset.get_pair_features(
@@ -151,172 +332,141 @@ class FeatureExtractor:
         )
 
 
-class ModelComparator:
+# (key, model name, include_numerology, include_astrology) per ablation configuration
+ABLATION_CONFIGS = (
+    ("baseline", "Baseline (32D V + 7D R)", False, False),
+    ("baseline_numerology", "Baseline + Numerology", True, False),
+    ("baseline_astrology", "Baseline + Astrology", False, True),
+    ("baseline_all", "Baseline + Numerology + Astrology", True, True),
+)
+
+# Targets of the multi-output study: the soulmate score and the six Y outcomes
+OUTCOME_NAMES = (
+    "S",
+    "y1_longevity",
+    "y2_satisfaction",
+    "y3_growth",
+    "y4_conflict_toxicity",
+    "y5_repair_efficiency",
+    "y6_trajectory_alignment",
+)
+
+# Configuration key -> key in get_structured_results output
+STRUCTURED_KEYS = {
+    "baseline": "baseline",
+    "baseline_numerology": "num",
+    "baseline_astrology": "astro",
+    "baseline_all": "astro_num",
+}
+
+
+# Rank half-width of the sketch bracket resolved exactly for the median threshold
+MEDIAN_BRACKET = 0.02
+
+# Sketch size for out-of-core F1/prevalence thresholds and PR-AUC. Negatives
+# outnumber soulmates ~9:1, so their rank error (~1.7 / k) is amplified in
+# precision; k = 4000 keeps that near 0.4%
+THRESHOLD_SKETCH_K = 4000
+
+
+def _count_at_least(view: SketchView, thresholds: np.ndarray) -> np.ndarray:
+    """Sketched number of values >= each threshold"""
+    cum_weights = np.concatenate([[0.0], view.cum_weights])
+    return view.total - cum_weights[np.searchsorted(np.asarray(view.values), thresholds, side="left")]
+
+
+def sketch_precision_recall_curve(
+    positives: KLLSketch, negatives: KLLSketch
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Compares model performance with and without theory-derived features.
+    Approximate metrics.precision_recall_curve from sketches of the scores of
+    positive and negative examples, evaluated at every retained value.
     """
+    pos, neg = positives.view(), negatives.view()
+    thresholds = np.unique(np.concatenate([pos.values, neg.values]))[::-1]
+    return precision_recall(
+        thresholds, _count_at_least(pos, thresholds), _count_at_least(neg, thresholds), pos.total
+    )
+
+
+def sketch_classification_threshold(positives: KLLSketch, negatives: KLLSketch, method: str) -> float:
+    """classification_threshold ("f1" or "prevalence") from per-label score sketches"""
+    if method == "prevalence":
+        if not positives.count:
+            return np.inf
+        scores = KLLSketch(positives.k)
+        scores.merge(positives)
+        scores.merge(negatives)
+        return scores.quantile(1.0 - positives.count / scores.count)
+    return f1_threshold(*sketch_precision_recall_curve(positives, negatives))
+
+
+def iter_pair_chunks(dataset: Dataset, chunk_size: int = 10000) -> Iterator[Dataset]:
+    """Datasets of at most `chunk_size` pairs each, sharing `dataset`'s persons"""
+    for start in range(0, len(dataset.pairs), chunk_size):
+        chunk = Dataset()
+        chunk.persons = dataset.persons
+        chunk.pairs = dataset.pairs[start:start + chunk_size]
+        yield chunk
+
+
+def config_columns(dataset: Dataset) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    Feature names of the full configuration (baseline + numerology +
+    astrology), and each configuration's columns within it.
     
-    def __init__(self, extractor: FeatureExtractor):
-        self.extractor = extractor
+    Every configuration's features are a subset of the full one, so features
+    can be extracted once and sliced. Names come from the first pair, and
+    configurations that add no features to the baseline are left out (as in
+    compare_models).
+    """
+    probe = Dataset()
+    probe.persons = dataset.persons
+    probe.pairs = dataset.pairs[:1]
+    extractor = FeatureExtractor(probe)
     
-    def compare_models(
-        self,
-        test_size: float = 0.2,
-        random_state: int = 42,
-        include_classification: bool = True,
-    ) -> Dict[str, ModelResults]:
-        """
-        Compare baseline vs numerology vs astrology vs all features.
-        
-        Returns dictionary of ModelResults for each configuration.
-        """
-        results = {}
-        
-        # Extract classification targets if available
-        y_classification = None
-        if include_classification:
-            flags = []
-            for pair in self.extractor.dataset.pairs:
-                flags.append(pair.soulmate_flag if pair.soulmate_flag is not None else 0)
-            y_classification = np.array(flags)
-        
-        # Baseline (V + R only)
-        X_baseline, y, feature_names_baseline = self.extractor.extract_baseline_features()
-        results["baseline"] = self._train_and_evaluate(
-            "Baseline (32D V + 7D R)",
-            X_baseline,
-            y,
-            y_classification=y_classification,
-            test_size=test_size,
-            random_state=random_state,
+    _, _, all_names = extractor.extract_with_all()
+    index = {name: i for i, name in enumerate(all_names)}
+    columns = {}
+    for key, _, include_numerology, include_astrology in ABLATION_CONFIGS:
+        _, _, names = extractor.extract_features(
+            include_numerology=include_numerology,
+            include_astrology=include_astrology,
         )
-        
-        # Baseline + Numerology
-        X_num, y_num, feature_names_num = self.extractor.extract_with_numerology()
-        if X_num.shape[1] > X_baseline.shape[1]:  # Only if numerology features added
-            results["baseline_numerology"] = self._train_and_evaluate(
-                "Baseline + Numerology",
-                X_num,
-                y_num,
-                y_classification=y_classification,
-                test_size=test_size,
-                random_state=random_state,
-            )
-        
-        # Baseline + Astrology
-        X_ast, y_ast, feature_names_ast = self.extractor.extract_with_astrology()
-        if X_ast.shape[1] > X_baseline.shape[1]:  # Only if astrology features added
-            results["baseline_astrology"] = self._train_and_evaluate(
-                "Baseline + Astrology",
-                X_ast,
-                y_ast,
-                y_classification=y_classification,
-                test_size=test_size,
-                random_state=random_state,
-            )
-        
-        # Baseline + All
-        X_all, y_all, feature_names_all = self.extractor.extract_with_all()
-        if X_all.shape[1] > X_baseline.shape[1]:  # Only if additional features added
-            results["baseline_all"] = self._train_and_evaluate(
-                "Baseline + Numerology + Astrology",
-                X_all,
-                y_all,
-                y_classification=y_classification,
-                test_size=test_size,
-                random_state=random_state,
-            )
-        
-        return results
+        columns[key] = np.array([index[name] for name in names], dtype=int)
     
-    def _train_and_evaluate(
-        self,
-        model_name: str,
-        X: np.ndarray,
-        y: np.ndarray,
-        y_classification: Optional[np.ndarray] = None,
-        test_size: float = 0.2,
-        random_state: int = 42,
-    ) -> ModelResults:
-        """
-        Train a simple linear regression model and evaluate.
-        
-        In production, you'd use scikit-learn, but this is a minimal implementation
-        that works without external dependencies.
-        """
-        # Simple train/test split
-        np.random.seed(random_state)
-        n_samples = len(y)
-        n_test = int(n_samples * test_size)
-        indices = np.random.permutation(n_samples)
-        test_indices = indices[:n_test]
-        train_indices = indices[n_test:]
-        
-        X_train, X_test = X[train_indices], X[test_indices]
-        y_train, y_test = y[train_indices], y[test_indices]
-        
-        # Use Ridge regression to avoid overfitting
-        # Add intercept term
-        X_train_with_intercept = np.column_stack([np.ones(len(X_train)), X_train])
-        X_test_with_intercept = np.column_stack([np.ones(len(X_test)), X_test])
-        
-        # Ridge regression: (X^T X + alpha*I)^(-1) X^T y
-        alpha = 0.1  # Regularization strength
-        try:
-            n_features = X_train_with_intercept.shape[1]
-            ridge_matrix = X_train_with_intercept.T @ X_train_with_intercept + alpha * np.eye(n_features)
-            coeffs = np.linalg.solve(ridge_matrix, X_train_with_intercept.T @ y_train)
-            y_pred = X_test_with_intercept @ coeffs
-        except np.linalg.LinAlgError:
-            # Fallback if singular matrix
-            y_pred = np.full_like(y_test, np.mean(y_train))
-        
-        # Compute metrics
-        mse = np.mean((y_test - y_pred) ** 2)
-        mae = np.mean(np.abs(y_test - y_pred))
-        
-        # R² score
-        ss_res = np.sum((y_test - y_pred) ** 2)
-        ss_tot = np.sum((y_test - np.mean(y_test)) ** 2)
-        r2 = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0.0
-        
-        result = ModelResults(
-            model_name=model_name,
-            r2_score=r2,
-            mse=mse,
-            mae=mae,
-            predictions=y_pred,
-            actual=y_test,
-        )
-        
-        # Add classification metrics if y_classification provided
-        if y_classification is not None:
-            y_class_train = y_classification[train_indices]
-            y_class_test = y_classification[test_indices]
-            
-            # Use regression predictions to classify (threshold at median)
-            threshold = np.median(y_pred)
-            y_class_pred = (y_pred >= threshold).astype(int)
-            
-            # Compute classification metrics
-            tp = np.sum((y_class_pred == 1) & (y_class_test == 1))
-            fp = np.sum((y_class_pred == 1) & (y_class_test == 0))
-            fn = np.sum((y_class_pred == 0) & (y_class_test == 1))
-            tn = np.sum((y_class_pred == 0) & (y_class_test == 0))
-            
-            accuracy = (tp + tn) / len(y_class_test) if len(y_class_test) > 0 else 0.0
-            precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
-            recall = tp / (tp + fn) if (tp + fn) > 0 else 0.0
-            f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0.0
-            
-            result.classification_accuracy = accuracy
-            result.classification_precision = precision
-            result.classification_recall = recall
-            result.classification_f1 = f1
-            result.classification_predictions = y_class_pred
-            result.classification_actual = y_class_test
-        
-        return result
+    n_baseline = len(columns["baseline"])
+    return all_names, {key: cols for key, cols in columns.items() if key == "baseline" or len(cols) > n_baseline}
+
+
+class ComparisonReport:
+    """Printing and decisions over comparison results, shared by the comparators"""
+    
+    def print_outcomes(self, outcome_results: Dict[str, Any]):
+        """Print per-outcome R² for the baseline and deltas for each theory set"""
+        print("=" * 80)
+        print("PER-OUTCOME R² (baseline) AND DELTAS")
+        print("=" * 80)
+        keys = list(outcome_results["delta_r2"])
+        print(f"{'outcome':<26}{'baseline':>10}" + "".join(f"{STRUCTURED_KEYS[key]:>12}" for key in keys))
+        for name in outcome_results["outcomes"]:
+            row = f"{name:<26}{outcome_results['r2']['baseline'][name]:>10.4f}"
+            row += "".join(f"{outcome_results['delta_r2'][key][name]:>+12.4f}" for key in keys)
+            print(row)
+        print()
+    
+    def print_cv_summary(self, fold_results: Dict[str, List[ModelResults]]):
+        """Print mean ± stdev of per-fold deltas against the baseline"""
+        summary = cv_delta_summary(fold_results)
+        n_folds = len(fold_results.get("baseline", []))
+        print("=" * 80)
+        print(f"CROSS-VALIDATION ({n_folds} folds): delta vs baseline, mean ± stdev")
+        print("=" * 80)
+        for key, stats in summary.items():
+            print(f"{fold_results[key][0].model_name}:")
+            print(f"  ΔR²: {stats['delta_r2_mean']:+.4f} ± {stats['delta_r2_std']:.4f}")
+            print(f"  ΔF1: {stats['delta_f1_mean']:+.4f} ± {stats['delta_f1_std']:.4f}")
+        print()
     
     def print_comparison(self, results: Dict[str, ModelResults]):
         """Print comparison of model results"""
@@ -337,6 +487,12 @@ class ModelComparator:
                 print(f"  Improvement over baseline: {improvement:+.4f} ({improvement_pct:+.2f}%)")
             print(f"  MSE: {result.mse:.4f}")
             print(f"  MAE: {result.mae:.4f}")
+            if result.classification_f1 is not None:
+                print(f"  Soulmate F1: {result.classification_f1:.4f} (threshold {result.classification_threshold:.4f})")
+            if result.classification_pr_auc is not None:
+                print(f"  Soulmate PR-AUC: {result.classification_pr_auc:.4f}")
+            if result.fit_seconds is not None:
+                print(f"  Fit/predict ({result.backend}): {result.fit_seconds:.3f}s / {result.predict_seconds:.3f}s")
             print()
         
         # Determine if numerology/astrology should be kept
@@ -384,6 +540,10 @@ class ModelComparator:
             if result is None:
                 return False
             
+            # A permutation test, when run, replaces the raw delta thresholds
+            if thresholds.max_p_value is not None and result.permutation_p_value is not None:
+                return result.permutation_p_value <= thresholds.max_p_value
+            
             # For numerology, also check if it adds value beyond astrology
             if not compare_to_baseline and ast_result:
                 # Compare numerology to astrology baseline
@@ -395,23 +555,11 @@ class ModelComparator:
                 compare_f1 = baseline_f1
             
             delta_r2 = result.r2_score - compare_r2
-            delta_f1 = (result.classification_f1 or 0.0) - compare_f1
+            delta_f1 = result.classification_f1 - compare_f1 if result.classification_f1 is not None else np.nan
             
-            # KEEP if R² improvement meets threshold OR F1 improvement meets threshold
-            # CRITICAL: delta_r2 must be POSITIVE (improvement, not degradation)
-            r2_meets_threshold = delta_r2 > 0 and delta_r2 >= thresholds.r2_min_delta_keep
-            f1_meets_threshold = (
-                delta_f1 > 0 and  # F1 must also improve
-                delta_f1 >= thresholds.f1_min_delta_keep and 
-                result.classification_f1 is not None
-            )
-            
-            # For very low thresholds, be more lenient with positive improvements
-            if thresholds.r2_min_delta_keep < 0.0005:
-                # Accept positive improvements even if slightly below threshold
-                r2_meets_threshold = r2_meets_threshold or (delta_r2 > 0 and delta_r2 >= thresholds.r2_min_delta_keep * 0.3)
-            
-            return r2_meets_threshold or f1_meets_threshold
+            return bool(meets_keep_thresholds(
+                delta_r2, delta_f1, thresholds.r2_min_delta_keep, thresholds.f1_min_delta_keep
+            ))
         
         if num_result:
             # For numerology, check both against baseline and against astrology
@@ -448,6 +596,8 @@ class ModelComparator:
                 "classification": {
                     "f1": baseline_f1,
                     "accuracy": baseline_result.classification_accuracy or 0.0,
+                    "pr_auc": baseline_result.classification_pr_auc or 0.0,
+                    "threshold": baseline_result.classification_threshold,
                 }
             }
         }
@@ -469,6 +619,9 @@ class ModelComparator:
                         "f1": result.classification_f1 or 0.0,
                         "delta_f1": delta_f1,
                         "accuracy": result.classification_accuracy or 0.0,
+                        "pr_auc": result.classification_pr_auc or 0.0,
+                        "delta_pr_auc": (result.classification_pr_auc or 0.0) - (baseline_result.classification_pr_auc or 0.0),
+                        "threshold": result.classification_threshold,
                     },
                     "decision": decisions.get(decision_key, "N/A")
                 }
@@ -480,6 +633,719 @@ class ModelComparator:
         return structured
 
 
+class ModelComparator(ComparisonReport):
+    """
+    Compares model performance with and without theory-derived features.
+    
+    `backend` is the regression model (a model_backends name such as
+    "hist_gbt", or a ModelBackend instance to clone); ridge by default.
+    The permutation, multi-output and ridge-path studies are ridge-specific
+    and ignore it.
+    """
+    
+    def __init__(self, extractor: FeatureExtractor, backend: Union[str, ModelBackend, None] = None):
+        self.extractor = extractor
+        self.backend = backend
+    
+    def _uses_ridge(self) -> bool:
+        return self.backend is None or self.backend == RidgeBackend.name
+    
+    def _new_model(self, alpha: Union[float, str] = DEFAULT_ALPHA) -> ModelBackend:
+        """Unfitted model for one configuration or fold"""
+        if self._uses_ridge():
+            return RidgeBackend(alpha=alpha)
+        return get_backend(self.backend)
+    
+    def compare_models(
+        self,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        include_classification: bool = True,
+        alpha: Union[float, str] = DEFAULT_ALPHA,
+        threshold_method: str = DEFAULT_THRESHOLD_METHOD,
+    ) -> Dict[str, ModelResults]:
+        """
+        Compare baseline vs numerology vs astrology vs all features.
+        
+        `alpha` is the ridge penalty, or "gcv" to choose it per configuration
+        by generalized cross-validation on the training split.
+        `threshold_method` sets how the soulmate threshold on the
+        predictions is chosen (see THRESHOLD_METHODS).
+        
+        All configurations share the same split, so their test predictions
+        are scored together as one batch.
+        
+        Returns dictionary of ModelResults for each configuration.
+        """
+        fitted = {}
+        
+        # Extract classification targets if available
+        y_classification = None
+        if include_classification:
+            flags = []
+            for pair in self.extractor.dataset.pairs:
+                flags.append(pair.soulmate_flag if pair.soulmate_flag is not None else 0)
+            y_classification = np.array(flags)
+        needs_threshold = y_classification is not None and threshold_method != "median"
+        
+        # Baseline (V + R only)
+        X_baseline, y, feature_names_baseline = self.extractor.extract_baseline_features()
+        fitted["baseline"] = ("Baseline (32D V + 7D R)", self._fit_on_split(
+            X_baseline,
+            y,
+            test_size=test_size,
+            random_state=random_state,
+            alpha=alpha,
+            predict_train=needs_threshold,
+        ))
+        
+        # Baseline + Numerology
+        X_num, y_num, feature_names_num = self.extractor.extract_with_numerology()
+        if X_num.shape[1] > X_baseline.shape[1]:  # Only if numerology features added
+            fitted["baseline_numerology"] = ("Baseline + Numerology", self._fit_on_split(
+                X_num,
+                y_num,
+                test_size=test_size,
+                random_state=random_state,
+                alpha=alpha,
+                predict_train=needs_threshold,
+            ))
+        
+        # Baseline + Astrology
+        X_ast, y_ast, feature_names_ast = self.extractor.extract_with_astrology()
+        if X_ast.shape[1] > X_baseline.shape[1]:  # Only if astrology features added
+            fitted["baseline_astrology"] = ("Baseline + Astrology", self._fit_on_split(
+                X_ast,
+                y_ast,
+                test_size=test_size,
+                random_state=random_state,
+                alpha=alpha,
+                predict_train=needs_threshold,
+            ))
+        
+        # Baseline + All
+        X_all, y_all, feature_names_all = self.extractor.extract_with_all()
+        if X_all.shape[1] > X_baseline.shape[1]:  # Only if additional features added
+            fitted["baseline_all"] = ("Baseline + Numerology + Astrology", self._fit_on_split(
+                X_all,
+                y_all,
+                test_size=test_size,
+                random_state=random_state,
+                alpha=alpha,
+                predict_train=needs_threshold,
+            ))
+        
+        return self._evaluate_fitted(fitted, y, y_classification, threshold_method)
+    
+    def _fit_on_split(
+        self,
+        X: np.ndarray,
+        y: np.ndarray,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        alpha: Union[float, str] = DEFAULT_ALPHA,
+        predict_train: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Fit the backend on a random train/test split of (X, y).
+        
+        Returns the model, the split's indices, its test predictions and,
+        with `predict_train`, its training predictions (for thresholds).
+        """
+        # Simple train/test split
+        np.random.seed(random_state)
+        n_samples = len(y)
+        n_test = int(n_samples * test_size)
+        indices = np.random.permutation(n_samples)
+        test_indices = indices[:n_test]
+        train_indices = indices[n_test:]
+        
+        X_train, X_test = X[train_indices], X[test_indices]
+        
+        # Ridge regression by default: (X^T X + alpha*I)^(-1) X^T y with an
+        # intercept, falling back to the training mean if singular
+        model = self._new_model(alpha)
+        model.fit(X_train, y[train_indices])
+        return {
+            "model": model,
+            "test_indices": test_indices,
+            "train_indices": train_indices,
+            "y_pred": model.predict(X_test),
+            "train_pred": model.predict(X_train) if predict_train else None,
+        }
+    
+    def _evaluate_fitted(
+        self,
+        fitted: Dict[str, Tuple[str, Dict[str, Any]]],
+        y: np.ndarray,
+        y_classification: Optional[np.ndarray],
+        threshold_method: str,
+    ) -> Dict[str, ModelResults]:
+        """Score fits that share one split (see _fit_on_split) as a single batch"""
+        keys = list(fitted)
+        splits = [fitted[key][1] for key in keys]
+        test_indices = splits[0]["test_indices"]
+        train_indices = splits[0]["train_indices"]
+        
+        y_class_test = None
+        thresholds = None
+        if y_classification is not None:
+            y_class_test = y_classification[test_indices]
+            if threshold_method != "median":
+                thresholds = classification_threshold(
+                    np.stack([split["train_pred"] for split in splits]),
+                    y_classification[train_indices],
+                    threshold_method,
+                )
+        batch = evaluate_prediction_batch(
+            [fitted[key][0] for key in keys],
+            y[test_indices],
+            np.stack([split["y_pred"] for split in splits]),
+            y_class_test,
+            thresholds,
+        )
+        for result, split in zip(batch, splits):
+            set_model_info(result, split["model"])
+        return dict(zip(keys, batch))
+    
+    def _train_and_evaluate(
+        self,
+        model_name: str,
+        X: np.ndarray,
+        y: np.ndarray,
+        y_classification: Optional[np.ndarray] = None,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        alpha: Union[float, str] = DEFAULT_ALPHA,
+        threshold_method: str = DEFAULT_THRESHOLD_METHOD,
+    ) -> ModelResults:
+        """
+        Train a simple linear regression model and evaluate.
+        
+        The model comes from the comparator's backend (ridge unless
+        configured otherwise; see model_backends.py). The soulmate threshold
+        is chosen on the model's training-fold predictions.
+        """
+        needs_threshold = y_classification is not None and threshold_method != "median"
+        split = self._fit_on_split(X, y, test_size, random_state, alpha, predict_train=needs_threshold)
+        return self._evaluate_fitted({model_name: (model_name, split)}, y, y_classification, threshold_method)[model_name]
+    
+    def cross_validate(
+        self,
+        n_folds: int = 5,
+        random_state: int = 42,
+        include_classification: bool = True,
+        alpha: Union[float, str] = DEFAULT_ALPHA,
+        max_workers: Optional[int] = None,
+        threshold_method: str = DEFAULT_THRESHOLD_METHOD,
+    ) -> Dict[str, List[ModelResults]]:
+        """
+        K-fold cross-validated comparison of all feature configurations.
+        
+        Features are extracted once for the full configuration (the others
+        are column subsets of it) and each fold's Gram matrix is accumulated
+        in a single pass. Fold f trains on total - fold f, so all k fits cost
+        about one pass over the data; the folds then run in parallel threads
+        (NumPy releases the GIL in the products and solves). Pairs are
+        assigned to folds by a hash of their id. Non-ridge backends are
+        refit on each fold's training rows. Soulmate thresholds are chosen
+        on each fold's training predictions.
+        
+        Returns per-configuration lists of ModelResults, one per fold.
+        """
+        dataset = self.extractor.dataset
+        if not dataset.pairs:
+            return {}
+        feature_names, columns = config_columns(dataset)
+        X, y, _ = self.extractor.extract_features(
+            include_numerology=True,
+            include_astrology=True,
+            feature_names=feature_names,
+        )
+        X = X.reshape(len(y), len(feature_names))
+        
+        y_classification = None
+        if include_classification:
+            y_classification = np.array([
+                pair.soulmate_flag if pair.soulmate_flag is not None else 0
+                for pair in dataset.pairs
+            ])
+        
+        folds = hash_folds((pair_key(pair) for pair in dataset.pairs), n_folds, random_state)
+        fold_indices = [np.nonzero(folds == f)[0] for f in range(n_folds)]
+        fold_stats = []
+        total = GramAccumulator(X.shape[1])
+        for indices in fold_indices:
+            stats = GramAccumulator(X.shape[1])
+            stats.update(X[indices], y[indices])
+            total.merge(stats)
+            fold_stats.append(stats)
+        
+        names = {key: name for key, name, _, _ in ABLATION_CONFIGS}
+        
+        def run_fold(f: int) -> Dict[str, ModelResults]:
+            train = total - fold_stats[f]
+            test_indices = fold_indices[f]
+            X_test, y_test = X[test_indices], y[test_indices]
+            y_class_test = y_classification[test_indices] if y_classification is not None else None
+            train_indices = np.nonzero(folds != f)[0]
+            X_train = X[train_indices]
+            y_class_train = y_classification[train_indices] if y_classification is not None else None
+            # Training predictions are only needed to place the soulmate threshold
+            needs_threshold = y_classification is not None and threshold_method != "median"
+            y_preds, train_preds, models, fold_alphas = [], [], [], []
+            for key, cols in columns.items():
+                if self._uses_ridge():
+                    stats = train.select(cols)
+                    fold_alphas.append(resolve_alpha(alpha, stats))
+                    coef = ridge_solve(stats.xtx, stats.xty, fold_alphas[-1])[:, 0]
+                    y_preds.append(with_intercept(X_test[:, cols]) @ coef)
+                    if needs_threshold:
+                        train_preds.append(with_intercept(X_train[:, cols]) @ coef)
+                else:
+                    # Other backends have no sufficient statistics; fit on the other folds' rows
+                    model = self._new_model()
+                    model.fit(X_train[:, cols], y[train_indices])
+                    models.append(model)
+                    y_preds.append(model.predict(X_test[:, cols]))
+                    if needs_threshold:
+                        train_preds.append(model.predict(X_train[:, cols]))
+            
+            # All configurations share the fold's rows: score them as one batch
+            thresholds = None
+            if needs_threshold:
+                thresholds = classification_threshold(np.stack(train_preds), y_class_train, threshold_method)
+            batch = evaluate_prediction_batch(
+                [names[key] for key in columns], y_test, np.stack(y_preds), y_class_test, thresholds
+            )
+            for i, result in enumerate(batch):
+                if self._uses_ridge():
+                    result.ridge_alpha = fold_alphas[i]
+                    result.backend = RidgeBackend.name
+                else:
+                    set_model_info(result, models[i])
+            fold_results = dict(zip(columns, batch))
+            return fold_results
+        
+        workers = max_workers or min(n_folds, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            per_fold = list(pool.map(run_fold, range(n_folds)))
+        
+        return {key: [fold[key] for fold in per_fold] for key in columns}
+    
+    def permutation_test(
+        self,
+        n_permutations: int = 1000,
+        random_state: int = 42,
+        alpha: Union[float, str] = DEFAULT_ALPHA,
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Permutation test of each theory feature group against the baseline.
+        
+        The statistic is the in-sample R² gain from appending the group's
+        columns to the baseline features. Under the null the group's rows are
+        shuffled; only the appended block is refit (see
+        ridge.permutation_gains), so 1000 permutations cost a few extra
+        passes over the data rather than 1000 fits.
+        
+        Returns {configuration key: {"delta_r2", "p_value", "null_mean",
+        "null_p95", "permutations"}} for every non-baseline configuration.
+        """
+        dataset = self.extractor.dataset
+        if not dataset.pairs:
+            return {}
+        feature_names, columns = config_columns(dataset)
+        X, y, _ = self.extractor.extract_features(
+            include_numerology=True,
+            include_astrology=True,
+            feature_names=feature_names,
+        )
+        X = X.reshape(len(y), len(feature_names))
+        X_baseline = X[:, columns["baseline"]]
+        if alpha == "gcv":
+            stats = GramAccumulator(X_baseline.shape[1])
+            stats.update(X_baseline, y)
+            alpha = select_alpha_gcv(stats)
+        
+        tests = {}
+        for key, cols in columns.items():
+            if key == "baseline":
+                continue
+            theory_cols = np.setdiff1d(cols, columns["baseline"])
+            observed, null = permutation_gains(
+                X_baseline, X[:, theory_cols], y,
+                n_permutations=n_permutations, alpha=alpha, seed=random_state,
+            )
+            tests[key] = {
+                "delta_r2": observed,
+                "p_value": permutation_p_value(observed, null),
+                "null_mean": float(null.mean()) if len(null) else 0.0,
+                "null_p95": float(np.percentile(null, 95)) if len(null) else 0.0,
+                "permutations": len(null),
+            }
+        return tests
+    
+    def compare_outcomes(
+        self,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        alpha: Union[float, str] = DEFAULT_ALPHA,
+    ) -> Dict[str, Any]:
+        """
+        Ablation for S and all six Y outcomes at once.
+        
+        The Y and S feature columns are dropped (they are the targets here).
+        Each configuration's X^T X + alpha I is factorized once and solved
+        for all seven targets as one multi-RHS system, and test R²/MSE come
+        from the test split's sufficient statistics, so the whole
+        per-outcome ablation costs about as much as the single-target one.
+        Pairs are split by a hash of their id.
+        
+        Returns:
+            outcomes: target names, in column order
+            r2 / mse: {configuration key: {outcome: value}}
+            delta_r2: {configuration key: {outcome: R² gain over baseline}}
+        """
+        dataset = self.extractor.dataset
+        if not dataset.pairs:
+            return {}
+        feature_names, columns = config_columns(dataset)
+        X, _, _ = self.extractor.extract_features(
+            include_numerology=True,
+            include_astrology=True,
+            feature_names=feature_names,
+        )
+        X = X.reshape(len(dataset.pairs), len(feature_names))
+        Y = np.array([
+            [pair.S_true if pair.S_true is not None else pair.S] + pair.Y.to_list()
+            for pair in dataset.pairs
+        ], dtype=float)
+        
+        # Targets must not be features
+        target_columns = {i for i, name in enumerate(feature_names) if name == "S" or name.startswith("Y_")}
+        is_test = hash_test_mask((pair_key(pair) for pair in dataset.pairs), test_size, random_state)
+        train = GramAccumulator(X.shape[1], Y.shape[1])
+        train.update(X[~is_test], Y[~is_test])
+        test = GramAccumulator(X.shape[1], Y.shape[1])
+        test.update(X[is_test], Y[is_test])
+        
+        r2, mse = {}, {}
+        for key, cols in columns.items():
+            cols = np.array([c for c in cols if c not in target_columns], dtype=int)
+            stats = train.select(cols)
+            coef = ridge_solve(stats.xtx, stats.xty, resolve_alpha(alpha, stats))
+            key_r2, key_mse = regression_metrics(coef, test.select(cols))
+            r2[key] = dict(zip(OUTCOME_NAMES, key_r2.tolist()))
+            mse[key] = dict(zip(OUTCOME_NAMES, key_mse.tolist()))
+        
+        delta_r2 = {
+            key: {name: r2[key][name] - r2["baseline"][name] for name in OUTCOME_NAMES}
+            for key in r2 if key != "baseline"
+        }
+        return {"outcomes": list(OUTCOME_NAMES), "r2": r2, "mse": mse, "delta_r2": delta_r2}
+    
+    def ridge_path(
+        self,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        alphas: np.ndarray = DEFAULT_ALPHA_GRID,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Test R²/MSE and GCV score over a grid of ridge penalties.
+        
+        Each configuration's training Gram matrix is eigendecomposed once and
+        the coefficients for every alpha follow in closed form (see
+        ridge.ridge_path); test metrics come from the test split's
+        sufficient statistics. Tuning 100 alphas costs about one fit.
+        Pairs are split by a hash of their id.
+        
+        Returns {configuration key: {"alphas", "test_r2", "test_mse", "gcv",
+        "gcv_alpha", "best_test_alpha"}}.
+        """
+        dataset = self.extractor.dataset
+        if not dataset.pairs:
+            return {}
+        feature_names, columns = config_columns(dataset)
+        X, y, _ = self.extractor.extract_features(
+            include_numerology=True,
+            include_astrology=True,
+            feature_names=feature_names,
+        )
+        X = X.reshape(len(y), len(feature_names))
+        is_test = hash_test_mask((pair_key(pair) for pair in dataset.pairs), test_size, random_state)
+        train = GramAccumulator(X.shape[1])
+        train.update(X[~is_test], y[~is_test])
+        test = GramAccumulator(X.shape[1])
+        test.update(X[is_test], y[is_test])
+        
+        alphas = np.asarray(alphas, dtype=float)
+        paths = {}
+        for key, cols in columns.items():
+            gcv, coefs = gcv_scores(train.select(cols), alphas)
+            test_stats = test.select(cols)
+            metrics = [regression_metrics(coef, test_stats) for coef in coefs]
+            test_r2 = np.array([r2[0] for r2, _ in metrics])
+            paths[key] = {
+                "alphas": alphas.tolist(),
+                "test_r2": test_r2.tolist(),
+                "test_mse": [float(mse[0]) for _, mse in metrics],
+                "gcv": gcv[:, 0].tolist(),
+                "gcv_alpha": float(alphas[np.argmin(gcv[:, 0])]),
+                "best_test_alpha": float(alphas[np.argmax(test_r2)]),
+            }
+        return paths
+
+
+def average_fold_results(fold_results: Dict[str, List[ModelResults]]) -> Dict[str, ModelResults]:
+    """Mean of each metric over folds, per configuration (no predictions kept)"""
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return float(np.mean(values)) if values else None
+    
+    averaged = {}
+    for key, folds in fold_results.items():
+        averaged[key] = ModelResults(
+            model_name=folds[0].model_name,
+            r2_score=mean(r.r2_score for r in folds),
+            mse=mean(r.mse for r in folds),
+            mae=mean(r.mae for r in folds),
+            classification_accuracy=mean(r.classification_accuracy for r in folds),
+            classification_precision=mean(r.classification_precision for r in folds),
+            classification_recall=mean(r.classification_recall for r in folds),
+            classification_f1=mean(r.classification_f1 for r in folds),
+            classification_threshold=mean(r.classification_threshold for r in folds),
+            classification_pr_auc=mean(r.classification_pr_auc for r in folds),
+        )
+    return averaged
+
+
+def cv_delta_summary(fold_results: Dict[str, List[ModelResults]]) -> Dict[str, Dict[str, float]]:
+    """
+    Mean and sample stdev of per-fold ΔR² / ΔF1 against the baseline.
+    
+    Deltas are paired by fold (same test rows), which cancels most of the
+    fold-to-fold variation in difficulty.
+    """
+    baseline = fold_results.get("baseline")
+    if not baseline:
+        return {}
+    
+    summary = {}
+    for key, folds in fold_results.items():
+        if key == "baseline":
+            continue
+        delta_r2 = np.array([r.r2_score - b.r2_score for r, b in zip(folds, baseline)])
+        delta_f1 = np.array([
+            (r.classification_f1 or 0.0) - (b.classification_f1 or 0.0) for r, b in zip(folds, baseline)
+        ])
+        ddof = 1 if len(folds) > 1 else 0
+        summary[key] = {
+            "folds": len(folds),
+            "delta_r2_mean": float(delta_r2.mean()),
+            "delta_r2_std": float(delta_r2.std(ddof=ddof)),
+            "delta_f1_mean": float(delta_f1.mean()),
+            "delta_f1_std": float(delta_f1.std(ddof=ddof)),
+        }
+    return summary
+
+
+class OutOfCoreComparator(ComparisonReport):
+    """
+    ModelComparator.compare_models for chunked datasets, without ever
+    materializing the full feature matrix. Only the ridge comparison is
+    supported; the reporting (print_comparison, get_structured_results, ...)
+    is shared through ComparisonReport.
+    
+    `make_chunks` must return a fresh iterable of Dataset chunks on every
+    call (e.g. lambda: iter_pair_chunks(dataset), or a reader over files on
+    disk). Features for all configurations are extracted once per chunk and
+    streamed into per-configuration Gram accumulators, so memory is bounded
+    by d^2 rather than n * d. A pair is in the test split when the hash of
+    its id (ridge.pair_key) falls below `test_size`.
+    
+    Passes over the data:
+      1. train/test sufficient statistics -> coefficients, R², MSE
+      2. MAE, and quantile sketches of the predictions: training predictions
+         per label (F1/prevalence threshold), test predictions per label
+         (PR-AUC) and all test predictions (median threshold)
+      3. confusion counts at the threshold (only with include_classification)
+    
+    F1/prevalence thresholds and PR-AUC are therefore approximate, to the
+    sketches' rank error; the median threshold is resolved exactly.
+    """
+    
+    def __init__(self, make_chunks: Callable[[], Iterable[Dataset]], alpha: Union[float, str] = DEFAULT_ALPHA):
+        self.make_chunks = make_chunks
+        self.alpha = alpha
+    
+    def _chunks(
+        self,
+        feature_names: List[str],
+        test_size: float,
+        random_state: int,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """(X, y, soulmate flags, test mask) for every non-empty chunk"""
+        for chunk in self.make_chunks():
+            if not chunk.pairs:
+                continue
+            X, y, _ = FeatureExtractor(chunk).extract_features(
+                include_numerology=True,
+                include_astrology=True,
+                feature_names=feature_names,
+            )
+            flags = np.fromiter(
+                (pair.soulmate_flag if pair.soulmate_flag is not None else 0 for pair in chunk.pairs),
+                dtype=int,
+                count=len(chunk.pairs),
+            )
+            is_test = hash_test_mask((pair_key(pair) for pair in chunk.pairs), test_size, random_state)
+            yield X.reshape(len(y), len(feature_names)), y, flags, is_test
+    
+    def compare_models(
+        self,
+        test_size: float = 0.2,
+        random_state: int = 42,
+        include_classification: bool = True,
+        threshold_method: str = DEFAULT_THRESHOLD_METHOD,
+    ) -> Dict[str, ModelResults]:
+        """
+        Compare baseline vs numerology vs astrology vs all features.
+        
+        Returns dictionary of ModelResults for each configuration (without
+        per-pair predictions, which would not fit in memory).
+        """
+        if threshold_method not in THRESHOLD_METHODS:
+            raise ValueError(f"Unknown threshold method {threshold_method!r}; expected one of {THRESHOLD_METHODS}")
+        first = next((chunk for chunk in self.make_chunks() if chunk.pairs), None)
+        if first is None:
+            return {}
+        feature_names, columns = config_columns(first)
+        
+        # Pass 1: sufficient statistics
+        train = {key: GramAccumulator(len(cols)) for key, cols in columns.items()}
+        test = {key: GramAccumulator(len(cols)) for key, cols in columns.items()}
+        for X, y, _, is_test in self._chunks(feature_names, test_size, random_state):
+            X_train, y_train = X[~is_test], y[~is_test]
+            X_test, y_test = X[is_test], y[is_test]
+            for key, cols in columns.items():
+                train[key].update(X_train[:, cols], y_train)
+                test[key].update(X_test[:, cols], y_test)
+        
+        alphas = {key: resolve_alpha(self.alpha, train[key]) for key in columns}
+        coefs = {key: ridge_solve(train[key].xtx, train[key].xty, alphas[key])[:, 0] for key in columns}
+        
+        def predictions():
+            for X, y, flags, is_test in self._chunks(feature_names, test_size, random_state):
+                yield y, flags == 1, is_test, {
+                    key: with_intercept(X[:, cols]) @ coefs[key] for key, cols in columns.items()
+                }
+        
+        # Pass 2: MAE and sketches of the predictions
+        abs_error = dict.fromkeys(columns, 0.0)
+        sketches = {key: KLLSketch() for key in columns}
+        # (positives, negatives) sketches of training and of test predictions
+        def label_sketches():
+            return KLLSketch(THRESHOLD_SKETCH_K, seed=random_state), KLLSketch(THRESHOLD_SKETCH_K, seed=random_state)
+        
+        train_sketches = {key: label_sketches() for key in columns}
+        test_sketches = {key: label_sketches() for key in columns}
+        for y, actual, is_test, predictions_all in predictions():
+            y_test = y[is_test]
+            for key, y_all in predictions_all.items():
+                y_pred = y_all[is_test]
+                abs_error[key] += float(np.abs(y_test - y_pred).sum())
+                sketches[key].update_many(y_pred)
+                if include_classification:
+                    for split, rows in ((test_sketches, is_test), (train_sketches, ~is_test)):
+                        split[key][0].update_many(y_all[rows & actual])
+                        split[key][1].update_many(y_all[rows & ~actual])
+        
+        results = {}
+        for key, name, _, _ in ABLATION_CONFIGS:
+            if key not in columns:
+                continue
+            r2, mse = regression_metrics(coefs[key], test[key])
+            n_test = test[key].n
+            results[key] = ModelResults(
+                model_name=name,
+                r2_score=float(r2[0]),
+                mse=float(mse[0]),
+                mae=abs_error[key] / n_test if n_test else 0.0,
+                ridge_alpha=alphas[key],
+            )
+        
+        # Pass 3: confusion counts against the soulmate flags. Predictions
+        # outside a bracket around the threshold are classified directly;
+        # those inside are kept. For the median, the sketch brackets it and
+        # the kept predictions give the exact median, as in the in-memory
+        # study; F1/prevalence thresholds come from the training sketches
+        if include_classification:
+            brackets = {}
+            for key in columns:
+                if threshold_method == "median":
+                    brackets[key] = (
+                        sketches[key].quantile(0.5 - MEDIAN_BRACKET),
+                        sketches[key].quantile(0.5 + MEDIAN_BRACKET),
+                    )
+                else:
+                    threshold = sketch_classification_threshold(*train_sketches[key], threshold_method)
+                    brackets[key] = (threshold, threshold)
+            counts = {key: np.zeros(4) for key in columns}
+            n_below = dict.fromkeys(columns, 0)
+            inside = {key: [] for key in columns}
+            for _, actual_all, is_test, predictions_all in predictions():
+                actual = actual_all[is_test]
+                for key, y_all in predictions_all.items():
+                    y_pred = y_all[is_test]
+                    lo, hi = brackets[key]
+                    below, above = y_pred < lo, y_pred > hi
+                    mid = ~(below | above)
+                    n_below[key] += int(below.sum())
+                    counts[key] += confusion_matrices(actual[~mid], above[~mid])
+                    inside[key].append((y_pred[mid], actual[mid]))
+            
+            for key in columns:
+                y_pred = np.concatenate([p for p, _ in inside[key]])
+                actual = np.concatenate([a for _, a in inside[key]])
+                n_test = test[key].n
+                threshold = brackets[key][0]
+                if threshold_method == "median" and len(y_pred):
+                    # Same middle element(s) np.median would average
+                    positions = np.clip(np.array([(n_test - 1) // 2, n_test // 2]) - n_below[key], 0, len(y_pred) - 1)
+                    threshold = np.partition(y_pred, np.unique(positions))[positions].mean()
+                counts[key] += confusion_matrices(actual, y_pred >= threshold)
+                set_classification_metrics(results[key], *counts[key].tolist())
+                results[key].classification_threshold = float(threshold)
+                results[key].classification_pr_auc = pr_auc(*sketch_precision_recall_curve(*test_sketches[key])[1:])
+        
+        return results
+
+
+def percentile_threshold(scores: np.ndarray, q: float) -> float:
+    """
+    Same value as np.percentile(scores, q) (linear interpolation), but found
+    with np.partition in O(n) instead of a full sort.
+    """
+    scores = np.asarray(scores, dtype=float)
+    h = (len(scores) - 1) * q / 100.0
+    lo = int(np.floor(h))
+    hi = min(lo + 1, len(scores) - 1)
+    part = np.partition(scores, [lo, hi] if hi != lo else lo)
+    return float(part[lo] + (h - lo) * (part[hi] - part[lo]))
+
+
+def soulmate_flags(scores: np.ndarray, top_percent: float = 0.1) -> np.ndarray:
+    """
+    Array-native soulmate flags: 1 where the score is in the top `top_percent`
+    of `scores`, else 0 (one partition + one vectorized comparison).
+    """
+    scores = np.asarray(scores, dtype=float)
+    if not len(scores):
+        return np.zeros(0, dtype=np.int8)
+    threshold = percentile_threshold(scores, (1 - top_percent) * 100)
+    return (scores >= threshold).astype(np.int8)
+
+
 def add_soulmate_flag(dataset: Dataset, top_percent: float = 0.1, use_s_true: bool = False) -> None:
     """
     For each Pair in dataset, compute a binary soulmate_flag based on S (or S_true if available).
@@ -488,17 +1354,61 @@ def add_soulmate_flag(dataset: Dataset, top_percent: float = 0.1, use_s_true: bo
     Mutates the dataset in-place by setting pair.soulmate_flag.
     """
     # Get all S scores (prefer S_true if available, else S)
-    scores = []
-    for pair in dataset.pairs:
-        score = pair.S_true if (use_s_true and pair.S_true is not None) else pair.S
-        scores.append(score)
-    
-    scores = np.array(scores)
-    threshold = np.percentile(scores, (1 - top_percent) * 100)
+    scores = np.fromiter(
+        (pair.S_true if (use_s_true and pair.S_true is not None) else pair.S for pair in dataset.pairs),
+        dtype=float,
+        count=len(dataset.pairs),
+    )
     
-    for pair in dataset.pairs:
-        score = pair.S_true if (use_s_true and pair.S_true is not None) else pair.S
-        pair.soulmate_flag = 1 if score >= threshold else 0
+    flags = soulmate_flags(scores, top_percent)
+    for pair, flag in zip(dataset.pairs, flags.tolist()):
+        pair.soulmate_flag = flag
+
+
+def streaming_soulmate_threshold(
+    chunks: Iterable[np.ndarray],
+    top_percent: float = 0.1,
+    k: int = 400,
+) -> Optional[float]:
+    """
+    Approximate soulmate threshold over score chunks that need not fit in memory.
+
+    Scores are folded into a KLL quantile sketch (O(k) memory); the threshold is
+    its (1 - top_percent) quantile, with rank error around 1.7 / k. Returns None
+    if no scores were seen.
+    """
+    sketch = KLLSketch(k)
+    for chunk in chunks:
+        sketch.update_many(chunk)
+    return sketch.quantile(1 - top_percent)
+
+
+def streaming_soulmate_flags(
+    make_chunks: Callable[[], Iterable[np.ndarray]],
+    top_percent: float = 0.1,
+    k: int = 400,
+) -> Iterator[np.ndarray]:
+    """
+    Soulmate flags for a chunked dataset, one flag array per chunk.
+
+    `make_chunks` is called twice: the first pass builds the quantile sketch,
+    the second yields `chunk >= threshold` for each chunk. Memory is bounded
+    by the sketch and one chunk, whatever the dataset size.
+
+    Usage:
+        def chunks():
+            for batch in read_scores("scores.npy", chunk_size=1_000_000):
+                yield batch
+        for flags in streaming_soulmate_flags(chunks):
+            ...
+    """
+    threshold = streaming_soulmate_threshold(make_chunks(), top_percent, k)
+    for chunk in make_chunks():
+        chunk = np.asarray(chunk, dtype=float)
+        if threshold is None:
+            yield np.zeros(len(chunk), dtype=np.int8)
+        else:
+            yield (chunk >= threshold).astype(np.int8)
 
 
 def run_ablation_study(
@@ -508,6 +1418,12 @@ def run_ablation_study(
     include_classification: bool = True,
     thresholds: Optional[DecisionThresholds] = None,
     verbose: bool = True,
+    cv_folds: Optional[int] = None,
+    permutations: int = 0,
+    multi_output: bool = False,
+    alpha: Union[float, str] = DEFAULT_ALPHA,
+    backend: Union[str, ModelBackend, None] = None,
+    threshold_method: str = DEFAULT_THRESHOLD_METHOD,
 ) -> Dict[str, Any]:
     """
     Main entry point for running ablation study.
@@ -516,26 +1432,135 @@ def run_ablation_study(
         dataset = Dataset.from_json("data.json")
         results = run_ablation_study(dataset)
     
+    With `cv_folds` set, metrics are averaged over k folds (test_size is
+    ignored) and decisions use the mean deltas; each feature set's entry
+    also gets a "cv" block with the mean/stdev of its per-fold deltas.
+    
+    With `permutations` > 0, each theory group is also permutation-tested
+    against the baseline; p-values go into a "permutation" block and, if
+    thresholds.max_p_value is set, decide KEEP/DISCARD.
+    
+    With `multi_output`, the study is also run for S and all six Y
+    outcomes in one multi-target fit; see ModelComparator.compare_outcomes
+    for the "outcomes" entry.
+    
+    `alpha` is the ridge penalty; "gcv" picks it per configuration (and
+    per fold) by generalized cross-validation on the training data from a
+    single eigendecomposition, and reports the choice as regression.alpha.
+    
+    `backend` picks the regression model (see model_backends.py), e.g.
+    "hist_gbt" for gradient boosted trees that can pick up nonlinear
+    theory effects.
+    
+    `threshold_method` sets how soulmates are called from the predicted
+    S: "f1" (default) maximizes F1 on the training fold, "prevalence" flags
+    the training fold's soulmate share, "median" is the original half/half
+    split. Classification blocks also report PR-AUC, which needs no threshold.
+    
     Returns structured results with metrics and decisions.
     """
     if thresholds is None:
         thresholds = DecisionThresholds()
     
     extractor = FeatureExtractor(dataset)
-    comparator = ModelComparator(extractor)
+    comparator = ModelComparator(extractor, backend=backend)
+    
+    fold_results = None
+    if cv_folds:
+        fold_results = comparator.cross_validate(
+            n_folds=cv_folds,
+            random_state=random_state,
+            include_classification=include_classification,
+            alpha=alpha,
+            threshold_method=threshold_method,
+        )
+        results = average_fold_results(fold_results)
+    else:
+        results = comparator.compare_models(
+            test_size=test_size,
+            random_state=random_state,
+            include_classification=include_classification,
+            alpha=alpha,
+            threshold_method=threshold_method,
+        )
+    
+    tests = {}
+    if permutations > 0:
+        tests = comparator.permutation_test(n_permutations=permutations, random_state=random_state, alpha=alpha)
+        for key, test in tests.items():
+            if key in results:
+                results[key].permutation_p_value = test["p_value"]
     
+    outcome_results = None
+    if multi_output:
+        outcome_results = comparator.compare_outcomes(test_size=test_size, random_state=random_state, alpha=alpha)
+    
+    if verbose:
+        comparator.print_comparison(results)
+        if outcome_results:
+            comparator.print_outcomes(outcome_results)
+        if fold_results:
+            comparator.print_cv_summary(fold_results)
+        for key, test in tests.items():
+            print(f"{key}: permutation p = {test['p_value']:.4f} (ΔR² {test['delta_r2']:+.5f}, null 95th pct {test['null_p95']:+.5f})")
+    
+    # Return structured results
+    structured = comparator.get_structured_results(results, thresholds)
+    structured["_raw_results"] = results  # Keep raw results for compatibility
+    if fold_results:
+        for key, summary in cv_delta_summary(fold_results).items():
+            structured[STRUCTURED_KEYS[key]]["cv"] = summary
+        structured["_fold_results"] = fold_results
+    if alpha == "gcv" and not fold_results:
+        for key, result in results.items():
+            if STRUCTURED_KEYS[key] in structured:
+                structured[STRUCTURED_KEYS[key]]["regression"]["alpha"] = result.ridge_alpha
+    if outcome_results:
+        structured["outcomes"] = outcome_results
+    for key, test in tests.items():
+        if STRUCTURED_KEYS[key] in structured:
+            structured[STRUCTURED_KEYS[key]]["permutation"] = test
+    
+    return structured
+
+
+
+def run_ablation_study_out_of_core(
+    make_chunks: Callable[[], Iterable[Dataset]],
+    test_size: float = 0.2,
+    random_state: int = 42,
+    include_classification: bool = True,
+    thresholds: Optional[DecisionThresholds] = None,
+    verbose: bool = True,
+    alpha: Union[float, str] = DEFAULT_ALPHA,
+    threshold_method: str = DEFAULT_THRESHOLD_METHOD,
+) -> Dict[str, Any]:
+    """
+    Ablation study over a chunked dataset, in O(d^2) memory.
+    
+    Usage:
+        dataset = Dataset.from_json("data.json")
+        results = run_ablation_study_out_of_core(lambda: iter_pair_chunks(dataset, 50000))
+    
+    Returns structured results in the same format as run_ablation_study.
+    The test split is hash-based, so metrics differ slightly from the
+    in-memory study's random permutation split.
+    """
+    if thresholds is None:
+        thresholds = DecisionThresholds()
+    
+    comparator = OutOfCoreComparator(make_chunks, alpha=alpha)
     results = comparator.compare_models(
         test_size=test_size,
         random_state=random_state,
         include_classification=include_classification,
+        threshold_method=threshold_method,
     )
     
     if verbose:
         comparator.print_comparison(results)
     
-    # Return structured results
     structured = comparator.get_structured_results(results, thresholds)
-    structured["_raw_results"] = results  # Keep raw results for compatibility
+    structured["_raw_results"] = results
     
     return structured
-
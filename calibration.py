@@ -0,0 +1,221 @@
+"""
+Score Calibration
+
+Turns raw S_hat scores into population percentiles and soulmate-tier
+decisions. Every computed score is fed into a KLL quantile sketch; workers
+periodically merge their new scores into one sketch file (under an exclusive
+file lock) and reload it when another worker has written it, so every process
+answers from the same distribution without scanning stored results.
+
+Until enough scores have been seen, the old placeholders are used:
+percentile = S_hat * 100 and soulmate tier = S_hat >= 0.7.
+"""
+
+from typing import Dict, Iterable, Optional
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+from quantile_sketch import KLLSketch, SketchView
+
+try:
+    import fcntl
+except ImportError:
+    # Fallback: no cross-process lock (e.g. Windows); last writer wins
+    fcntl = None
+
+
+CALIBRATION_PATH = os.getenv(
+    "CALIBRATION_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "calibration", "s_hat_sketch.json"),
+)
+
+SKETCH_K = 200
+FLUSH_EVERY = 1000          # scores buffered before merging into the shared file
+FLUSH_INTERVAL = 30.0       # seconds; buffered scores are merged at least this often
+REFRESH_INTERVAL = 10.0     # seconds between checks for a newer shared file
+MIN_SAMPLES = 1000          # scores needed before percentiles are trusted
+
+SOULMATE_TOP_FRACTION = 0.10
+FALLBACK_SOULMATE_THRESHOLD = 0.7
+
+
+class ScoreCalibration:
+    """
+    Percentiles and soulmate-tier decisions from a shared S_hat sketch.
+
+    Lookups use a sorted view of the shared sketch (binary search, O(log k));
+    scores recorded by this process join that view at the next flush.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        k: int = SKETCH_K,
+        flush_every: int = FLUSH_EVERY,
+        flush_interval: float = FLUSH_INTERVAL,
+        refresh_interval: float = REFRESH_INTERVAL,
+        min_samples: int = MIN_SAMPLES,
+    ):
+        self.path = path or CALIBRATION_PATH
+        self.k = k
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self._pending = KLLSketch(k)
+        self._last_flush = time.monotonic()
+        self._last_refresh = 0.0
+        self._mtime_ns: Optional[int] = None
+        self._view = SketchView([], [])
+        self._thresholds: Dict[float, float] = {}
+
+    # Shared file -------------------------------------------------------------
+
+    def _load(self) -> Optional[KLLSketch]:
+        try:
+            with open(self.path, "r") as f:
+                return KLLSketch.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as e:
+            print(f"Warning: Could not read calibration sketch {self.path}: {e}")
+            return None
+
+    def _write(self, sketch: KLLSketch) -> None:
+        directory = os.path.dirname(self.path)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".sketch-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(sketch.to_dict(), f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _set_view(self, sketch: Optional[KLLSketch]) -> None:
+        self._view = sketch.view() if sketch else SketchView([], [])
+        self._thresholds = {}
+
+    def flush(self) -> None:
+        """Merge scores recorded by this process into the shared sketch file"""
+        with self._lock:
+            pending = self._pending
+            self._pending = KLLSketch(self.k)
+            self._last_flush = time.monotonic()
+        if not pending.count:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                shared = self._load() or KLLSketch(self.k)
+                shared.merge(pending)
+                self._write(shared)
+                mtime_ns = os.stat(self.path).st_mtime_ns
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        with self._lock:
+            self._set_view(shared)
+            self._mtime_ns = mtime_ns
+            self._last_refresh = time.monotonic()
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload the shared sketch if another worker has written it"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+
+        sketch = self._load()
+        with self._lock:
+            self._set_view(sketch)
+            self._mtime_ns = mtime_ns
+
+    # Recording ---------------------------------------------------------------
+
+    def _maybe_flush(self) -> None:
+        if self._pending.count >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Warning: Could not persist calibration sketch: {e}")
+
+    def record(self, score: float) -> None:
+        """Add one computed S_hat to the distribution"""
+        with self._lock:
+            self._pending.update(score)
+        self._maybe_flush()
+
+    def record_many(self, scores: Iterable[float]) -> None:
+        """Add a batch of computed S_hat scores to the distribution"""
+        with self._lock:
+            self._pending.update_many(scores)
+        self._maybe_flush()
+
+    # Lookups -----------------------------------------------------------------
+
+    @property
+    def calibrated(self) -> bool:
+        """True once the shared distribution has at least `min_samples` scores"""
+        self.refresh()
+        return self._view.total >= self.min_samples
+
+    def percentile(self, score: float) -> float:
+        """Share of computed scores at or below `score`, 0-100"""
+        if not self.calibrated:
+            return min(100.0, max(0.0, score * 100))
+        return 100.0 * self._view.rank(score)
+
+    def soulmate_threshold(self, top_fraction: float = SOULMATE_TOP_FRACTION) -> float:
+        """S_hat needed to be in the top `top_fraction` of computed scores"""
+        if not self.calibrated:
+            return FALLBACK_SOULMATE_THRESHOLD
+        threshold = self._thresholds.get(top_fraction)
+        if threshold is None:
+            threshold = self._view.quantile(1.0 - top_fraction)
+            self._thresholds[top_fraction] = threshold
+        return threshold
+
+    def is_soulmate_tier(self, score: float, top_fraction: float = SOULMATE_TOP_FRACTION) -> bool:
+        """Whether `score` is in the top `top_fraction` of computed scores"""
+        return score >= self.soulmate_threshold(top_fraction)
+
+
+_calibration: Optional[ScoreCalibration] = None
+_calibration_lock = threading.Lock()
+
+
+def get_calibration() -> ScoreCalibration:
+    """Process-wide calibration service; buffered scores are flushed at exit"""
+    global _calibration
+    if _calibration is None:
+        with _calibration_lock:
+            if _calibration is None:
+                _calibration = ScoreCalibration()
+                atexit.register(_flush_at_exit)
+    return _calibration
+
+
+def _flush_at_exit() -> None:
+    try:
+        _calibration.flush()
+    except OSError:
+        pass
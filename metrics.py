@@ -0,0 +1,225 @@
+"""
+Vectorized Evaluation Metrics
+
+Regression and classification metrics for many prediction vectors at once.
+Predictions are a (n_models, n_samples) batch scored against one shared
+target vector, so ablation configurations (or anything else evaluated on
+the same rows) take a few array operations rather than one masked pass per
+model and metric. A 1-D prediction vector is a batch of one, and results
+keep the batch shape.
+
+Threshold sweeps sort the scores once and read the confusion matrix at
+every threshold off cumulative counts, in O(n log n) instead of O(n) per
+threshold.
+
+Confusion counts are laid out as [..., 4] = (tp, fp, fn, tn).
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def _batch(y_pred: np.ndarray) -> np.ndarray:
+    """Predictions as a 2-D (n_models, n_samples) float array"""
+    return np.atleast_2d(np.asarray(y_pred, dtype=float))
+
+
+def _unbatch(values: np.ndarray, y_pred: np.ndarray) -> np.ndarray:
+    """Drop the batch axis again for 1-D input"""
+    return values[0] if np.ndim(y_pred) == 1 else values
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, 0 where the denominator is 0"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator != 0)
+
+
+# Regression -------------------------------------------------------------------
+
+def regression_scores(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, np.ndarray]:
+    """R², MSE and MAE of every row of `y_pred` against `y_true`"""
+    y_true = np.asarray(y_true, dtype=float)
+    residuals = _batch(y_pred) - y_true
+    if not residuals.shape[1]:
+        zeros = _unbatch(np.zeros(len(residuals)), y_pred)
+        return {"r2": zeros, "mse": zeros, "mae": zeros}
+    ss_res = np.einsum("ij,ij->i", residuals, residuals)
+    ss_tot = np.sum((y_true - y_true.mean()) ** 2)
+    r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else np.zeros(len(residuals))
+    return {
+        "r2": _unbatch(r2, y_pred),
+        "mse": _unbatch(ss_res / residuals.shape[1], y_pred),
+        "mae": _unbatch(np.abs(residuals).mean(axis=1), y_pred),
+    }
+
+
+# Classification ---------------------------------------------------------------
+
+def confusion_matrices(y_true: np.ndarray, y_class_pred: np.ndarray) -> np.ndarray:
+    """(tp, fp, fn, tn) of every row of boolean predictions `y_class_pred`"""
+    labels = np.asarray(y_true).astype(bool)
+    predicted = np.atleast_2d(np.asarray(y_class_pred).astype(bool))
+    tp = predicted.astype(float) @ labels
+    n_predicted = predicted.sum(axis=1)
+    n_positive = labels.sum()
+    counts = np.stack([tp, n_predicted - tp, n_positive - tp, len(labels) - n_predicted - n_positive + tp], axis=-1)
+    return _unbatch(counts, y_class_pred)
+
+
+def classification_scores(confusion: np.ndarray) -> Dict[str, np.ndarray]:
+    """Accuracy, precision, recall and F1 from confusion counts of any batch shape"""
+    confusion = np.asarray(confusion, dtype=float)
+    tp, fp, fn, tn = np.moveaxis(confusion, -1, 0)
+    precision = _divide(tp, tp + fp)
+    recall = _divide(tp, tp + fn)
+    return {
+        "accuracy": _divide(tp + tn, tp + fp + fn + tn),
+        "precision": precision,
+        "recall": recall,
+        "f1": _divide(2 * precision * recall, precision + recall),
+    }
+
+
+def confusion_at_thresholds(scores: np.ndarray, labels: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Confusion counts of `score >= t` for every threshold t and every row
+    of `scores`, from one sort.
+
+    `thresholds` is shared, shape (n_thresholds,), or per row, shape
+    (n_models, n_thresholds). Thresholds and scores are sorted together
+    (thresholds first on ties, so tied scores count as >= t); the running
+    count of positives and negatives at each threshold's position is the
+    number below it.
+
+    Returns counts of shape (n_models, n_thresholds, 4), without the model
+    axis for 1-D scores.
+    """
+    batch = _batch(scores)
+    labels = np.asarray(labels).astype(bool)
+    m, n = batch.shape
+    thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), (m, np.shape(thresholds)[-1]))
+    t = thresholds.shape[1]
+
+    # Thresholds in ascending order per row, so their positions in the
+    # merged sort come out in the same order
+    threshold_order = np.argsort(thresholds, axis=1, kind="stable")
+    merged = np.concatenate([np.take_along_axis(thresholds, threshold_order, axis=1), batch], axis=1)
+    order = np.argsort(merged, axis=1, kind="stable")
+    is_positive = np.concatenate([np.zeros(t, dtype=bool), labels])[order]
+    is_negative = np.concatenate([np.zeros(t, dtype=bool), ~labels])[order]
+    at_threshold = order < t
+    positives_below = np.cumsum(is_positive, axis=1)[at_threshold].reshape(m, t)
+    negatives_below = np.cumsum(is_negative, axis=1)[at_threshold].reshape(m, t)
+
+    n_positive = int(labels.sum())
+    counts = np.stack([
+        n_positive - positives_below,
+        (n - n_positive) - negatives_below,
+        positives_below,
+        negatives_below,
+    ], axis=-1).astype(float)
+    # Back to the caller's threshold order
+    unsorted = np.empty_like(counts)
+    np.put_along_axis(unsorted, threshold_order[..., None], counts, axis=1)
+    return _unbatch(unsorted, scores)
+
+
+def _ranked(scores: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per row, scores and labels in descending score order, the running
+    true-positive count, and for every position the index of the last
+    position tied with it (a tie run is a single threshold).
+    """
+    batch = _batch(scores)
+    labels = np.asarray(labels).astype(bool)
+    order = np.argsort(-batch, axis=1, kind="stable")
+    sorted_scores = np.take_along_axis(batch, order, axis=1)
+    sorted_labels = labels[order]
+    tp = np.cumsum(sorted_labels, axis=1)
+    n = batch.shape[1]
+    run_end = np.concatenate([sorted_scores[:, 1:] != sorted_scores[:, :-1], np.ones((len(batch), 1), dtype=bool)], axis=1)
+    end_index = np.where(run_end, np.arange(n), n)
+    tie_end = np.minimum.accumulate(end_index[:, ::-1], axis=1)[:, ::-1]
+    return sorted_scores, sorted_labels, tp, tie_end
+
+
+def average_precision(scores: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    PR-AUC (average precision, step-wise) of every row of `scores`.
+
+    Each positive contributes the precision at its tie run's end, i.e. at
+    the threshold equal to its score.
+    """
+    _, sorted_labels, tp, tie_end = _ranked(scores, labels)
+    n_positive = sorted_labels[0].sum() if len(sorted_labels) else 0
+    if not n_positive:
+        return _unbatch(np.zeros(len(sorted_labels)), scores)
+    precision = np.take_along_axis(tp, tie_end, axis=1) / (tie_end + 1)
+    return _unbatch((precision * sorted_labels).sum(axis=1) / n_positive, scores)
+
+
+def best_f1_thresholds(scores: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    Per row of `scores`, the threshold t maximizing the F1 of `score >= t`,
+    using F1 = 2 tp / (n_predicted + n_positive) at every distinct score.
+    """
+    sorted_scores, sorted_labels, tp, tie_end = _ranked(scores, labels)
+    n = sorted_scores.shape[1]
+    if not n:
+        return _unbatch(np.full(len(sorted_scores), np.inf), scores)
+    n_positive = sorted_labels[0].sum()
+    f1 = 2 * tp / (np.arange(1, n + 1) + n_positive)
+    # Only the end of a tie run is a reachable cut
+    f1 = np.where(tie_end == np.arange(n), f1, -1.0)
+    best = np.argmax(f1, axis=1)
+    return _unbatch(sorted_scores[np.arange(len(sorted_scores)), best], scores)
+
+
+def prevalence_thresholds(scores: np.ndarray, prevalence: float) -> np.ndarray:
+    """Per row of `scores`, the score above which the top `prevalence` share lies"""
+    batch = _batch(scores)
+    n = batch.shape[1]
+    k = int(round(prevalence * n))
+    if k <= 0:
+        return _unbatch(np.full(len(batch), np.inf), scores)
+    return _unbatch(np.partition(batch, n - k, axis=1)[:, n - k], scores)
+
+
+# Precision-recall curves ------------------------------------------------------
+
+def precision_recall_curve(scores: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Precision and recall of `score >= t` for every distinct score t of a
+    single prediction vector, from one sort and cumulative sums.
+
+    Returns (thresholds in descending order, precision, recall).
+    """
+    sorted_scores, sorted_labels, tp, tie_end = _ranked(np.ravel(scores), labels)
+    last = tie_end[0] == np.arange(sorted_scores.shape[1])
+    n_predicted = np.arange(1, sorted_scores.shape[1] + 1)[last]
+    return precision_recall(sorted_scores[0][last], tp[0][last], n_predicted - tp[0][last], sorted_labels[0].sum())
+
+
+def precision_recall(
+    thresholds: np.ndarray, tp: np.ndarray, fp: np.ndarray, n_positive: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """A precision-recall curve from true/false positive counts at each threshold"""
+    return thresholds, _divide(tp, tp + fp), _divide(tp, np.full(len(tp), n_positive, dtype=float))
+
+
+def pr_auc(precision: np.ndarray, recall: np.ndarray) -> float:
+    """Area under a precision-recall curve (average precision, step-wise)"""
+    if not len(recall):
+        return 0.0
+    return float(np.sum(np.diff(recall, prepend=0.0) * precision))
+
+
+def f1_threshold(thresholds: np.ndarray, precision: np.ndarray, recall: np.ndarray) -> float:
+    """Threshold of a precision-recall curve with the highest F1"""
+    if not len(thresholds):
+        return np.inf
+    return float(thresholds[np.argmax(_divide(2 * precision * recall, precision + recall))])
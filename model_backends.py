@@ -0,0 +1,349 @@
+"""
+Model Backends
+
+Regression models the ablation study can fit, behind one fit/predict
+protocol:
+  - ridge:     closed-form ridge regression in NumPy (the default)
+  - hist_gbt:  histogram-binned gradient boosted trees in pure NumPy, for
+               nonlinear theory effects (e.g. element-compatibility lookups)
+  - sklearn:   any scikit-learn regressor (HistGradientBoostingRegressor by
+               default), if scikit-learn is installed
+  - lightgbm:  LGBMRegressor, if lightgbm is installed
+
+Every backend records how long its last fit and predict took.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+import time
+
+import numpy as np
+
+from ridge import DEFAULT_ALPHA, GramAccumulator, with_intercept, ridge_solve, resolve_alpha
+
+try:
+    from sklearn.base import clone as sklearn_clone
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+try:
+    import lightgbm
+    LIGHTGBM_AVAILABLE = True
+except ImportError:
+    LIGHTGBM_AVAILABLE = False
+
+
+class ModelBackend:
+    """
+    Base class for regression backends.
+
+    Subclasses implement _fit and _predict; fit/predict wrap them with
+    timing. `params` holds the constructor arguments so clone() can build an
+    unfitted copy for each configuration or fold.
+    """
+
+    name = "base"
+
+    def __init__(self, **params: Any):
+        self.params = params
+        self.fit_seconds: Optional[float] = None
+        self.predict_seconds: Optional[float] = None
+
+    def clone(self) -> "ModelBackend":
+        """Unfitted backend with the same parameters"""
+        return type(self)(**self.params)
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> "ModelBackend":
+        start = time.perf_counter()
+        self._fit(np.asarray(X, dtype=float), np.asarray(y, dtype=float))
+        self.fit_seconds = time.perf_counter() - start
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        y_pred = self._predict(np.asarray(X, dtype=float))
+        self.predict_seconds = time.perf_counter() - start
+        return y_pred
+
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class RidgeBackend(ModelBackend):
+    """
+    Ridge regression with an (also penalized) intercept.
+
+    alpha may be "gcv" to choose the penalty on the training data; the value
+    used is stored in `alpha_`.
+    """
+
+    name = "ridge"
+
+    def __init__(self, alpha: Union[float, str] = DEFAULT_ALPHA):
+        super().__init__(alpha=alpha)
+        self.alpha = alpha
+        self.alpha_: Optional[float] = None
+        self.coef_: Optional[np.ndarray] = None
+
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        stats = GramAccumulator(X.shape[1])
+        stats.update(X, y)
+        self.alpha_ = resolve_alpha(self.alpha, stats)
+        self.coef_ = ridge_solve(stats.xtx, stats.xty, self.alpha_)[:, 0]
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        return with_intercept(X) @ self.coef_
+
+
+class HistGradientBoostingBackend(ModelBackend):
+    """
+    Gradient boosted regression trees on quantile-binned features.
+
+    Features are bucketed into at most `max_bins` quantile bins once. Trees
+    grow level by level: the gradient/count histograms of all nodes on a
+    level come from one np.bincount over (node, feature, bin) cells (only
+    the smaller child of each split is counted; its sibling is parent minus
+    child), and every candidate split is scored at once from cumulative
+    sums. No Python loop runs over rows, features or nodes.
+    Squared loss; leaves are shrunk by `l2_regularization`.
+    """
+
+    name = "hist_gbt"
+
+    def __init__(
+        self,
+        n_estimators: int = 100,
+        learning_rate: float = 0.1,
+        max_depth: int = 4,
+        max_bins: int = 64,
+        min_samples_leaf: int = 20,
+        l2_regularization: float = 1.0,
+    ):
+        if not 2 <= max_bins <= 256:
+            raise ValueError("max_bins must be between 2 and 256")
+        super().__init__(
+            n_estimators=n_estimators,
+            learning_rate=learning_rate,
+            max_depth=max_depth,
+            max_bins=max_bins,
+            min_samples_leaf=min_samples_leaf,
+            l2_regularization=l2_regularization,
+        )
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.max_bins = max_bins
+        self.min_samples_leaf = min_samples_leaf
+        self.l2_regularization = l2_regularization
+
+        self.bin_edges_: List[np.ndarray] = []
+        self.baseline_: float = 0.0
+        # Per tree: split feature (-1 = leaf), split bin and leaf value, for
+        # a complete binary tree where node k has children 2k+1 and 2k+2
+        self.trees_: List[Dict[str, np.ndarray]] = []
+
+    # Binning -----------------------------------------------------------------
+
+    def _bin(self, X: np.ndarray) -> np.ndarray:
+        binned = np.empty(X.shape, dtype=np.uint8)
+        for f, edges in enumerate(self.bin_edges_):
+            binned[:, f] = np.searchsorted(edges, X[:, f], side="right")
+        return binned
+
+    def _fit_bins(self, X: np.ndarray) -> None:
+        quantiles = np.linspace(0, 1, self.max_bins + 1)[1:-1]
+        self.bin_edges_ = [np.unique(np.quantile(X[:, f], quantiles)) for f in range(X.shape[1])]
+
+    # Trees -------------------------------------------------------------------
+
+    def _grow_tree(
+        self,
+        flat_bins: np.ndarray,
+        Xb: np.ndarray,
+        root_counts: np.ndarray,
+        residual: np.ndarray,
+    ) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """One tree fit to `residual`; also returns each row's leaf node"""
+        n, d = Xb.shape
+        bins = self.max_bins
+        stride = d * bins
+        n_nodes = 2 ** (self.max_depth + 1) - 1
+        feature = np.full(n_nodes, -1, dtype=np.int64)
+        threshold = np.zeros(n_nodes, dtype=np.int64)
+        value = np.zeros(n_nodes)
+
+        node = np.zeros(n, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+        lam = self.l2_regularization
+
+        # Root gradient histogram of every (feature, bin); counts are fixed per fit
+        hist_g = np.bincount(flat_bins.ravel(), weights=np.repeat(residual, d), minlength=stride).reshape(1, d, bins)
+        hist_n = root_counts
+
+        for depth in range(self.max_depth + 1):
+            first = 2 ** depth - 1
+            width = 2 ** depth
+            rows = np.nonzero(active)[0]
+            local = node[rows] - first
+
+            grad = np.bincount(local, weights=residual[rows], minlength=width)
+            count = np.bincount(local, minlength=width).astype(float)
+            value[first:first + width] = self.learning_rate * grad / (count + lam)
+            if depth == self.max_depth or not len(rows):
+                break
+
+            # Score every split of every node on this level at once
+            left_g = np.cumsum(hist_g, axis=2)[:, :, :-1]
+            left_n = np.cumsum(hist_n, axis=2)[:, :, :-1]
+            right_g = grad[:, None, None] - left_g
+            right_n = count[:, None, None] - left_n
+            gain = (
+                left_g ** 2 / (left_n + lam)
+                + right_g ** 2 / (right_n + lam)
+                - (grad ** 2 / (count + lam))[:, None, None]
+            )
+            gain[(left_n < self.min_samples_leaf) | (right_n < self.min_samples_leaf)] = -np.inf
+
+            best = gain.reshape(width, -1).argmax(axis=1)
+            best_gain = gain.reshape(width, -1)[np.arange(width), best]
+            splits = np.nonzero(best_gain > 1e-12)[0]
+            if not len(splits):
+                break
+            feature[first + splits] = best[splits] // (bins - 1)
+            threshold[first + splits] = best[splits] % (bins - 1)
+
+            # Route rows of split nodes to their children; the rest are leaves
+            row_feature = feature[node[rows]]
+            is_split = row_feature >= 0
+            split_rows = rows[is_split]
+            goes_left = Xb[split_rows, row_feature[is_split]] <= threshold[node[split_rows]]
+            node[split_rows] = 2 * node[split_rows] + np.where(goes_left, 1, 2)
+            active[rows[~is_split]] = False
+            if depth + 1 == self.max_depth:
+                continue
+
+            # Children's histograms: bincount the smaller child of each split,
+            # its sibling is parent - smaller (children of local p are 2p, 2p+1)
+            child = node[split_rows] - (first + width)
+            child_count = np.bincount(child, minlength=2 * width)
+            small = 2 * splits + (child_count[2 * splits] > child_count[2 * splits + 1])
+            is_small = np.zeros(2 * width, dtype=bool)
+            is_small[small] = True
+            small_rows = split_rows[is_small[child]]
+            flat = (flat_bins[small_rows] + (node[small_rows] - (first + width))[:, None] * stride).ravel()
+            size = 2 * width * stride
+            next_g = np.bincount(flat, weights=np.repeat(residual[small_rows], d), minlength=size).reshape(2 * width, d, bins)
+            next_n = np.bincount(flat, minlength=size).reshape(2 * width, d, bins).astype(float)
+            sibling = small ^ 1
+            next_g[sibling] = hist_g[splits] - next_g[small]
+            next_n[sibling] = hist_n[splits] - next_n[small]
+            hist_g, hist_n = next_g, next_n
+
+        return {"feature": feature, "threshold": threshold, "value": value}, node
+
+    def _tree_predict(self, tree: Dict[str, np.ndarray], Xb: np.ndarray) -> np.ndarray:
+        node = np.zeros(len(Xb), dtype=np.int64)
+        rows = np.arange(len(Xb))
+        for _ in range(self.max_depth):
+            row_feature = tree["feature"][node]
+            is_split = row_feature >= 0
+            if not is_split.any():
+                break
+            goes_left = Xb[rows, np.maximum(row_feature, 0)] <= tree["threshold"][node]
+            node = np.where(is_split, 2 * node + np.where(goes_left, 1, 2), node)
+        return tree["value"][node]
+
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        self._fit_bins(X)
+        Xb = self._bin(X)
+        # Index of each (feature, bin) cell, reused by every histogram
+        flat_bins = Xb + np.arange(X.shape[1], dtype=np.intp)[None, :] * self.max_bins
+        root_counts = np.bincount(
+            flat_bins.ravel(), minlength=X.shape[1] * self.max_bins
+        ).reshape(1, X.shape[1], self.max_bins).astype(float)
+        self.baseline_ = float(y.mean()) if len(y) else 0.0
+        pred = np.full(len(y), self.baseline_)
+        self.trees_ = []
+        for _ in range(self.n_estimators):
+            tree, leaf = self._grow_tree(flat_bins, Xb, root_counts, y - pred)
+            self.trees_.append(tree)
+            pred += tree["value"][leaf]
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        Xb = self._bin(X)
+        pred = np.full(len(X), self.baseline_)
+        for tree in self.trees_:
+            pred += self._tree_predict(tree, Xb)
+        return pred
+
+
+class SklearnBackend(ModelBackend):
+    """Adapter for a scikit-learn regressor (default: HistGradientBoostingRegressor)"""
+
+    name = "sklearn"
+
+    def __init__(self, estimator: Any = None):
+        if not SKLEARN_AVAILABLE:
+            raise ImportError("scikit-learn is not installed")
+        super().__init__(estimator=estimator)
+        self.estimator = sklearn_clone(estimator) if estimator is not None else HistGradientBoostingRegressor()
+
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        self.estimator.fit(X, y)
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(self.estimator.predict(X), dtype=float)
+
+
+class LightGBMBackend(ModelBackend):
+    """Adapter for lightgbm.LGBMRegressor; keyword arguments go to the regressor"""
+
+    name = "lightgbm"
+
+    def __init__(self, **params: Any):
+        if not LIGHTGBM_AVAILABLE:
+            raise ImportError("lightgbm is not installed")
+        super().__init__(**params)
+        self.model = lightgbm.LGBMRegressor(verbose=-1, **params)
+
+    def _fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        self.model.fit(X, y)
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict(X), dtype=float)
+
+
+BACKENDS = {
+    RidgeBackend.name: RidgeBackend,
+    HistGradientBoostingBackend.name: HistGradientBoostingBackend,
+    SklearnBackend.name: SklearnBackend,
+    LightGBMBackend.name: LightGBMBackend,
+}
+
+
+def available_backends() -> List[str]:
+    """Names of backends usable in this environment"""
+    names = [RidgeBackend.name, HistGradientBoostingBackend.name]
+    if SKLEARN_AVAILABLE:
+        names.append(SklearnBackend.name)
+    if LIGHTGBM_AVAILABLE:
+        names.append(LightGBMBackend.name)
+    return names
+
+
+def get_backend(backend: Union[str, ModelBackend, None] = None, **params: Any) -> ModelBackend:
+    """
+    Fresh, unfitted backend from a name (extra keyword arguments go to its
+    constructor) or a prototype instance (cloned). None means ridge.
+    """
+    if backend is None:
+        backend = RidgeBackend.name
+    if isinstance(backend, ModelBackend):
+        return backend.clone()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend} (available: {', '.join(available_backends())})")
+    return BACKENDS[backend](**params)
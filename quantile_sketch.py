@@ -0,0 +1,198 @@
+"""
+Streaming Quantile Sketch
+
+KLL sketch (Karnin, Lang & Liberty) for approximate quantiles and ranks over
+unbounded streams of scores:
+  - memory is O(k) regardless of how many values were added
+  - sketches built on different workers/chunks merge into one
+  - rank error is roughly 1.7 / k with high probability (k=200 -> ~1%)
+
+Lookups go through a sorted, cumulative-weight view (`SketchView`), so after
+the view is built each rank/quantile query is a binary search, O(log k).
+"""
+
+from typing import Dict, Iterable, List, Optional
+import bisect
+import math
+import random
+
+import numpy as np
+
+
+class SketchView:
+    """
+    Immutable sorted view of a sketch for O(log k) rank and quantile lookups.
+
+    `values` are the retained items in ascending order and `cum_weights[i]`
+    is the total weight of items <= values[i].
+    """
+
+    def __init__(self, values: List[float], cum_weights: List[float]):
+        self.values = values
+        self.cum_weights = cum_weights
+        self.total = cum_weights[-1] if cum_weights else 0.0
+
+    def rank(self, x: float) -> float:
+        """Fraction of the stream <= x (0.0 for an empty view)"""
+        if not self.total:
+            return 0.0
+        i = bisect.bisect_right(self.values, x)
+        return self.cum_weights[i - 1] / self.total if i else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Smallest retained value whose rank is >= q (None for an empty view)"""
+        if not self.total:
+            return None
+        q = min(1.0, max(0.0, q))
+        i = bisect.bisect_left(self.cum_weights, q * self.total)
+        return self.values[min(i, len(self.values) - 1)]
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch.
+
+    Level h holds items of weight 2^h. When the sketch is over capacity the
+    lowest full level is sorted and every other item (random offset) is
+    promoted to the next level, halving its size while keeping ranks unbiased.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2.0 / 3.0, seed: Optional[int] = None):
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.c = c
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.compactors: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+        self._capacity_cache: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    # Capacity ----------------------------------------------------------------
+
+    def _capacities(self) -> List[int]:
+        levels = len(self.compactors)
+        capacities = self._capacity_cache.get(levels)
+        if capacities is None:
+            capacities = [
+                max(2, int(math.ceil(self.k * self.c ** (levels - 1 - h))))
+                for h in range(levels)
+            ]
+            self._capacity_cache[levels] = capacities
+        return capacities
+
+    def _size(self) -> int:
+        return sum(len(level) for level in self.compactors)
+
+    def _compress(self) -> None:
+        capacities = self._capacities()
+        while self._size() >= sum(capacities):
+            for h, level in enumerate(self.compactors):
+                if len(level) >= capacities[h]:
+                    if h + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    level.sort()
+                    offset = self._rng.randint(0, 1)
+                    # An odd item out stays at this level
+                    keep_last = len(level) % 2
+                    tail = level[-1:] if keep_last else []
+                    body = level[:len(level) - keep_last]
+                    self.compactors[h + 1].extend(body[offset::2])
+                    self.compactors[h] = tail
+                    break
+            capacities = self._capacities()
+
+    # Updates -----------------------------------------------------------------
+
+    def update(self, x: float) -> None:
+        """Add one value"""
+        x = float(x)
+        if x != x:
+            return
+        self.count += 1
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.compactors[0].append(x)
+        if len(self.compactors[0]) >= self._capacities()[0]:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        """Add many values (NaN is skipped)"""
+        arr = np.asarray(values, dtype=np.float64).ravel()
+        arr = arr[~np.isnan(arr)]
+        if not len(arr):
+            return
+        self.count += len(arr)
+        lo, hi = float(arr.min()), float(arr.max())
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+        # Feed level 0 in capacity-sized slices so large arrays never sit
+        # uncompressed in the sketch
+        step = max(self._capacities()[0], self.k)
+        for start in range(0, len(arr), step):
+            self.compactors[0].extend(arr[start:start + step].tolist())
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        """Fold another sketch into this one"""
+        if other.count == 0:
+            return
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for h, level in enumerate(other.compactors):
+            self.compactors[h].extend(level)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    # Queries -----------------------------------------------------------------
+
+    def view(self) -> SketchView:
+        """Sorted cumulative-weight view for repeated lookups"""
+        values = []
+        weights = []
+        for h, level in enumerate(self.compactors):
+            values.extend(level)
+            weights.extend([1 << h] * len(level))
+        if not values:
+            return SketchView([], [])
+
+        order = np.argsort(values, kind="stable")
+        sorted_values = np.asarray(values)[order]
+        cum_weights = np.cumsum(np.asarray(weights, dtype=np.float64)[order])
+        return SketchView(sorted_values.tolist(), cum_weights.tolist())
+
+    def rank(self, x: float) -> float:
+        """Approximate fraction of values <= x"""
+        return self.view().rank(x)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0 <= q <= 1)"""
+        return self.view().quantile(q)
+
+    # Serialization -----------------------------------------------------------
+
+    def to_dict(self) -> Dict:
+        return {
+            "k": self.k,
+            "c": self.c,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "compactors": self.compactors,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(k=data.get("k", 200), c=data.get("c", 2.0 / 3.0))
+        sketch.count = data.get("count", 0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        sketch.compactors = [list(level) for level in data.get("compactors", [[]])] or [[]]
+        return sketch
@@ -0,0 +1,287 @@
+"""
+Ridge Regression Kernels
+
+Sufficient-statistic ridge regression for the ablation study:
+  - GramAccumulator streams X^T X, X^T y and the target moments over chunks,
+    so a fit needs O(d^2) memory however many rows are seen
+  - train/test membership comes from a hash of the pair id, so a pair lands
+    in the same split whichever chunk (or run) it arrives in
+  - test R^2/MSE follow from the test set's own sufficient statistics,
+    without keeping predictions around
+
+An intercept column is always prepended and, as in the original in-memory
+fit, penalized along with the other coefficients.
+"""
+
+from typing import Iterable, Tuple, Union
+import hashlib
+
+import numpy as np
+
+
+DEFAULT_ALPHA = 0.1
+
+# Alphas searched when the penalty is chosen by generalized cross-validation
+DEFAULT_ALPHA_GRID = np.logspace(-4, 4, 100)
+
+
+def pair_key(pair) -> str:
+    """Stable id of a Pair: metadata["pair_id"] if set, else both person ids"""
+    return str(pair.metadata.get("pair_id") or f"{pair.person_i_id}|{pair.person_j_id}")
+
+
+def hash_unit(keys: Iterable[str], seed: int = 0) -> np.ndarray:
+    """Deterministic pseudo-uniform value in [0, 1) for each key"""
+    salt = str(seed).encode()
+    values = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8, key=salt).digest(), "little")
+            for key in keys
+        ),
+        dtype=np.uint64,
+    )
+    return values / 2.0 ** 64
+
+
+def hash_test_mask(keys: Iterable[str], test_size: float = 0.2, seed: int = 0) -> np.ndarray:
+    """True for keys assigned to the test split (about `test_size` of them)"""
+    return hash_unit(keys, seed) < test_size
+
+
+def hash_folds(keys: Iterable[str], n_folds: int, seed: int = 0) -> np.ndarray:
+    """Fold index in [0, n_folds) for each key"""
+    return np.minimum((hash_unit(keys, seed) * n_folds).astype(int), n_folds - 1)
+
+
+def with_intercept(X: np.ndarray) -> np.ndarray:
+    """Prepend a column of ones"""
+    return np.column_stack([np.ones(len(X)), X])
+
+
+class GramAccumulator:
+    """
+    Running sufficient statistics of (X, Y) for ridge fits and metrics.
+
+    Holds X^T X and X^T Y (intercept included), plus the per-target sums
+    of y and y^2 and the row count. Chunks can be added in any order and
+    accumulators merged, so workers can each stream part of the data.
+    """
+
+    def __init__(self, n_features: int, n_targets: int = 1):
+        d = n_features + 1
+        self.xtx = np.zeros((d, d))
+        self.xty = np.zeros((d, n_targets))
+        self.y_sum = np.zeros(n_targets)
+        self.yty = np.zeros(n_targets)
+        self.n = 0
+
+    def update(self, X: np.ndarray, y: np.ndarray) -> None:
+        """Add rows of X (without intercept) and their targets"""
+        if not len(X):
+            return
+        Xi = with_intercept(np.asarray(X, dtype=float))
+        Y = np.asarray(y, dtype=float).reshape(len(Xi), -1)
+        self.xtx += Xi.T @ Xi
+        self.xty += Xi.T @ Y
+        self.y_sum += Y.sum(axis=0)
+        self.yty += np.einsum("ij,ij->j", Y, Y)
+        self.n += len(Xi)
+
+    def merge(self, other: "GramAccumulator") -> None:
+        """Fold another accumulator's rows into this one"""
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.y_sum += other.y_sum
+        self.yty += other.yty
+        self.n += other.n
+
+    def copy(self) -> "GramAccumulator":
+        """Independent copy of the statistics"""
+        result = GramAccumulator(0, 0)
+        result.xtx = self.xtx.copy()
+        result.xty = self.xty.copy()
+        result.y_sum = self.y_sum.copy()
+        result.yty = self.yty.copy()
+        result.n = self.n
+        return result
+
+    def __sub__(self, other: "GramAccumulator") -> "GramAccumulator":
+        """Statistics of this accumulator's rows minus `other`'s (a subset of them)"""
+        result = self.copy()
+        result.xtx -= other.xtx
+        result.xty -= other.xty
+        result.y_sum -= other.y_sum
+        result.yty -= other.yty
+        result.n -= other.n
+        return result
+
+    def select(self, columns: np.ndarray) -> "GramAccumulator":
+        """Statistics restricted to the given feature columns (intercept kept)"""
+        index = np.concatenate([[0], np.asarray(columns, dtype=int) + 1])
+        result = self.copy()
+        result.xtx = self.xtx[np.ix_(index, index)]
+        result.xty = self.xty[index]
+        return result
+
+
+def ridge_solve(xtx: np.ndarray, xty: np.ndarray, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """
+    Solve (X^T X + alpha I) B = X^T Y.
+
+    Falls back to predicting the training mean (intercept only) if the
+    system is singular.
+    """
+    try:
+        return np.linalg.solve(xtx + alpha * np.eye(len(xtx)), xty)
+    except np.linalg.LinAlgError:
+        coef = np.zeros_like(xty)
+        if xtx[0, 0] > 0:
+            coef[0] = xty[0] / xtx[0, 0]
+        return coef
+
+
+def ridge_path(
+    stats: GramAccumulator,
+    alphas: np.ndarray = DEFAULT_ALPHA_GRID,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ridge coefficients for every alpha in `alphas` from one eigendecomposition.
+
+    With X^T X = Q diag(lam) Q^T, B(alpha) = Q diag(1 / (lam + alpha)) Q^T X^T Y,
+    so the whole path costs one O(d^3) decomposition plus O(d^2) per alpha.
+
+    Returns (coefs of shape (n_alphas, d, n_targets), degrees of freedom
+    tr H(alpha) of shape (n_alphas,)).
+    """
+    alphas = np.asarray(alphas, dtype=float)
+    lam, Q = np.linalg.eigh(stats.xtx)
+    lam = np.maximum(lam, 0.0)
+    shrink = 1.0 / (lam[None, :] + alphas[:, None])                    # (a, d)
+    coefs = np.einsum("ij,aj,jt->ait", Q, shrink, Q.T @ stats.xty)
+    dof = (lam[None, :] * shrink).sum(axis=1)
+    return coefs, dof
+
+
+def gcv_scores(
+    stats: GramAccumulator,
+    alphas: np.ndarray = DEFAULT_ALPHA_GRID,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generalized cross-validation score per alpha and target,
+    GCV = (RSS / n) / (1 - tr H / n)^2, from the training statistics alone.
+
+    Returns (scores of shape (n_alphas, n_targets), path coefficients).
+    """
+    coefs, dof = ridge_path(stats, alphas)
+    rss = np.array([residual_sum_of_squares(coef, stats) for coef in coefs])
+    n = max(stats.n, 1)
+    denom = np.maximum(1.0 - dof / n, 1e-12) ** 2
+    return rss / n / denom[:, None], coefs
+
+
+def select_alpha_gcv(stats: GramAccumulator, alphas: np.ndarray = DEFAULT_ALPHA_GRID) -> float:
+    """Alpha minimizing GCV (mean over targets, since they share one penalty)"""
+    alphas = np.asarray(alphas, dtype=float)
+    scores, _ = gcv_scores(stats, alphas)
+    return float(alphas[np.argmin(scores.mean(axis=1))])
+
+
+def resolve_alpha(alpha: Union[float, str], stats: GramAccumulator) -> float:
+    """A fixed alpha as-is, or the GCV choice on `stats` when alpha is "gcv"."""
+    if alpha == "gcv":
+        return select_alpha_gcv(stats)
+    return float(alpha)
+
+
+def residual_sum_of_squares(coef: np.ndarray, stats: GramAccumulator) -> np.ndarray:
+    """Per-target sum of (y - X b)^2 over the rows in `stats`"""
+    coef = coef.reshape(len(stats.xtx), -1)
+    cross = np.einsum("it,it->t", coef, stats.xty)
+    quad = np.einsum("it,ij,jt->t", coef, stats.xtx, coef)
+    return np.maximum(stats.yty - 2.0 * cross + quad, 0.0)
+
+
+def regression_metrics(coef: np.ndarray, stats: GramAccumulator) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-target (R^2, MSE) of `coef` on the rows summarized by `stats`"""
+    if not stats.n:
+        zeros = np.zeros(stats.xty.shape[1])
+        return zeros, zeros
+    ss_res = residual_sum_of_squares(coef, stats)
+    ss_tot = stats.yty - stats.y_sum ** 2 / stats.n
+    r2 = np.where(ss_tot > 0, 1.0 - ss_res / np.where(ss_tot > 0, ss_tot, 1.0), 0.0)
+    return r2, ss_res / stats.n
+
+
+def permutation_gains(
+    X: np.ndarray,
+    Z: np.ndarray,
+    y: np.ndarray,
+    n_permutations: int = 1000,
+    alpha: float = DEFAULT_ALPHA,
+    seed: int = 0,
+    max_batch_elements: int = 4_000_000,
+) -> Tuple[float, np.ndarray]:
+    """
+    In-sample R^2 gain from appending columns Z to X, for the real Z and for
+    `n_permutations` row shuffles of Z.
+
+    The baseline system A = X^T X + alpha I is inverted once. Each
+    permutation only refits the appended block through the Schur complement
+    S = Z^T Z + alpha I - C^T A^-1 C with C = X^T Z_perm, and A^-1 C for a
+    whole batch of permutations is a single multi-RHS product, so B
+    permutations cost about one extra pass over (X, Z) rather than B fits.
+
+    Returns (observed gain, array of gains under permutation).
+    """
+    Xi = with_intercept(np.asarray(X, dtype=float))
+    Z = np.asarray(Z, dtype=float).reshape(len(Xi), -1)
+    y = np.asarray(y, dtype=float)
+    n, d = Xi.shape
+    p = Z.shape[1]
+
+    G = Xi.T @ Xi
+    A_inv = np.linalg.inv(G + alpha * np.eye(d))
+    xty = Xi.T @ y
+    beta0 = A_inv @ xty
+    yty = y @ y
+    rss_base = yty - 2.0 * beta0 @ xty + beta0 @ G @ beta0
+    ss_tot = yty - n * y.mean() ** 2
+    ztz = Z.T @ Z
+    D = ztz + alpha * np.eye(p)
+
+    def gains(Z_batch: np.ndarray) -> np.ndarray:
+        # Z_batch is (n, b * p): b permuted copies of Z side by side, so the
+        # cross products for the whole batch are single GEMMs
+        b = Z_batch.shape[1] // p
+        C_flat = Xi.T @ Z_batch                                        # (d, b * p)
+        zty = (y @ Z_batch).reshape(b, p)
+        A_inv_C = (A_inv @ C_flat).reshape(d, b, p).transpose(1, 0, 2)  # (b, d, p)
+        C = C_flat.reshape(d, b, p).transpose(1, 0, 2)
+        S = D - np.matmul(C.transpose(0, 2, 1), A_inv_C)               # (b, p, p)
+        rhs = zty - np.einsum("bdp,d->bp", C, beta0)
+        beta_z = np.linalg.solve(S, rhs[..., None])[..., 0]
+        beta_x = beta0 - np.einsum("bdp,bp->bd", A_inv_C, beta_z)
+        rss = (
+            yty
+            - 2.0 * (beta_x @ xty + np.einsum("bp,bp->b", beta_z, zty))
+            + np.einsum("bi,ij,bj->b", beta_x, G, beta_x)
+            + 2.0 * np.einsum("bi,bip,bp->b", beta_x, C, beta_z)
+            + np.einsum("bp,pq,bq->b", beta_z, ztz, beta_z)
+        )
+        return (rss_base - rss) / ss_tot if ss_tot > 0 else np.zeros(b)
+
+    observed = float(gains(Z)[0])
+
+    rng = np.random.default_rng(seed)
+    batch = max(1, max_batch_elements // max(n * p, 1))
+    null = []
+    for start in range(0, n_permutations, batch):
+        size = min(batch, n_permutations - start)
+        perms = rng.permuted(np.broadcast_to(np.arange(n), (size, n)), axis=1)
+        null.append(gains(Z[perms.T].reshape(n, size * p)))
+    return observed, np.concatenate(null) if null else np.zeros(0)
+
+
+def permutation_p_value(observed: float, null: np.ndarray) -> float:
+    """One-sided p-value of `observed` against a permutation null, (1 + #>=) / (B + 1)"""
+    return float((1 + np.sum(null >= observed)) / (len(null) + 1))
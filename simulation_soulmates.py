@@ -18,7 +18,10 @@ from base_model import (
     PersonVector32, ResonanceVector7, OutcomeVectorY,
     CompatibilityModel
 )
-from analysis import add_soulmate_flag, run_ablation_study, ModelComparator, FeatureExtractor, ModelResults, DecisionThresholds
+from analysis import (
+    add_soulmate_flag, run_ablation_study, ModelComparator, FeatureExtractor, ModelResults, DecisionThresholds,
+    meets_keep_thresholds,
+)
 
 # Zodiac signs and elements
 ZODIAC_SIGNS = [
@@ -348,39 +351,116 @@ def evaluate_world_once(config: WorldConfig, thresholds: DecisionThresholds, see
     )
 
 
-def evaluate_world_multi_seed(
-    config: WorldConfig,
-    thresholds: DecisionThresholds,
-    n_seeds: int = 10
-) -> Dict[str, Any]:
+def ablation_deltas(config: WorldConfig, seed: int) -> Dict[str, float]:
     """
-    Evaluate a world configuration across multiple seeds.
+    Run the ablation study once for a world and seed, and return what the
+    KEEP rule compares: ΔR²/ΔF1 of astrology and numerology against the
+    baseline and of numerology against astrology (NaN when a feature set
+    is missing), plus the best soulmate F1.
     
-    Returns summary with accuracy across seeds.
+    Decisions for any thresholds follow from these without refitting.
     """
-    correct_count = 0
-    f1_scores = []
+    random.seed(seed)
+    np.random.seed(seed)
     
-    for seed in range(n_seeds):
-        result = evaluate_world_once(config, thresholds, seed)
-        if result.correct:
-            correct_count += 1
-        f1_scores.append(result.soulmate_f1)
+    config.seed = seed
+    dataset = generate_world_dataset(config)
+    add_soulmate_flag(dataset, top_percent=config.top_percent_soulmates, use_s_true=True)
     
-    accuracy = correct_count / n_seeds
-    avg_f1 = np.mean(f1_scores) if f1_scores else 0.0
+    structured_results = run_ablation_study(
+        dataset,
+        test_size=0.2,
+        random_state=seed,
+        include_classification=True,
+        verbose=False,
+    )
+    raw = structured_results["_raw_results"]
+    baseline = raw.get("baseline")
+    astro = raw.get("baseline_astrology")
+    num = raw.get("baseline_numerology")
+    
+    def delta(result: Optional[ModelResults], reference: Optional[ModelResults], metric: str) -> float:
+        if result is None or reference is None:
+            return np.nan
+        value, reference_value = getattr(result, metric), getattr(reference, metric)
+        if value is None:
+            return np.nan
+        return value - (reference_value or 0.0)
+    
+    f1_scores = [r.classification_f1 or 0.0 for r in (baseline, astro, num) if r is not None]
+    return {
+        "astro_r2": delta(astro, baseline, "r2_score"),
+        "astro_f1": delta(astro, baseline, "classification_f1"),
+        "num_r2": delta(num, baseline, "r2_score"),
+        "num_f1": delta(num, baseline, "classification_f1"),
+        "num_vs_astro_r2": delta(num, astro, "r2_score"),
+        "num_vs_astro_f1": delta(num, astro, "classification_f1"),
+        "soulmate_f1": max(f1_scores) if f1_scores else 0.0,
+    }
+
+
+def stack_deltas(per_seed: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
+    """ablation_deltas of several seeds as one array per quantity"""
+    return {key: np.array([d[key] for d in per_seed]) for key in per_seed[0]}
+
+
+def correct_decisions(
+    config: WorldConfig,
+    deltas: Dict[str, np.ndarray],
+    r2_min_delta_keep: np.ndarray,
+    f1_min_delta_keep: np.ndarray,
+) -> np.ndarray:
+    """
+    Whether both decisions match the world's ground truth, for every seed
+    in `deltas` and every threshold (broadcast; thresholds typically carry
+    leading grid axes, seeds the last axis).
+    
+    Same rule as ModelComparator.get_decisions: astrology is kept on its
+    gain over the baseline, numerology on its gain over the baseline or
+    over astrology.
+    """
+    def keep(prefix: str) -> np.ndarray:
+        return meets_keep_thresholds(deltas[f"{prefix}_r2"], deltas[f"{prefix}_f1"], r2_min_delta_keep, f1_min_delta_keep)
     
+    astro_keep = keep("astro")
+    num_keep = keep("num") | keep("num_vs_astro")
+    # A missing feature set is decided "N/A", which is never correct
+    present = ~np.isnan(deltas["astro_r2"]) & ~np.isnan(deltas["num_r2"])
+    return (astro_keep == (config.astro_effect_strength > 0)) & (num_keep == (config.num_effect_strength > 0)) & present
+
+
+def _world_summary(config: WorldConfig, correct: np.ndarray, soulmate_f1: np.ndarray) -> Dict[str, Any]:
+    n_seeds = len(correct)
+    correct_count = int(np.sum(correct))
     return {
         "world": config.name,
         "astro_effect": config.astro_effect_strength,
         "num_effect": config.num_effect_strength,
-        "accuracy": accuracy,
+        "accuracy": correct_count / n_seeds if n_seeds else 0.0,
         "correct_count": correct_count,
         "n_seeds": n_seeds,
-        "avg_soulmate_f1": avg_f1,
+        "avg_soulmate_f1": float(np.mean(soulmate_f1)) if len(soulmate_f1) else 0.0,
     }
 
 
+def evaluate_world_multi_seed(
+    config: WorldConfig,
+    thresholds: DecisionThresholds,
+    n_seeds: int = 10
+) -> Dict[str, Any]:
+    """
+    Evaluate a world configuration across multiple seeds.
+    
+    Each seed's study runs once; decisions for all seeds are then made in
+    one batched pass over their deltas.
+    
+    Returns summary with accuracy across seeds.
+    """
+    deltas = stack_deltas([ablation_deltas(config, seed) for seed in range(n_seeds)])
+    correct = correct_decisions(config, deltas, thresholds.r2_min_delta_keep, thresholds.f1_min_delta_keep)
+    return _world_summary(config, correct, deltas["soulmate_f1"])
+
+
 def sweep_thresholds(
     worlds: List[WorldConfig],
     r2_thresholds: List[float],
@@ -390,6 +470,10 @@ def sweep_thresholds(
     """
     Sweep threshold combinations to find optimal settings.
     
+    Thresholds only enter the KEEP/DISCARD decisions, so each world and
+    seed is studied once and the whole (R² × F1 threshold) grid is decided
+    with broadcast array operations on the stored deltas.
+    
     Returns best thresholds and per-world accuracies.
     """
     print("\n" + "=" * 80)
@@ -397,7 +481,28 @@ def sweep_thresholds(
     print("=" * 80)
     print(f"Testing {len(r2_thresholds)} R² thresholds × {len(f1_thresholds)} F1 thresholds")
     print(f"Running {n_seeds} seeds per world × {len(worlds)} worlds")
-    print(f"Total evaluations: {len(r2_thresholds) * len(f1_thresholds) * len(worlds) * n_seeds}")
+    print(f"Ablation runs: {len(worlds) * n_seeds} "
+          f"(decisions for {len(r2_thresholds) * len(f1_thresholds) * len(worlds) * n_seeds} evaluations)")
+    
+    # Grid axes (r2, f1, seed)
+    r2_grid = np.asarray(r2_thresholds, dtype=float)[:, None, None]
+    f1_grid = np.asarray(f1_thresholds, dtype=float)[None, :, None]
+    
+    world_correct = []
+    world_f1 = []
+    for world in worlds:
+        try:
+            deltas = stack_deltas([ablation_deltas(world, seed) for seed in range(n_seeds)])
+            correct = correct_decisions(world, deltas, r2_grid, f1_grid)
+            world_correct.append(np.broadcast_to(correct, (len(r2_thresholds), len(f1_thresholds), n_seeds)))
+            world_f1.append(deltas["soulmate_f1"])
+        except Exception as e:
+            print(f"  Error evaluating {world.name}: {e}")
+            import traceback
+            traceback.print_exc()
+            # Count the failed world as all-wrong
+            world_correct.append(None)
+            world_f1.append(None)
     
     best_accuracy = -1.0  # Start below 0 so first result always wins
     best_thresholds = None
@@ -405,28 +510,16 @@ def sweep_thresholds(
     
     all_results = []
     
-    for r2_thresh in r2_thresholds:
-        for f1_thresh in f1_thresholds:
+    for i, r2_thresh in enumerate(r2_thresholds):
+        for j, f1_thresh in enumerate(f1_thresholds):
             thresholds = DecisionThresholds(
                 r2_min_delta_keep=r2_thresh,
                 f1_min_delta_keep=f1_thresh,
             )
             
             world_results = []
-            total_correct = 0
-            total_decisions = 0
-            
-            for world in worlds:
-                try:
-                    result = evaluate_world_multi_seed(world, thresholds, n_seeds)
-                    world_results.append(result)
-                    total_correct += result["correct_count"]
-                    total_decisions += result["n_seeds"]
-                except Exception as e:
-                    print(f"  Error evaluating {world.name}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # Add failed result
+            for world, correct, f1_scores in zip(worlds, world_correct, world_f1):
+                if correct is None:
                     world_results.append({
                         "world": world.name,
                         "accuracy": 0.0,
@@ -436,8 +529,11 @@ def sweep_thresholds(
                         "n_seeds": n_seeds,
                         "avg_soulmate_f1": 0.0,
                     })
-                    total_decisions += n_seeds
+                else:
+                    world_results.append(_world_summary(world, correct[i, j], f1_scores))
             
+            total_correct = sum(result["correct_count"] for result in world_results)
+            total_decisions = sum(result["n_seeds"] for result in world_results)
             overall_accuracy = total_correct / total_decisions if total_decisions > 0 else 0.0
             
             all_results.append({
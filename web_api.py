@@ -19,6 +19,7 @@ from base_model import (
 )
 from data_schema import Person, Pair, Dataset
 from analysis import FeatureExtractor, ModelComparator, DecisionThresholds
+from calibration import get_calibration
 
 app = FastAPI(
     title="Soulmate Compatibility API",
@@ -271,12 +272,11 @@ async def calculate_compatibility(pair: PairInput):
             astrology_score=astrology_score,
         )
         
-        # Determine soulmate tier (top 10% - this is a placeholder)
-        # In production, you'd compare against a distribution
-        soulmate_tier = result["S_hat"] >= 0.7  # Placeholder threshold
-        
-        # Calculate percentile (placeholder - would need distribution)
-        percentile = min(100.0, max(0.0, result["S_hat"] * 100))
+        # Soulmate tier (top 10%) and percentile against all computed scores
+        calibration = get_calibration()
+        soulmate_tier = calibration.is_soulmate_tier(result["S_hat"])
+        percentile = calibration.percentile(result["S_hat"])
+        calibration.record(result["S_hat"])
         
         # Generate recommendations
         recommendations = []
@@ -1,14 +1,38 @@
 """
 API Usage Analytics and Tracking
+
+Usage statistics are computed in the database with GROUP BY aggregates over
+(endpoint, status_code), using the (partner_id, timestamp) index, so only
+one row per endpoint/status pair comes back however many requests there were.
+
+Latency percentiles (p50/p95/p99, overall and per endpoint) come from
+log-bucketed histograms (api/latency_histogram.py) built from the distinct
+response times in the range.
+
+With USAGE_ROLLUPS enabled (api/usage_rollups.py), stats read whole hours
+from the hour rollup, whole minutes at either end from the minute rollup
+and only the partial minutes at the very ends from api_usage.
 """
 
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
-from database.models import APIUsage, Partner
+from database.models import APIUsage, APIUsageRollup, Partner
+from api.latency_histogram import LatencyHistogram
+from api.timing import timed
+from api.usage_rollups import USAGE_ROLLUPS, add_to_rollups, plan_range
 import uuid
 
 
+# (endpoint, status_code, requests, total response time, timed requests)
+UsageGroup = Tuple[str, int, int, int, int]
+
+# Latency histogram per endpoint
+EndpointHistograms = Dict[str, LatencyHistogram]
+
+
+@timed("db_write")
 async def track_api_usage(
     partner_id: str,
     endpoint: str,
@@ -51,10 +75,12 @@ async def track_api_usage(
             request_size=request_size,
             response_size=response_size,
             timestamp=datetime.utcnow(),
-            metadata=metadata or {},
+            request_metadata=metadata or {},
         )
         
         db.add(usage)
+        if USAGE_ROLLUPS:
+            add_to_rollups(usage, db)
         db.commit()
     except Exception as e:
         # Log error but don't fail the request
@@ -62,6 +88,105 @@ async def track_api_usage(
         db.rollback()
 
 
+def _merge_histograms(into: EndpointHistograms, histograms: EndpointHistograms) -> None:
+    for endpoint, histogram in histograms.items():
+        into.setdefault(endpoint, LatencyHistogram()).merge(histogram)
+
+
+def _raw_usage(
+    partner_uuid: uuid.UUID,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    db: Session,
+    end_inclusive: bool = True,
+) -> Tuple[List[UsageGroup], EndpointHistograms]:
+    """Aggregate api_usage rows per (endpoint, status_code), and latencies per endpoint, over a time range"""
+    # Only truthy response times count towards the average
+    timed = APIUsage.response_time > 0
+    groups = db.query(
+        APIUsage.endpoint,
+        APIUsage.status_code,
+        func.count(),
+        func.coalesce(func.sum(case((timed, APIUsage.response_time), else_=0)), 0),
+        func.count(case((timed, 1))),
+    ).filter(APIUsage.partner_id == partner_uuid)
+    latencies = db.query(
+        APIUsage.endpoint,
+        APIUsage.response_time,
+        func.count(),
+    ).filter(APIUsage.partner_id == partner_uuid, timed)
+    
+    if start:
+        groups = groups.filter(APIUsage.timestamp >= start)
+        latencies = latencies.filter(APIUsage.timestamp >= start)
+    if end:
+        before_end = APIUsage.timestamp <= end if end_inclusive else APIUsage.timestamp < end
+        groups = groups.filter(before_end)
+        latencies = latencies.filter(before_end)
+    
+    # One row per distinct (endpoint, response time) in milliseconds
+    histograms: EndpointHistograms = {}
+    for endpoint, response_time, count in latencies.group_by(APIUsage.endpoint, APIUsage.response_time):
+        histograms.setdefault(endpoint, LatencyHistogram()).add(response_time, int(count))
+    
+    return groups.group_by(APIUsage.endpoint, APIUsage.status_code).all(), histograms
+
+
+def _rollup_usage(
+    partner_uuid: uuid.UUID,
+    granularity: str,
+    first_bucket: Optional[datetime],
+    end_bucket: Optional[datetime],
+    db: Session,
+) -> Tuple[List[UsageGroup], EndpointHistograms]:
+    """Rollup rows of one granularity for buckets in [first_bucket, end_bucket), and latencies per endpoint"""
+    query = db.query(
+        APIUsageRollup.endpoint,
+        APIUsageRollup.status_code,
+        APIUsageRollup.request_count,
+        APIUsageRollup.response_time_total,
+        APIUsageRollup.response_time_count,
+        APIUsageRollup.latency_histogram,
+    ).filter(
+        APIUsageRollup.partner_id == partner_uuid,
+        APIUsageRollup.granularity == granularity,
+    )
+    
+    if first_bucket:
+        query = query.filter(APIUsageRollup.bucket_start >= first_bucket)
+    if end_bucket:
+        query = query.filter(APIUsageRollup.bucket_start < end_bucket)
+    
+    groups = []
+    histograms: EndpointHistograms = {}
+    for endpoint, status_code, count, response_time_total, response_time_count, histogram in query:
+        groups.append((endpoint, status_code, count, response_time_total, response_time_count))
+        _merge_histograms(histograms, {endpoint: LatencyHistogram.from_dict(histogram)})
+    return groups, histograms
+
+
+def _usage(
+    partner_uuid: uuid.UUID,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    db: Session,
+) -> Tuple[List[UsageGroup], EndpointHistograms]:
+    """Per-(endpoint, status_code) aggregates and per-endpoint latencies for [start, end], from the rollups where possible"""
+    if not USAGE_ROLLUPS:
+        return _raw_usage(partner_uuid, start, end, db)
+    
+    groups: List[UsageGroup] = []
+    histograms: EndpointHistograms = {}
+    for granularity, piece_start, piece_end, end_inclusive in plan_range(start, end):
+        if granularity:
+            piece_groups, piece_histograms = _rollup_usage(partner_uuid, granularity, piece_start, piece_end, db)
+        else:
+            piece_groups, piece_histograms = _raw_usage(partner_uuid, piece_start, piece_end, db, end_inclusive)
+        groups += piece_groups
+        _merge_histograms(histograms, piece_histograms)
+    return groups, histograms
+
+
 def get_usage_stats(
     partner_id: str,
     start_date: Optional[datetime] = None,
@@ -78,52 +203,51 @@ def get_usage_stats(
             "failed_requests": int,
             "average_response_time": float,
             "endpoints": {endpoint: count},
+            "endpoint_errors": {endpoint: non-2xx count},
             "status_codes": {code: count},
+            "latency_ms": {"p50": float, "p95": float, "p99": float},
+            "endpoint_latency_ms": {endpoint: {"p50": ..., "p95": ..., "p99": ...}},
         }
+    
+    Percentiles are within 1% of the exact response times and are empty
+    when no request in the range has one.
     """
     if not db:
         return {}
     
-    query = db.query(APIUsage).filter(APIUsage.partner_id == uuid.UUID(partner_id))
-    
-    if start_date:
-        query = query.filter(APIUsage.timestamp >= start_date)
-    if end_date:
-        query = query.filter(APIUsage.timestamp <= end_date)
-    
-    usage_records = query.all()
-    
-    if not usage_records:
-        return {
-            "total_requests": 0,
-            "successful_requests": 0,
-            "failed_requests": 0,
-            "average_response_time": 0.0,
-            "endpoints": {},
-            "status_codes": {},
-        }
-    
-    total = len(usage_records)
-    successful = sum(1 for u in usage_records if 200 <= u.status_code < 300)
-    failed = total - successful
-    
-    response_times = [u.response_time for u in usage_records if u.response_time]
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0.0
+    groups, histograms = _usage(uuid.UUID(partner_id), start_date, end_date, db)
     
+    total = 0
+    successful = 0
+    response_time_total = 0
+    response_time_count = 0
     endpoints = {}
-    for u in usage_records:
-        endpoints[u.endpoint] = endpoints.get(u.endpoint, 0) + 1
-    
+    endpoint_errors = {}
     status_codes = {}
-    for u in usage_records:
-        status_codes[u.status_code] = status_codes.get(u.status_code, 0) + 1
+    for endpoint, status_code, count, group_response_time, group_timed in groups:
+        count = int(count)
+        total += count
+        if 200 <= status_code < 300:
+            successful += count
+        else:
+            endpoint_errors[endpoint] = endpoint_errors.get(endpoint, 0) + count
+        response_time_total += int(group_response_time or 0)
+        response_time_count += int(group_timed or 0)
+        endpoints[endpoint] = endpoints.get(endpoint, 0) + count
+        status_codes[status_code] = status_codes.get(status_code, 0) + count
+    
+    overall = LatencyHistogram()
+    for histogram in histograms.values():
+        overall.merge(histogram)
     
     return {
         "total_requests": total,
         "successful_requests": successful,
-        "failed_requests": failed,
-        "average_response_time": avg_response_time,
+        "failed_requests": total - successful,
+        "average_response_time": response_time_total / response_time_count if response_time_count else 0.0,
         "endpoints": endpoints,
+        "endpoint_errors": endpoint_errors,
         "status_codes": status_codes,
+        "latency_ms": overall.percentiles(),
+        "endpoint_latency_ms": {endpoint: histogram.percentiles() for endpoint, histogram in histograms.items()},
     }
-
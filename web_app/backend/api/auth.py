@@ -11,6 +11,7 @@ from fastapi import Header, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
 from database.connection import get_db
 from database.models import Partner, APIKey
+from api.timing import span, timed
 
 
 # Rate limit configuration per tier
@@ -19,21 +20,29 @@ RATE_LIMITS = {
         "per_minute": 60,
         "per_day": 10000,
         "batch_limit": 10,
+        "max_concurrent_jobs": 1,
+        "max_queued_jobs": 5,
     },
     "professional": {
         "per_minute": 300,
         "per_day": 100000,
         "batch_limit": 50,
+        "max_concurrent_jobs": 2,
+        "max_queued_jobs": 10,
     },
     "enterprise": {
         "per_minute": 1000,
         "per_day": 1000000,
-        "batch_limit": 100,
+        "batch_limit": 10000,
+        "max_concurrent_jobs": 8,
+        "max_queued_jobs": 50,
     },
     "research": {
         "per_minute": 100,
         "per_day": 50000,
         "batch_limit": 20,
+        "max_concurrent_jobs": 4,
+        "max_queued_jobs": 20,
     },
 }
 
@@ -114,27 +123,29 @@ async def verify_api_key_dependency(
         async def endpoint(partner: dict = Depends(verify_api_key_dependency)):
             ...
     """
-    # Get partner by API key
-    partner = await get_partner_by_api_key(x_api_key, db)
-    
-    if not partner:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid or inactive API key"
-        )
-    
-    # Check IP whitelist if configured
-    if partner.get("ip_whitelist"):
-        client_ip = request.client.host
-        if client_ip not in partner["ip_whitelist"]:
+    with span("api_key"):
+        # Get partner by API key
+        partner = await get_partner_by_api_key(x_api_key, db)
+        
+        if not partner:
             raise HTTPException(
-                status_code=403,
-                detail=f"IP {client_ip} not whitelisted"
+                status_code=401,
+                detail="Invalid or inactive API key"
             )
+        
+        # Check IP whitelist if configured
+        if partner.get("ip_whitelist"):
+            client_ip = request.client.host
+            if client_ip not in partner["ip_whitelist"]:
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"IP {client_ip} not whitelisted"
+                )
     
     return partner
 
 
+@timed("rate_limit")
 def check_rate_limit(
     partner_id: str,
     endpoint: str,
@@ -184,6 +195,36 @@ def check_rate_limit(
     return True, None
 
 
+@timed("rate_limit")
+def get_remaining_pair_quota(
+    partner_id: str,
+    tier: str,
+    db: Session
+) -> int:
+    """
+    Pairs a partner may still score today, counting per pair.
+    
+    Single calculations count as one pair; batch and bulk requests count
+    the `pairs` recorded in their usage metadata.
+    """
+    from database.models import APIUsage
+    from datetime import timedelta
+    from sqlalchemy import func
+    
+    limits = RATE_LIMITS.get(tier, RATE_LIMITS["starter"])
+    day_ago = datetime.utcnow() - timedelta(days=1)
+    
+    pairs = APIUsage.request_metadata["pairs"].as_integer()
+    used = db.query(
+        func.coalesce(func.sum(func.coalesce(pairs, 1)), 0)
+    ).filter(
+        APIUsage.partner_id == partner_id,
+        APIUsage.timestamp >= day_ago
+    ).scalar()
+    
+    return max(0, limits["per_day"] - int(used or 0))
+
+
 def get_rate_limits_for_tier(tier: str) -> Dict:
     """Get rate limits for a partner tier"""
     return RATE_LIMITS.get(tier, RATE_LIMITS["starter"])
@@ -0,0 +1,347 @@
+"""
+Event Matching Engine
+Scores every attendee pair of an event and writes the selected EventMatch rows
+"""
+
+from typing import Dict, List, Optional, Tuple
+import time
+import numpy as np
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database.models import Event, EventAttendee, EventMatch
+from api.timing import span
+from api.scoring import (
+    DEFAULT_RESONANCE,
+    N_TRAITS,
+    ScaledTraits,
+    compile_model,
+    scale_traits,
+    scores_from_sq_distances,
+    pairwise_scores,
+    score_pairs,
+    dimension_alignment,
+)
+from api.matching import (
+    top_k_candidates,
+    candidate_pairs,
+    candidate_graph,
+    top_k_pairs,
+    greedy_matching,
+    greedy_matching_sparse,
+    hungarian_assignment,
+    auction_assignment,
+    stable_matching,
+)
+
+
+MATCH_MODES = ("top_k", "greedy", "assignment", "stable")
+
+# Two-sided modes pair attendees of one group with the other
+TWO_SIDED_MODES = ("assignment", "stable")
+
+# One-sided events up to this many pairs are scored as one dense matrix
+DENSE_PAIR_LIMIT = 4_000_000
+
+# Two-sided events up to this many pairs get an exact (Hungarian) assignment;
+# larger ones use the auction algorithm on candidate lists
+EXACT_ASSIGNMENT_LIMIT = 1_000_000
+
+# Rows of the score matrix materialized at once when building candidate lists
+CANDIDATE_BLOCK_SIZE = 1024
+
+# Attendee rows rescaled per transaction by refresh_scaled_traits
+RESCALE_BATCH_SIZE = 5000
+
+
+def scaled_columns(scaled: ScaledTraits) -> List[Dict]:
+    """EventAttendee scaled_traits / sq_norm / weights_version values for each row"""
+    return [
+        {"scaled_traits": vector, "sq_norm": sq_norm, "weights_version": scaled.weights_version}
+        for vector, sq_norm in zip(scaled.vectors.tolist(), scaled.sq_norms.tolist())
+    ]
+
+
+def _stale(model):
+    """Filter for attendees not scaled with the model's weights"""
+    return or_(
+        EventAttendee.weights_version.is_(None),
+        EventAttendee.weights_version != model.version,
+        EventAttendee.scaled_traits.is_(None),
+        EventAttendee.sq_norm.is_(None),
+    )
+
+
+def load_attendees(db: Session, event_id, model) -> Tuple[List[str], np.ndarray, List[Optional[str]], ScaledTraits]:
+    """
+    Attendee ids, an (n, 32) trait matrix, attendee groups and the scaled
+    traits stored at ingestion for an event.
+
+    Rows are ordered by attendee_id, so i < j always means
+    attendee_ids[i] < attendee_ids[j]. Attendees scaled with another
+    weights version (or stored before scaled traits were) are rescaled and
+    written back in the session's transaction.
+    """
+    model = compile_model(model)
+    rows = db.query(
+        EventAttendee.id,
+        EventAttendee.attendee_id,
+        EventAttendee.traits,
+        EventAttendee.attendee_group,
+        EventAttendee.scaled_traits,
+        EventAttendee.sq_norm,
+        EventAttendee.weights_version,
+    ).filter(
+        EventAttendee.event_id == event_id
+    ).order_by(EventAttendee.attendee_id).all()
+
+    attendee_ids = [row.attendee_id for row in rows]
+    X = np.array([row.traits for row in rows], dtype=np.float64).reshape(-1, N_TRAITS)
+    groups = [row.attendee_group for row in rows]
+
+    stale = [
+        n for n, row in enumerate(rows)
+        if row.weights_version != model.version or row.scaled_traits is None or row.sq_norm is None
+    ]
+    if len(stale) == len(rows):
+        scaled = scale_traits(model, X)
+    else:
+        current = sorted(set(range(len(rows))) - set(stale))
+        vectors = np.empty((len(rows), N_TRAITS), dtype=np.float32)
+        sq_norms = np.empty(len(rows))
+        vectors[current] = np.array([rows[n].scaled_traits for n in current], dtype=np.float32).reshape(-1, N_TRAITS)
+        sq_norms[current] = [rows[n].sq_norm for n in current]
+        if stale:
+            fresh = scale_traits(model, X[stale])
+            vectors[stale] = fresh.vectors
+            sq_norms[stale] = fresh.sq_norms
+        scaled = ScaledTraits(vectors, sq_norms, model.version)
+
+    if stale:
+        db.execute(update(EventAttendee), [
+            dict(values, id=rows[n].id) for n, values in zip(stale, scaled_columns(scaled[stale]))
+        ])
+    return attendee_ids, X, groups, scaled
+
+
+def refresh_scaled_traits(db: Session, model, event_id=None, batch_size: int = RESCALE_BATCH_SIZE) -> int:
+    """
+    Rescale the stored traits of every attendee (of one event, if given)
+    not yet scaled with the model's weights, `batch_size` rows per
+    transaction. Run after changing trait weights so matching doesn't have
+    to rescale events as it loads them. Returns the rows rescaled.
+    """
+    model = compile_model(model)
+    total = 0
+    try:
+        while True:
+            query = db.query(EventAttendee.id, EventAttendee.traits).filter(_stale(model))
+            if event_id is not None:
+                query = query.filter(EventAttendee.event_id == event_id)
+            rows = query.limit(batch_size).all()
+            if not rows:
+                break
+            X = np.array([row.traits for row in rows], dtype=np.float64).reshape(-1, N_TRAITS)
+            db.execute(update(EventAttendee), [
+                dict(values, id=row.id) for row, values in zip(rows, scaled_columns(scale_traits(model, X)))
+            ])
+            db.commit()
+            total += len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    return total
+
+
+def candidate_lists(
+    model,
+    A: ScaledTraits,
+    B: Optional[ScaledTraits] = None,
+    k: int = 50,
+    block_size: int = CANDIDATE_BLOCK_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k candidates in B for every row of A, scored block by block.
+
+    Only `block_size` rows of the distance matrix exist at a time, so memory
+    stays O(block_size * m) however large the event. Score is monotone in
+    distance, so candidates are ranked on 2<a, b> - |b|^2 (= |a|^2 - d^2),
+    a float32 product over the stored scaled rows, and only the k kept per
+    row are turned into scores. With B omitted, candidates come from A
+    itself and each row's own index is excluded. Kept pairs are rescored
+    exactly by build_match_rows.
+    """
+    one_sided = B is None
+    B = A if one_sided else B
+    A32 = A.vectors
+    B2 = 2.0 * B.vectors
+    sq_b32 = B.sq_norms.astype(np.float32)
+
+    n = len(A)
+    k = max(min(k, len(B) - 1 if one_sided else len(B)), 0)
+    cand_idx = np.empty((n, k), dtype=np.int64)
+    cand_score = np.empty((n, k))
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        closeness = A32[start:stop] @ B2.T
+        closeness -= sq_b32
+        if one_sided:
+            closeness[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        idx, best = top_k_candidates(closeness, k)
+        cand_idx[start:stop] = idx
+        cand_score[start:stop] = scores_from_sq_distances(model, A.sq_norms[start:stop, None] - best.astype(np.float64))
+    return cand_idx, cand_score
+
+
+def _split_groups(groups: List[Optional[str]], proposing_group: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices of the proposing group and of the other group"""
+    names = sorted({g for g in groups if g})
+    if len(names) != 2:
+        raise ValueError("Two-sided matching needs attendees in exactly two groups")
+    first = proposing_group or names[0]
+    if first not in names:
+        raise ValueError(f"Unknown group: {first}")
+
+    labels = np.array([g or "" for g in groups], dtype=object)
+    second = names[1] if first == names[0] else names[0]
+    return np.nonzero(labels == first)[0], np.nonzero(labels == second)[0]
+
+
+def select_pairs(
+    model,
+    X,
+    mode: str = "top_k",
+    k: int = 5,
+    min_score: Optional[float] = None,
+    groups: Optional[List[Optional[str]]] = None,
+    candidates: int = 50,
+    proposing_group: Optional[str] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pick (i, j) pairs with i < j for the given mode.
+
+    - top_k: each attendee's k best partners
+    - greedy: one-to-one pairing across all attendees, best remaining pair
+      first (approximate: at least half the maximum-weight matching's total)
+    - assignment: one-to-one between two groups maximizing total score
+    - stable: Gale-Shapley between two groups, `proposing_group` proposing
+
+    Large events are matched from `candidates` best partners per attendee
+    (in both directions for two-sided modes) instead of the full score
+    matrix. X is a raw trait matrix or ScaledTraits scaled with `model`.
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode: {mode}")
+    if len(X) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if not isinstance(X, ScaledTraits):
+        X = scale_traits(model, X)
+
+    if mode in TWO_SIDED_MODES:
+        a, b = _split_groups(groups or [None] * len(X), proposing_group)
+        if mode == "assignment" and len(a) * len(b) <= EXACT_ASSIGNMENT_LIMIT:
+            rows, cols = hungarian_assignment(pairwise_scores(model, X[a], X[b]), min_score=min_score)
+        else:
+            cand_idx, cand_score = candidate_lists(model, X[a], X[b], k=candidates)
+            reverse_idx, reverse_score = candidate_lists(model, X[b], X[a], k=candidates)
+            graph = candidate_graph(cand_idx, cand_score, len(b), reverse_idx, reverse_score, min_score=min_score)
+            match = auction_assignment if mode == "assignment" else stable_matching
+            rows, cols = match(*graph, len(b))
+        i, j = a[rows], b[cols]
+        return np.minimum(i, j), np.maximum(i, j)
+
+    if len(X) ** 2 <= DENSE_PAIR_LIMIT:
+        S = pairwise_scores(model, X)
+        if mode == "greedy":
+            return greedy_matching(S, min_score=min_score)
+        return top_k_pairs(S, k, min_score=min_score)
+
+    if mode == "greedy":
+        cand_idx, cand_score = candidate_lists(model, X, k=candidates)
+        return greedy_matching_sparse(*candidate_graph(cand_idx, cand_score, len(X), min_score=min_score))
+    cand_idx, cand_score = candidate_lists(model, X, k=k)
+    return candidate_pairs(cand_idx, cand_score, min_score=min_score)
+
+
+def build_match_rows(
+    model,
+    event_id,
+    attendee_ids: List[str],
+    X: np.ndarray,
+    rows: np.ndarray,
+    cols: np.ndarray,
+) -> List[Dict]:
+    """
+    EventMatch rows for the selected pairs.
+
+    Scores are recomputed exactly from trait differences and the dimension
+    breakdown is only computed for these pairs, not all n^2.
+    """
+    if not len(rows):
+        return []
+
+    V1, V2 = X[rows], X[cols]
+    R = np.tile(DEFAULT_RESONANCE, (len(rows), 1))
+    scores = np.clip(score_pairs(model, V1, V2, R)["S_hat"], 0.0, 1.0).tolist()
+    dimensions = {name: values.tolist() for name, values in dimension_alignment(V1, V2).items()}
+
+    return [
+        {
+            "event_id": event_id,
+            "attendee1_id": attendee_ids[i],
+            "attendee2_id": attendee_ids[j],
+            "compatibility_score": scores[n],
+            "dimension_breakdown": {name: values[n] for name, values in dimensions.items()},
+        }
+        for n, (i, j) in enumerate(zip(rows.tolist(), cols.tolist()))
+    ]
+
+
+def match_event(
+    db: Session,
+    event: Event,
+    model,
+    mode: str = "top_k",
+    k: int = 5,
+    min_score: Optional[float] = None,
+    candidates: int = 50,
+    proposing_group: Optional[str] = None,
+) -> Dict:
+    """
+    Match an event's attendees and replace its EventMatch rows.
+
+    See select_pairs for the modes. Raises ValueError if a two-sided mode is
+    requested for attendees that are not split into exactly two groups.
+
+    All rows go to the database in one executemany insert; `unique_match`
+    conflicts (e.g. a concurrent run) are skipped.
+    """
+    start = time.perf_counter()
+
+    attendee_ids, X, groups, scaled = load_attendees(db, event.id, model)
+    with span("scoring"):
+        rows, cols = select_pairs(
+            model, scaled, mode=mode, k=k, min_score=min_score,
+            groups=groups, candidates=candidates, proposing_group=proposing_group,
+        )
+        match_rows = build_match_rows(model, event.id, attendee_ids, X, rows, cols)
+
+    with span("db_write"):
+        db.query(EventMatch).filter(EventMatch.event_id == event.id).delete(synchronize_session=False)
+        if match_rows:
+            db.execute(
+                insert(EventMatch).on_conflict_do_nothing(constraint="unique_match"),
+                match_rows,
+            )
+        event.attendee_count = len(attendee_ids)
+        event.matched = True
+        db.commit()
+
+    return {
+        "event_id": str(event.id),
+        "mode": mode,
+        "attendee_count": len(attendee_ids),
+        "match_count": len(match_rows),
+        "duration_ms": int((time.perf_counter() - start) * 1000),
+    }
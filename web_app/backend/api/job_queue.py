@@ -0,0 +1,557 @@
+"""
+Bulk Scoring Job Queue
+SQLite-backed local queue with a process-pool worker backend
+"""
+
+import asyncio
+import ipaddress
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from api.scoring import PairInput, pack_pairs, score_packed, result_columns
+
+JOB_DATA_DIR = os.getenv("JOB_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "8192"))
+# A running job whose heartbeat is older than this is considered crashed
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_POLL_INTERVAL = 0.5
+# Remote datasets (dataset_uri): per-read timeout, size cap, and an optional
+# comma-separated host allowlist (while empty any public address is allowed)
+JOB_DOWNLOAD_TIMEOUT = float(os.getenv("JOB_DOWNLOAD_TIMEOUT", "30"))
+JOB_MAX_DOWNLOAD_BYTES = int(os.getenv("JOB_MAX_DOWNLOAD_BYTES", str(1024 ** 3)))
+JOB_SOURCE_HOSTS = {host.strip().lower() for host in os.getenv("JOB_SOURCE_HOSTS", "").split(",") if host.strip()}
+
+# Jobs that crash this many times are failed instead of being resumed again
+MAX_ATTEMPTS = 3
+
+STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    partner_id TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    source TEXT NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result_path TEXT,
+    heartbeat REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_partner ON jobs(partner_id, status);
+"""
+
+
+def job_dir(job_id: str) -> str:
+    """Directory holding a job's input, checkpoint parts and results"""
+    return os.path.join(JOB_DATA_DIR, job_id)
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    os.makedirs(JOB_DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(JOB_DATA_DIR, "jobs.sqlite3"), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _row_to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+    return dict(row) if row is not None else None
+
+
+def create_job(partner_id: str, tier: str, source: str, job_id: Optional[str] = None) -> Dict:
+    """
+    Enqueue a job.
+
+    `source` is either the path of an uploaded NDJSON file or an http(s) URI.
+    """
+    job_id = job_id or str(uuid.uuid4())
+    now = _now()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, partner_id, tier, status, source, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, partner_id, tier, source, now, now),
+        )
+        return _row_to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Get a job by ID"""
+    with _connect() as conn:
+        return _row_to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def count_active_jobs(partner_id: str) -> int:
+    """Number of queued or running jobs for a partner"""
+    with _connect() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE partner_id = ? AND status IN ('queued', 'running')",
+            (partner_id,),
+        ).fetchone()[0]
+
+
+def cancel_job(job_id: str) -> bool:
+    """Cancel a queued or running job; running workers stop at their next chunk"""
+    with _connect() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (_now(), job_id),
+        )
+        return cur.rowcount > 0
+
+
+def claim_next_job(concurrency_limits: Dict[str, int]) -> Optional[Dict]:
+    """
+    Atomically move the oldest eligible queued job to running.
+
+    A job is eligible when its partner has fewer running jobs than the
+    concurrency limit of its tier.
+    """
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            running = dict(conn.execute(
+                "SELECT partner_id, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY partner_id"
+            ).fetchall())
+            for row in conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall():
+                limit = concurrency_limits.get(row["tier"], 1)
+                if running.get(row["partner_id"], 0) >= limit:
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, heartbeat = ?, updated_at = ? WHERE id = ?",
+                    (time.time(), _now(), row["id"]),
+                )
+                conn.execute("COMMIT")
+                return _row_to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return None
+
+
+def requeue_stale_jobs(stale_seconds: int = JOB_STALE_SECONDS) -> int:
+    """
+    Put running jobs whose worker stopped heartbeating back in the queue.
+
+    They resume from their last checkpointed chunk. Jobs that already used
+    up MAX_ATTEMPTS are failed instead.
+    """
+    cutoff = time.time() - stale_seconds
+    now = _now()
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker crashed too many times', updated_at = ? "
+            "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+            (now, cutoff, MAX_ATTEMPTS),
+        )
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND heartbeat < ?",
+            (now, cutoff),
+        )
+        return cur.rowcount
+
+
+def requeue_job(job_id: str):
+    """Return a running job whose worker died to the queue (or fail it after MAX_ATTEMPTS)"""
+    now = _now()
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = CASE WHEN attempts >= ? THEN 'Worker crashed too many times' ELSE error END, "
+            "updated_at = ? WHERE id = ? AND status = 'running'",
+            (MAX_ATTEMPTS, MAX_ATTEMPTS, now, job_id),
+        )
+
+
+def _checkpoint(job_id: str, processed: int, scored: int, chunks: int) -> bool:
+    """Record progress after a chunk is safely on disk; False if the job was cancelled"""
+    with _connect() as conn:
+        cur = conn.execute(
+            "UPDATE jobs SET processed = ?, scored = ?, chunks = ?, heartbeat = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'running'",
+            (processed, scored, chunks, time.time(), _now(), job_id),
+        )
+        return cur.rowcount > 0
+
+
+def _finish(job_id: str, status: str, error: Optional[str] = None, result_path: Optional[str] = None):
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, result_path = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (status, error, result_path, _now(), job_id),
+        )
+
+
+def check_source_uri(uri: str):
+    """
+    Raise ValueError unless `uri` is an http(s) URI whose host is allowed and
+    resolves only to public addresses (no private, loopback, link-local or
+    reserved ones), so datasets can't be fetched from internal services
+    """
+    parsed = urllib.parse.urlsplit(uri)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("dataset_uri must be an http(s) URI")
+    host = parsed.hostname.lower()
+    if JOB_SOURCE_HOSTS and host not in JOB_SOURCE_HOSTS:
+        raise ValueError(f"dataset_uri host {host} is not allowed")
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError, ValueError):
+        raise ValueError(f"Could not resolve dataset_uri host {host}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split("%")[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"dataset_uri host {host} resolves to a non-public address")
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Re-checks every redirect target, so a public URI can't bounce to an internal one"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_source_uri(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class _LimitedReader:
+    """Line iterator over a download that fails once it passes `limit` bytes"""
+
+    def __init__(self, response, limit: int):
+        self._response = response
+        self._limit = limit
+        self._remaining = limit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._response.close()
+
+    def __iter__(self):
+        while True:
+            # Bounded reads, so a single endless line can't exhaust memory either
+            line = self._response.readline(self._remaining + 1)
+            if not line:
+                return
+            self._remaining -= len(line)
+            if self._remaining < 0:
+                raise ValueError(f"Dataset is larger than {self._limit} bytes")
+            yield line
+
+
+def _open_source(source: str):
+    if source.startswith(("http://", "https://")):
+        check_source_uri(source)
+        opener = urllib.request.build_opener(_CheckedRedirectHandler)
+        response = opener.open(source, timeout=JOB_DOWNLOAD_TIMEOUT)
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > JOB_MAX_DOWNLOAD_BYTES:
+            response.close()
+            raise ValueError(f"Dataset is larger than {JOB_MAX_DOWNLOAD_BYTES} bytes")
+        return _LimitedReader(response, JOB_MAX_DOWNLOAD_BYTES)
+    return open(source, "rb")
+
+
+def _iter_chunks(source: str, skip: int, chunk_size: int) -> Iterator[List]:
+    """Yield lists of parsed lines, skipping the first `skip` (already processed) pairs"""
+    chunk: List = []
+    seen = 0
+    with _open_source(source) as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            seen += 1
+            if seen <= skip:
+                continue
+            try:
+                chunk.append(json.loads(raw))
+            except ValueError:
+                chunk.append("Invalid JSON")
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_part(path: str, packed, scores: Dict[str, np.ndarray], offset: int):
+    """Write one chunk's columns atomically (temp file + rename)"""
+    errors = sorted(packed.errors.items())
+    columns = result_columns(scores)
+    columns["index"] = packed.index + offset
+    columns["error_index"] = np.array([i for i, _ in errors], dtype=np.int64) + offset
+    columns["error_detail"] = np.array([detail for _, detail in errors], dtype=np.str_)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **columns)
+    os.replace(tmp, path)
+
+
+def _merge_parts(directory: str, n_chunks: int) -> str:
+    """Concatenate checkpoint parts into a single columnar results file"""
+    parts = [np.load(os.path.join(directory, f"part-{i:06d}.npz")) for i in range(n_chunks)]
+    merged: Dict[str, np.ndarray] = {}
+    if parts:
+        for name in parts[0].files:
+            merged[name] = np.concatenate([part[name] for part in parts])
+    result_path = os.path.join(directory, "results.npz")
+    tmp = result_path + ".tmp.npz"
+    np.savez(tmp, **merged)
+    os.replace(tmp, result_path)
+    return result_path
+
+
+def _remaining_pair_quota(job: Dict) -> int:
+    from api.auth import get_remaining_pair_quota
+    from database.connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return get_remaining_pair_quota(job["partner_id"], job["tier"], db)
+    finally:
+        db.close()
+
+
+def _record_usage(job: Dict, status: str, pairs: int, scored: int, quota_exceeded: bool, model_version: str, started: float):
+    """Charge the pairs read by one run of a job to the partner's daily quota"""
+    from api.analytics import track_api_usage
+    from database.connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        asyncio.run(track_api_usage(
+            partner_id=job["partner_id"],
+            endpoint="/api/v1/compatibility/jobs",
+            method="POST",
+            status_code=200,
+            response_time=int((time.time() - started) * 1000),
+            db=db,
+            metadata={
+                "job_id": job["id"],
+                "status": status,
+                "pairs": pairs,
+                "results_count": scored,
+                "error_count": pairs - scored,
+                "quota_exceeded": quota_exceeded,
+                "model_version": model_version,
+            },
+        ))
+    except Exception as e:
+        print(f"Warning: Could not record usage for job {job['id']}: {e}")
+    finally:
+        db.close()
+
+
+def run_job(job_id: str) -> str:
+    """
+    Worker entry point (runs in a pool process).
+
+    Streams the dataset in chunks, scores each chunk as arrays and checkpoints
+    it as a part file, so a crashed job resumes after its last finished chunk.
+    Pairs count against the partner's daily pair quota as on /bulk: once it
+    runs out the job completes with the pairs read so far, and each run
+    records the pairs it read in one usage row. Returns the final status.
+    """
+    from api.model_registry import registry as model_registry
+    from api.v1.compatibility import get_compiled_model, record_scores
+
+    job = get_job(job_id)
+    if job is None or job["status"] != "running":
+        return job["status"] if job else "missing"
+
+    directory = job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    # Pool processes run no watcher; pick up the active version per job
+    try:
+        model_registry.poll()
+    except ValueError as e:
+        print(f"Warning: Could not switch compatibility model: {e}")
+    model = get_compiled_model()
+    processed, scored, chunks = job["processed"], job["scored"], job["chunks"]
+    start_processed, start_scored = processed, scored
+    started = time.time()
+    quota_exceeded = False
+    status = "failed"
+
+    try:
+        allowance = processed + _remaining_pair_quota(job)
+        for chunk in _iter_chunks(job["source"], processed, JOB_CHUNK_SIZE):
+            if processed + len(chunk) > allowance:
+                quota_exceeded = True
+                chunk = chunk[:allowance - processed]
+                if not chunk:
+                    break
+            pairs = [PairInput(item) if isinstance(item, dict) else PairInput({}) for item in chunk]
+            packed = pack_pairs(pairs)
+            for i, item in enumerate(chunk):
+                if not isinstance(item, dict):
+                    packed.errors[i] = item if isinstance(item, str) else "Each line must be a JSON object"
+            scores = score_packed(model, packed)
+            record_scores(scores["S_hat"])
+
+            _write_part(os.path.join(directory, f"part-{chunks:06d}.npz"), packed, scores, processed)
+            processed += len(chunk)
+            scored += len(packed)
+            chunks += 1
+            if not _checkpoint(job_id, processed, scored, chunks):
+                status = "cancelled"
+                return status
+            if quota_exceeded:
+                break
+
+        result_path = _merge_parts(directory, chunks)
+        error = f"Daily pair quota exhausted; results cover the first {processed} pairs" if quota_exceeded else None
+        _finish(job_id, "completed", error=error, result_path=result_path)
+        status = "completed"
+        return status
+    except Exception as e:
+        _finish(job_id, "failed", error=str(e))
+        return status
+    finally:
+        _record_usage(job, status, processed - start_processed, scored - start_scored, quota_exceeded, model.version, started)
+
+
+class JobRunner:
+    """
+    Dispatcher thread that claims queued jobs and runs them on a process pool.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        requeue_stale_jobs()
+        self._stop.clear()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._thread = threading.Thread(target=self._loop, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wake the dispatcher after a submit"""
+        self._wake.set()
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+        self._pool = None
+
+    def _done(self, job_id: str, future):
+        with self._lock:
+            self._active -= 1
+        if not future.cancelled() and future.exception() is not None:
+            # Worker process died mid-job; resume it from its last checkpoint
+            print(f"Job {job_id} worker error: {future.exception()}")
+            requeue_job(job_id)
+        self._wake.set()
+
+    def _submit(self, job_id: str):
+        try:
+            future = self._pool.submit(run_job, job_id)
+        except BrokenProcessPool:
+            # A crashed worker breaks the whole pool; replace it and retry once
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            future = self._pool.submit(run_job, job_id)
+        future.add_done_callback(lambda f: self._done(job_id, f))
+
+    def _loop(self):
+        from api.auth import RATE_LIMITS
+
+        limits = {tier: conf.get("max_concurrent_jobs", 1) for tier, conf in RATE_LIMITS.items()}
+        last_stale_check = time.time()
+
+        while not self._stop.is_set():
+            if time.time() - last_stale_check > JOB_STALE_SECONDS / 2:
+                requeue_stale_jobs()
+                last_stale_check = time.time()
+
+            while self._active < self.max_workers:
+                job = claim_next_job(limits)
+                if job is None:
+                    break
+                with self._lock:
+                    self._active += 1
+                self._submit(job["id"])
+
+            self._wake.wait(JOB_POLL_INTERVAL)
+            self._wake.clear()
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_runner() -> JobRunner:
+    """Process-wide job runner, started on first use"""
+    global _runner
+    if _runner is None:
+        _runner = JobRunner()
+    _runner.start()
+    return _runner
+
+
+def resume_jobs():
+    """Start the runner at startup if jobs were left queued or running"""
+    with _connect() as conn:
+        pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+    if pending:
+        get_runner()
+
+
+def shutdown_runner():
+    if _runner is not None:
+        _runner.shutdown()
@@ -0,0 +1,403 @@
+"""
+Pair Selection on Score Matrices
+Top-K, greedy, assignment and stable matching over compatibility scores
+
+Dense functions take an (n, m) score matrix. Sparse ones start from candidate
+lists: `cand_idx[i]` holds row i's candidate columns (padded with -1) and
+`cand_score[i]` their scores, as produced by `top_k_candidates`. The one-to-one
+solvers take those as a CSR candidate graph (indptr, indices, scores) built by
+`candidate_graph`. All functions return parallel (rows, cols) index arrays.
+"""
+
+from collections import deque
+from typing import Optional, Tuple
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    # Fallback: NumPy Hungarian implementation below
+    linear_sum_assignment = None
+
+
+# Sorted candidate pairs are scanned in blocks of this size by greedy matching
+_GREEDY_BLOCK = 65536
+
+
+def _empty_pairs() -> Tuple[np.ndarray, np.ndarray]:
+    empty = np.empty(0, dtype=np.int64)
+    return empty, empty
+
+
+def top_k_candidates(S: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Each row's k highest-scoring columns, best first.
+
+    Works on row blocks too, so callers can build candidate lists for
+    matrices that never exist in full. Columns scored -inf are padded to -1.
+    """
+    n, m = S.shape
+    k = min(k, m)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64), np.empty((n, 0))
+
+    idx = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(S, idx, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    idx[np.isneginf(scores)] = -1
+    return idx, scores
+
+
+def _candidate_edges(
+    cand_idx: np.ndarray,
+    cand_score: np.ndarray,
+    min_score: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten candidate lists to (rows, cols, scores) edges, dropping padding"""
+    n, k = cand_idx.shape
+    rows = np.repeat(np.arange(n), k)
+    cols = cand_idx.ravel()
+    scores = cand_score.ravel()
+    keep = cols >= 0
+    if min_score is not None:
+        keep &= scores >= min_score
+    return rows[keep], cols[keep], scores[keep]
+
+
+def candidate_pairs(
+    cand_idx: np.ndarray,
+    cand_score: np.ndarray,
+    min_score: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Unique (i, j) pairs with i < j from one-sided candidate lists.
+
+    A pair listed by both of its rows is returned once.
+    """
+    n = cand_idx.shape[0]
+    rows, cols, _ = _candidate_edges(cand_idx, cand_score, min_score)
+    keys = np.unique(np.minimum(rows, cols) * n + np.maximum(rows, cols))
+    return keys // n, keys % n
+
+
+def candidate_graph(
+    cand_idx: np.ndarray,
+    cand_score: np.ndarray,
+    n_cols: int,
+    reverse_idx: Optional[np.ndarray] = None,
+    reverse_score: Optional[np.ndarray] = None,
+    min_score: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    CSR graph (indptr, indices, scores) of candidate edges, best first per row.
+
+    `reverse_idx` / `reverse_score` are the columns' own candidate lists
+    (rows they would pick). Merging them in matters: a few central profiles
+    show up in everyone's top-k, so without the reverse edges many columns
+    would have no edges at all and could never be matched.
+    """
+    n = cand_idx.shape[0]
+    rows, cols, scores = _candidate_edges(cand_idx, cand_score, min_score)
+    if reverse_idx is not None:
+        reverse_cols, reverse_rows, reverse_scores = _candidate_edges(reverse_idx, reverse_score, min_score)
+        rows = np.concatenate([rows, reverse_rows])
+        cols = np.concatenate([cols, reverse_cols])
+        scores = np.concatenate([scores, reverse_scores])
+
+    keys, first = np.unique(rows * n_cols + cols, return_index=True)
+    rows, cols, scores = keys // n_cols, keys % n_cols, scores[first]
+    order = np.lexsort((-scores, rows))
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[order], scores[order]
+
+
+def top_k_pairs(S: np.ndarray, k: int, min_score: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Each row's k best partners, as unique (i, j) pairs with i < j.
+
+    The diagonal is ignored. A pair chosen by both of its rows is returned
+    once, so attendees can end up with more than k matches but never fewer
+    than min(k, n - 1) before the `min_score` cut.
+    """
+    n = S.shape[0]
+    if n < 2:
+        return _empty_pairs()
+
+    S = S.copy()
+    np.fill_diagonal(S, -np.inf)
+    cand_idx, cand_score = top_k_candidates(S, min(k, n - 1))
+    return candidate_pairs(cand_idx, cand_score, min_score)
+
+
+def _greedy_edges(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(-scores, kind="stable")
+    used = bytearray(n)
+    matched_rows, matched_cols = [], []
+    remaining = n // 2
+
+    for start in range(0, len(order), _GREEDY_BLOCK):
+        block = order[start:start + _GREEDY_BLOCK]
+        for i, j in zip(rows[block].tolist(), cols[block].tolist()):
+            if used[i] or used[j]:
+                continue
+            used[i] = used[j] = 1
+            matched_rows.append(i)
+            matched_cols.append(j)
+            remaining -= 1
+            if not remaining:
+                break
+        if not remaining:
+            break
+
+    return np.array(matched_rows, dtype=np.int64), np.array(matched_cols, dtype=np.int64)
+
+
+def greedy_matching(S: np.ndarray, min_score: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One-to-one matching by taking the best remaining pair first.
+
+    Returns (i, j) pairs with i < j, each row used at most once. Greedy
+    selection is a 1/2-approximation of the maximum-weight matching and
+    costs one sort of the n(n-1)/2 candidate pairs.
+    """
+    n = S.shape[0]
+    iu, ju = np.triu_indices(n, k=1)
+    values = S[iu, ju]
+    if min_score is not None:
+        keep = values >= min_score
+        iu, ju, values = iu[keep], ju[keep], values[keep]
+    return _greedy_edges(iu, ju, values, n)
+
+
+def greedy_matching_sparse(indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """greedy_matching restricted to the edges of a one-sided candidate graph"""
+    n = len(indptr) - 1
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    return _greedy_edges(np.minimum(rows, indices), np.maximum(rows, indices), scores, n)
+
+
+def _hungarian_min(C: np.ndarray) -> np.ndarray:
+    """
+    Minimum-cost assignment of every row of C (n <= m) to a distinct column.
+
+    Shortest augmenting path with row/column potentials, O(n^2 m), with the
+    inner column scan vectorized. Returns the column assigned to each row.
+    """
+    n, m = C.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)  # p[j]: row (1-based) assigned to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            reduced = C[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv, np.inf)
+            j1 = int(np.argmin(candidates))
+            delta = candidates[j1]
+
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    assignment = np.full(n, -1, dtype=np.int64)
+    cols = np.nonzero(p[1:])[0]
+    assignment[p[1:][cols] - 1] = cols
+    return assignment
+
+
+def hungarian_assignment(S: np.ndarray, min_score: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assignment of rows to columns maximizing total score (exact, dense).
+
+    Uses scipy's linear_sum_assignment when installed. Scores below
+    `min_score` count as zero, and those pairs are dropped from the result.
+    """
+    n, m = S.shape
+    if not n or not m:
+        return _empty_pairs()
+
+    W = S if min_score is None else np.where(S >= min_score, S, 0.0)
+
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(W, maximize=True)
+        rows, cols = rows.astype(np.int64), cols.astype(np.int64)
+    elif n <= m:
+        rows = np.arange(n)
+        cols = _hungarian_min(-W)
+    else:
+        cols = np.arange(m)
+        rows = _hungarian_min(-W.T)
+
+    if min_score is not None:
+        keep = S[rows, cols] >= min_score
+        rows, cols = rows[keep], cols[keep]
+    return rows, cols
+
+
+def _auction(indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray, epsilon: float) -> np.ndarray:
+    """
+    Forward auction with epsilon scaling on a square problem with a perfect matching.
+
+    Unassigned persons bid for their best object in parallel (Jacobi) rounds,
+    raising its price by their margin over the second-best object plus eps.
+    Returns the object assigned to each person.
+    """
+    n = len(indptr) - 1
+    degree = np.diff(indptr)
+    prices = np.zeros(n)
+    assigned = np.full(n, -1, dtype=np.int64)
+
+    eps = max(float(scores.max(initial=0.0)) / 4, epsilon)
+    while True:
+        owner = np.full(n, -1, dtype=np.int64)
+        assigned[:] = -1
+        active = np.arange(n)
+
+        while len(active):
+            # Gather the edges of all active persons as one flat array
+            lengths = degree[active]
+            seg = np.zeros(len(active), dtype=np.int64)
+            np.cumsum(lengths[:-1], out=seg[1:])
+            edges = np.repeat(indptr[active] - seg, lengths) + np.arange(lengths.sum())
+            seg_id = np.repeat(np.arange(len(active)), lengths)
+            values = scores[edges] - prices[indices[edges]]
+
+            v1 = np.maximum.reduceat(values, seg)
+            best = np.flatnonzero(values == v1[seg_id])
+            best = best[np.r_[True, seg_id[best][1:] != seg_id[best][:-1]]]
+            values[best] = -np.inf
+            v2 = np.maximum.reduceat(values, seg)
+            # A single option can be bid up by a full eps-scaled margin
+            v2 = np.where(np.isneginf(v2), v1 - eps, v2)
+
+            targets = indices[edges[best]]
+            bids = prices[targets] + (v1 - v2) + eps
+
+            order = np.lexsort((-bids, targets))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = targets[order][1:] != targets[order][:-1]
+            winners = order[first]
+            win_rows, win_cols = active[winners], targets[winners]
+
+            outbid = owner[win_cols]
+            outbid = outbid[outbid >= 0]
+            assigned[outbid] = -1
+            owner[win_cols] = win_rows
+            assigned[win_rows] = win_cols
+            prices[win_cols] = bids[winners]
+
+            losers = np.setdiff1d(active, win_rows, assume_unique=True)
+            active = np.concatenate([losers, outbid])
+
+        if eps <= epsilon:
+            return assigned
+        eps = max(eps / 4, epsilon)
+
+
+def auction_assignment(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    scores: np.ndarray,
+    n_cols: int,
+    epsilon: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assignment maximizing total score over a candidate graph (auction algorithm).
+
+    Rows and columns may stay unmatched, so the graph is first made square:
+    every row gets a private "unmatched" column and every column a private
+    "unmatched" row (worth 0), and the unmatched rows/columns are linked
+    along the mirrored candidate edges. That guarantees a perfect matching,
+    which the scaled auction needs to stay correct across phases. The result
+    is within (n + m) * epsilon (default 1 / (n + m + 1)) of the best
+    assignment on the candidate graph.
+    """
+    n = len(indptr) - 1
+    if not n or not len(indices):
+        return _empty_pairs()
+
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    dummy_rows = n + indices            # column j's private unmatched row
+    dummy_cols = n_cols + rows          # row i's private unmatched column
+    own_rows = np.arange(n)
+    own_cols = np.arange(n_cols)
+
+    persons = np.concatenate([rows, own_rows, n + own_cols, dummy_rows])
+    objects = np.concatenate([indices, n_cols + own_rows, own_cols, dummy_cols])
+    benefits = np.concatenate([scores, np.zeros(n + n_cols + len(indices))])
+
+    size = n + n_cols
+    order = np.argsort(persons, kind="stable")
+    aug_indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(persons, minlength=size), out=aug_indptr[1:])
+
+    assigned = _auction(aug_indptr, objects[order], benefits[order], epsilon or 1.0 / (size + 1))
+    matched = np.nonzero(assigned[:n] < n_cols)[0]
+    return matched, assigned[matched]
+
+
+def stable_matching(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    scores: np.ndarray,
+    n_cols: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gale-Shapley stable matching with rows proposing.
+
+    A row's preference list is its candidate edges (best first); a column
+    prefers proposers with a higher score for that pair. The result is stable
+    with respect to the candidate graph: no row and column joined by an edge
+    would both rather be together than with their current partners.
+    """
+    n = len(indptr) - 1
+    bounds = indptr.tolist()
+    cols = indices.tolist()
+    values = scores.tolist()
+    next_choice = bounds[:-1]
+    partner = [-1] * n_cols
+    partner_score = [0.0] * n_cols
+    free = deque(range(n))
+
+    while free:
+        i = free.popleft()
+        while next_choice[i] < bounds[i + 1]:
+            j, score = cols[next_choice[i]], values[next_choice[i]]
+            next_choice[i] += 1
+            current = partner[j]
+            if current < 0:
+                partner[j], partner_score[j] = i, score
+                break
+            if score > partner_score[j]:
+                partner[j], partner_score[j] = i, score
+                free.append(current)
+                break
+
+    matched = [j for j in range(n_cols) if partner[j] >= 0]
+    return np.array([partner[j] for j in matched], dtype=np.int64), np.array(matched, dtype=np.int64)
@@ -0,0 +1,324 @@
+"""
+Model Registry
+Versioned compatibility weight sets from a local file store, swapped
+without restarts
+
+Each version is one JSON file, <version>.json, with the sections of
+base_model.CompatibilityModel:
+
+    {
+      "version": "1.0.0",
+      "trait_weights": {"alphas": [32 floats]},
+      "resonance_weights": {"beta1": 0.5, "beta2": 0.5},
+      "compatibility_weights": {"gamma1": 0.5, "gamma2": 0.5},
+      "soulmate_score_weights": {"w1": 1.0, ..., "w6": 1.0}
+    }
+
+Files are looked up in MODEL_DIR, then in the weight sets shipped in
+config/models. The version served by default is named in MODEL_DIR/ACTIVE
+(MODEL_VERSION while there is none).
+
+A version is loaded, compiled and warmed (scored once through every
+kernel, which also rejects weights giving non-finite or out-of-range
+scores) before it can become active, and the swap itself is one reference
+assignment: requests in flight finish on the model they started with.
+Up to MODEL_RESIDENT_VERSIONS compiled versions stay in memory, so
+requests may pick another version (e.g. for A/B scoring) without loading
+it each time; the active one is never evicted.
+
+activate() writes MODEL_DIR/ACTIVE, and every process running the watcher
+(started by the app's lifespan) polls it every MODEL_RELOAD_INTERVAL
+seconds and swaps in the version it names, so all workers follow a swap
+made in any of them. Bulk scoring jobs check it when they start.
+"""
+
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import json
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from api.scoring import (
+    DEFAULT_RESONANCE,
+    MODEL_VERSION,
+    N_TRAITS,
+    CompiledModel,
+    compile_model,
+    pairwise_scores,
+    score_pairs,
+)
+
+
+BUNDLED_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "models")
+MODEL_DIR = os.getenv("MODEL_DIR", BUNDLED_MODEL_DIR)
+MODEL_RESIDENT_VERSIONS = int(os.getenv("MODEL_RESIDENT_VERSIONS", "3"))
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+ACTIVE_FILE = "ACTIVE"
+
+_VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,49}$")
+
+# Required fields of each weight file section
+_SECTIONS = {
+    "trait_weights": ("alphas",),
+    "resonance_weights": ("beta1", "beta2"),
+    "compatibility_weights": ("gamma1", "gamma2"),
+    "soulmate_score_weights": ("w1", "w2", "w3", "w4", "w5", "w6"),
+}
+
+# Pairs scored when warming a version
+_WARM_PAIRS = 64
+
+
+def _finite(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return float(value)
+
+
+def parse_weights(data: Dict, version: str) -> CompiledModel:
+    """Validate a weight file's contents and compile them"""
+    if data.get("version", version) != version:
+        raise ValueError(f"Weight file declares version {data.get('version')}, expected {version}")
+
+    sections = {}
+    for section, fields in _SECTIONS.items():
+        values = data.get(section)
+        if not isinstance(values, dict):
+            raise ValueError(f"Missing section: {section}")
+        missing = [field for field in fields if field not in values]
+        if missing:
+            raise ValueError(f"{section} is missing {', '.join(missing)}")
+        sections[section] = values
+
+    alphas = sections["trait_weights"]["alphas"]
+    if not isinstance(alphas, list) or len(alphas) != N_TRAITS:
+        raise ValueError(f"trait_weights.alphas must hold {N_TRAITS} weights")
+    alphas = [_finite(a, "trait_weights.alphas") for a in alphas]
+    if min(alphas) < 0:
+        raise ValueError("trait_weights.alphas must not be negative")
+
+    model = SimpleNamespace(trait_weights=SimpleNamespace(alphas=alphas))
+    for section in ("resonance_weights", "compatibility_weights", "soulmate_score_weights"):
+        setattr(model, section, SimpleNamespace(**{
+            field: _finite(sections[section][field], f"{section}.{field}") for field in _SECTIONS[section]
+        }))
+    return compile_model(model, version)
+
+
+def warm_model(model: CompiledModel) -> None:
+    """
+    Run a small batch through the scalar, pair and matrix kernels, so the
+    first requests on a new version don't pay for it, and check the scores
+    """
+    rng = np.random.default_rng(0)
+    X = rng.random((_WARM_PAIRS, N_TRAITS))
+    Y = rng.random((_WARM_PAIRS, N_TRAITS))
+    R = rng.random((_WARM_PAIRS, len(DEFAULT_RESONANCE)))
+
+    scores = score_pairs(model, X, Y, R)["S_hat"]
+    matrix = pairwise_scores(model, X, Y)
+    scalar = model.total_compatibility(
+        SimpleNamespace(traits=X[0].tolist()),
+        SimpleNamespace(traits=Y[0].tolist()),
+        SimpleNamespace(metrics=R[0].tolist()),
+    )["S_hat"]
+
+    for name, values in (("pair", scores), ("matrix", matrix), ("scalar", np.asarray([scalar]))):
+        if not np.all(np.isfinite(values)) or values.min() < 0.0 or values.max() > 1.0:
+            raise ValueError(f"Model {model.version} gives {name} scores outside [0, 1]")
+
+
+class ModelRegistry:
+    """Compiled weight versions resident in this process, and the active one"""
+
+    def __init__(
+        self,
+        directory: str = MODEL_DIR,
+        resident: int = MODEL_RESIDENT_VERSIONS,
+        default_version: str = MODEL_VERSION,
+    ):
+        self.directory = directory
+        self.resident = max(1, resident)
+        self.default_version = default_version
+        self._lock = threading.Lock()
+        self._models: "OrderedDict[str, CompiledModel]" = OrderedDict()
+        self._active: Optional[CompiledModel] = None
+        self._active_stamp = None
+        self._failed_stamp = None
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    # Store ----------------------------------------------------------------
+
+    def _path(self, version: str) -> Optional[str]:
+        if not _VERSION_PATTERN.match(version):
+            raise ValueError(f"Invalid model version: {version}")
+        for directory in dict.fromkeys([self.directory, BUNDLED_MODEL_DIR]):
+            path = os.path.join(directory, f"{version}.json")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def available(self) -> List[str]:
+        """Versions with a weight file in the store"""
+        versions = set()
+        for directory in (self.directory, BUNDLED_MODEL_DIR):
+            if os.path.isdir(directory):
+                versions.update(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+        return sorted(versions)
+
+    def resident_versions(self) -> List[str]:
+        """Compiled versions in memory, least recently used first"""
+        return list(self._models)
+
+    def load(self, version: str) -> CompiledModel:
+        """Read, compile and warm a version from the store (not cached)"""
+        path = self._path(version)
+        if path is None:
+            raise ValueError(f"Unknown model version: {version}")
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Could not read weights for model {version}: {e}")
+        model = parse_weights(data, version)
+        warm_model(model)
+        return model
+
+    # Versions -------------------------------------------------------------
+
+    def get(self, version: Optional[str] = None) -> CompiledModel:
+        """A compiled version (the active one by default), loading it if not resident"""
+        if version is None:
+            return self.active()
+
+        model = self._models.get(version)
+        if model is None:
+            # Loaded outside the lock; a concurrent load of the same version just loses the race
+            loaded = self.load(version)
+            with self._lock:
+                model = self._models.setdefault(version, loaded)
+                self._evict()
+        else:
+            with self._lock:
+                if version in self._models:
+                    self._models.move_to_end(version)
+        return model
+
+    def _evict(self) -> None:
+        active = self._active.version if self._active else None
+        for version in list(self._models):
+            if len(self._models) <= self.resident:
+                break
+            if version != active:
+                del self._models[version]
+
+    def active(self) -> CompiledModel:
+        """The version served by default"""
+        model = self._active
+        if model is None:
+            stamp = self._read_active_stamp()
+            version = self._active_version_from(stamp)
+            try:
+                model = self.get(version)
+            except ValueError as e:
+                if version == self.default_version:
+                    raise
+                print(f"Warning: Could not load active compatibility model, using {self.default_version}: {e}")
+                model = self.get(self.default_version)
+            model = self._swap(model, stamp)
+        return model
+
+    def _swap(self, model: CompiledModel, stamp) -> CompiledModel:
+        with self._lock:
+            self._active = model
+            self._active_stamp = stamp
+            self._models[model.version] = model
+            self._models.move_to_end(model.version)
+            self._evict()
+        return model
+
+    def activate(self, version: str, persist: bool = True) -> CompiledModel:
+        """
+        Load and warm a version, then make it the active one. With
+        `persist`, it is also written to the ACTIVE file so that other
+        processes' watchers switch to it too.
+        """
+        model = self.get(version)
+        stamp = None
+        if persist:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, ACTIVE_FILE)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(version + "\n")
+            os.replace(tmp, path)
+            stamp = self._read_active_stamp()
+        elif self._active is not None:
+            stamp = self._active_stamp
+        return self._swap(model, stamp)
+
+    # Watching ---------------------------------------------------------------
+
+    def _read_active_stamp(self):
+        """(mtime_ns, version) of the ACTIVE file, or None without one"""
+        path = os.path.join(self.directory, ACTIVE_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path) as f:
+                return mtime, f.read().strip()
+        except OSError:
+            return None
+
+    def _active_version_from(self, stamp) -> str:
+        return stamp[1] if stamp and stamp[1] else self.default_version
+
+    def poll(self) -> bool:
+        """Switch to the version in the ACTIVE file if it changed; returns whether it did"""
+        stamp = self._read_active_stamp()
+        if self._active is not None and stamp in (self._active_stamp, self._failed_stamp):
+            return False
+        version = self._active_version_from(stamp)
+        if self._active is not None and version == self._active.version:
+            self._active_stamp = stamp
+            return False
+        try:
+            model = self.get(version)
+        except ValueError:
+            # Not retried until the ACTIVE file changes again
+            self._failed_stamp = stamp
+            raise
+        self._swap(model, stamp)
+        print(f"✅ Compatibility model {version} active")
+        return True
+
+    def start_watching(self, interval: float = MODEL_RELOAD_INTERVAL) -> None:
+        """Poll the ACTIVE file from a daemon thread every `interval` seconds (0 disables)"""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"Warning: Could not switch compatibility model: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+registry = ModelRegistry()
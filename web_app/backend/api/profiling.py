@@ -0,0 +1,226 @@
+"""
+Request Profiling
+Opt-in statistical stack profiles of individual production requests
+
+A request is profiled when it carries a valid signed X-Profile header (see
+scripts/profile_token.py) or is picked at random with probability
+PROFILE_SAMPLE_RATE. While it runs, a sampler thread reads the stacks of the
+event-loop thread (only while the request's own task is running on it) and
+of the worker threads that are busy, every PROFILE_INTERVAL_MS; the
+interpreter's GIL switch interval is lowered to match for the duration.
+Worker thread stacks can belong to other requests running at the same time
+and are kept under a "[thread <name>]" root frame. Long calls into C code
+that hold the GIL (e.g. JSON or pydantic-core work) get fewer samples than
+their share of the time.
+
+Each profile is written to PROFILE_DIR as collapsed stacks ("a;b;c <count>"
+per line), the input format of flamegraph.pl and speedscope, and only the
+newest PROFILE_RETENTION files are kept. The response carries the profile's
+id in an X-Profile-Id header.
+
+With sampling off and no secret configured, a request costs one extra ASGI
+call and a comparison; at most one request per process is profiled at a
+time.
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "profiles"),
+)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_SUFFIX = ".collapsed"
+
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Innermost Python frames of a thread that is waiting rather than working
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+# Signed header ----------------------------------------------------------------
+
+def sign_profile_token(expires: int, secret: Optional[str] = None) -> str:
+    """X-Profile header value valid until the unix time `expires`"""
+    key = (secret if secret is not None else PROFILE_SECRET).encode()
+    signature = hmac.new(key, str(expires).encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_token(token: str, secret: Optional[str] = None) -> bool:
+    """Whether an X-Profile header value is correctly signed and unexpired"""
+    secret = secret if secret is not None else PROFILE_SECRET
+    if not secret:
+        return False
+    expires = token.partition(".")[0]
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign_profile_token(int(expires), secret), token)
+
+
+# Sampler ----------------------------------------------------------------------
+
+_frame_names: Dict[object, str] = {}
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = _frame_names.get(code)
+    if name is None:
+        path = code.co_filename
+        if "site-packages" in path:
+            path = path.split("site-packages" + os.sep, 1)[-1]
+        elif path.startswith(_BACKEND_ROOT):
+            path = os.path.relpath(path, _BACKEND_ROOT)
+        name = _frame_names[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return name
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+def _stack(frame) -> list:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class StackSampler:
+    """Samples thread stacks of one request into collapsed-stack counts"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000.0):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        # A busy thread only hands over the GIL every switch interval (5 ms
+        # by default), which would cap the sampling rate
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                if ident == self._loop_thread:
+                    # Only while this request's task has the loop
+                    running = asyncio.current_task(self._loop)
+                    if running is not None and running is not self._task:
+                        continue
+                    self.samples[";".join(_stack(frame))] += 1
+                else:
+                    if ident not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    root = f"[thread {names.get(ident, ident)}]"
+                    self.samples[";".join([root] + _stack(frame))] += 1
+
+
+# Storage ----------------------------------------------------------------------
+
+def _profile_path(profile_id: str, method: str, route: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")[:80] or "root"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return os.path.join(PROFILE_DIR, f"{stamp}-{method}-{slug}-{profile_id}{PROFILE_SUFFIX}")
+
+
+def write_profile(path: str, samples: Dict[str, int]) -> None:
+    """Write collapsed stacks, then drop the oldest profiles beyond PROFILE_RETENTION"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in samples.items():
+            f.write(f"{stack} {count}\n")
+
+    profiles = sorted(
+        (entry for entry in os.scandir(os.path.dirname(path)) if entry.name.endswith(PROFILE_SUFFIX)),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(0, len(profiles) - PROFILE_RETENTION)]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+# ASGI -------------------------------------------------------------------------
+
+class ProfilingMiddleware:
+    """Profiles requests opted in by signed header or random sampling"""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, secret: str = PROFILE_SECRET):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope) -> bool:
+        if self.secret:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER:
+                    return verify_profile_token(value.decode("latin-1"), self.secret)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            route = getattr(scope.get("route"), "path", scope["path"])
+            try:
+                write_profile(_profile_path(profile_id, scope["method"], route), sampler.samples)
+            except OSError as e:
+                print(f"Warning: Could not write request profile: {e}")
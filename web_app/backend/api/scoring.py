@@ -0,0 +1,532 @@
+"""
+Columnar Compatibility Scoring
+Vectorized versions of the CompatibilityModel computations for batch endpoints
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+import os
+import numpy as np
+
+
+N_TRAITS = 32
+N_RESONANCE = 7
+DEFAULT_RESONANCE = [0.5] * N_RESONANCE
+
+# Weight set served until another is activated (CompatibilityOptions.model_version)
+MODEL_VERSION = os.getenv("MODEL_VERSION", "1.0.0")
+
+# Trait index ranges for the dimension breakdown (start, stop)
+DIMENSION_GROUPS = {
+    "attachment": (0, 5),
+    "conflict": (5, 10),
+    "cognitive": (10, 15),
+    "values": (15, 21),
+    "social": (21, 26),
+    "sexual": (26, 29),
+    "life_structure": (29, 32),
+}
+
+# Element compatibility lookup (Fire, Earth, Air, Water)
+ELEMENTS = ["Fire", "Earth", "Air", "Water"]
+_ELEMENT_SCORES = np.array([
+    # Fire Earth Air  Water
+    [1.0, 0.4, 0.7, 0.4],  # Fire
+    [0.4, 1.0, 0.4, 0.7],  # Earth
+    [0.7, 0.4, 1.0, 0.4],  # Air
+    [0.4, 0.7, 0.4, 1.0],  # Water
+])
+
+_ZODIAC_SIGNS = [
+    ("Aquarius", (1, 20), (2, 18)),
+    ("Pisces", (2, 19), (3, 20)),
+    ("Aries", (3, 21), (4, 19)),
+    ("Taurus", (4, 20), (5, 20)),
+    ("Gemini", (5, 21), (6, 20)),
+    ("Cancer", (6, 21), (7, 22)),
+    ("Leo", (7, 23), (8, 22)),
+    ("Virgo", (8, 23), (9, 22)),
+    ("Libra", (9, 23), (10, 22)),
+    ("Scorpio", (10, 23), (11, 21)),
+    ("Sagittarius", (11, 22), (12, 21)),
+    ("Capricorn", (12, 22), (1, 19)),
+]
+
+_SIGN_ELEMENTS = {
+    "Aries": 0, "Leo": 0, "Sagittarius": 0,
+    "Taurus": 1, "Virgo": 1, "Capricorn": 1,
+    "Gemini": 2, "Libra": 2, "Aquarius": 2,
+    "Cancer": 3, "Scorpio": 3, "Pisces": 3,
+}
+
+
+class PackedPairs:
+    """
+    Pairs validated and packed into contiguous arrays.
+
+    Rows of V1/V2/R only exist for valid pairs; `index` maps each row back to
+    its position in the original request and `errors` holds the rejected ones.
+    """
+
+    def __init__(
+        self,
+        V1: np.ndarray,
+        V2: np.ndarray,
+        R: np.ndarray,
+        index: np.ndarray,
+        errors: Dict[int, str],
+        numerology_idx: np.ndarray,
+        numerology_bd: List[Tuple[str, str]],
+        astrology_idx: np.ndarray,
+        astrology_bd: List[Tuple[str, str]],
+        total: int,
+    ):
+        self.V1 = V1
+        self.V2 = V2
+        self.R = R
+        self.index = index
+        self.errors = errors
+        self.numerology_idx = numerology_idx
+        self.numerology_bd = numerology_bd
+        self.astrology_idx = astrology_idx
+        self.astrology_bd = astrology_bd
+        self.total = total
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class PairInput:
+    """
+    Lightweight pair record with the CompatibilityRequest fields.
+
+    Used by the bulk endpoints to skip per-pair Pydantic models; pack_pairs
+    does the actual validation.
+    """
+
+    __slots__ = (
+        "person1", "person2", "resonance", "include_numerology",
+        "include_astrology", "birthdate1", "birthdate2",
+    )
+
+    def __init__(self, data: Dict):
+        self.person1 = data.get("person1") or {}
+        self.person2 = data.get("person2") or {}
+        self.resonance = data.get("resonance")
+        self.include_numerology = bool(data.get("include_numerology", False))
+        self.include_astrology = bool(data.get("include_astrology", False))
+        self.birthdate1 = data.get("birthdate1") if isinstance(data.get("birthdate1"), str) else None
+        self.birthdate2 = data.get("birthdate2") if isinstance(data.get("birthdate2"), str) else None
+
+
+def pack_pairs(pairs: Sequence) -> PackedPairs:
+    """
+    Validate request pairs and pack them into (n, 32) / (n, 7) float arrays.
+
+    Each pair is an object with the CompatibilityRequest fields. Invalid pairs
+    are recorded in `errors` by request index instead of raising, so a single
+    bad pair never fails the whole batch.
+    """
+    n = len(pairs)
+    V1 = np.empty((n, N_TRAITS), dtype=np.float64)
+    V2 = np.empty((n, N_TRAITS), dtype=np.float64)
+    R = np.empty((n, N_RESONANCE), dtype=np.float64)
+    index = np.empty(n, dtype=np.int64)
+    errors: Dict[int, str] = {}
+    numerology_idx: List[int] = []
+    numerology_bd: List[Tuple[str, str]] = []
+    astrology_idx: List[int] = []
+    astrology_bd: List[Tuple[str, str]] = []
+
+    row = 0
+    for i, pair in enumerate(pairs):
+        traits1 = pair.person1.get("traits", []) if isinstance(pair.person1, dict) else []
+        traits2 = pair.person2.get("traits", []) if isinstance(pair.person2, dict) else []
+
+        if not isinstance(traits1, (list, tuple)) or not isinstance(traits2, (list, tuple)):
+            errors[i] = "Traits and resonance must be numeric"
+            continue
+        if len(traits1) != N_TRAITS:
+            errors[i] = "Person1 must have 32 traits"
+            continue
+        if len(traits2) != N_TRAITS:
+            errors[i] = "Person2 must have 32 traits"
+            continue
+
+        try:
+            V1[row] = traits1
+            V2[row] = traits2
+            if isinstance(pair.resonance, list) and len(pair.resonance) == N_RESONANCE:
+                R[row] = pair.resonance
+            else:
+                R[row] = DEFAULT_RESONANCE
+        except (TypeError, ValueError):
+            errors[i] = "Traits and resonance must be numeric"
+            continue
+        # None converts to NaN rather than failing the assignment
+        if not (np.isfinite(V1[row]).all() and np.isfinite(V2[row]).all() and np.isfinite(R[row]).all()):
+            errors[i] = "Traits and resonance must be numeric"
+            continue
+
+        if pair.birthdate1 and pair.birthdate2:
+            if pair.include_numerology:
+                numerology_idx.append(row)
+                numerology_bd.append((pair.birthdate1, pair.birthdate2))
+            if pair.include_astrology:
+                astrology_idx.append(row)
+                astrology_bd.append((pair.birthdate1, pair.birthdate2))
+
+        index[row] = i
+        row += 1
+
+    return PackedPairs(
+        V1=V1[:row],
+        V2=V2[:row],
+        R=R[:row],
+        index=index[:row],
+        errors=errors,
+        numerology_idx=np.array(numerology_idx, dtype=np.int64),
+        numerology_bd=numerology_bd,
+        astrology_idx=np.array(astrology_idx, dtype=np.int64),
+        astrology_bd=astrology_bd,
+        total=n,
+    )
+
+
+def model_weights(model) -> Tuple[np.ndarray, float, float, float, float]:
+    """
+    Read (alphas, beta1, beta2, gamma1, gamma2) from a CompatibilityModel.
+
+    The simplified fallback model has no weight objects, so its constants
+    (unit alphas, 0.5/0.5 resonance, 0.5/0.5 combination) are used instead.
+    """
+    if isinstance(model, CompiledModel):
+        return model.alphas, model.beta1, model.beta2, model.gamma1, model.gamma2
+
+    trait_weights = getattr(model, "trait_weights", None)
+    alphas = np.asarray(trait_weights.alphas, dtype=np.float64) if trait_weights else np.ones(N_TRAITS)
+
+    resonance_weights = getattr(model, "resonance_weights", None)
+    beta1 = resonance_weights.beta1 if resonance_weights else 0.5
+    beta2 = resonance_weights.beta2 if resonance_weights else 0.5
+
+    compatibility_weights = getattr(model, "compatibility_weights", None)
+    gamma1 = compatibility_weights.gamma1 if compatibility_weights else 0.5
+    gamma2 = compatibility_weights.gamma2 if compatibility_weights else 0.5
+
+    return alphas, beta1, beta2, gamma1, gamma2
+
+
+def _resonance_compatibility(beta1: float, beta2: float, metrics: Sequence[float]) -> float:
+    mean = sum(metrics) / len(metrics)
+    variance = sum((x - mean) ** 2 for x in metrics) / len(metrics)
+    return beta1 * mean + beta2 * max(0.0, min(1.0, 1.0 - variance))
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledModel:
+    """
+    CompatibilityModel weights packed once, with the constants derived from them.
+
+    The arrays are read-only, so one instance is safely shared by every
+    request, batch kernel and job in a process (see api.model_registry).
+    Every function here that takes a `model` accepts one, and skips reading
+    and converting the weights on each call.
+    """
+    version: str
+    alphas: np.ndarray          # (32,) trait weights
+    sqrt_alphas: np.ndarray     # (32,) scales traits so plain distances are weighted
+    beta1: float
+    beta2: float
+    gamma1: float
+    gamma2: float
+    soulmate_weights: np.ndarray  # (6,) signed, S = Y @ soulmate_weights
+    default_c_res: float        # C_res of DEFAULT_RESONANCE
+
+    def resonance_compatibility(self, metrics: Sequence[float]) -> float:
+        """C_res = beta1 * mean + beta2 * stability, stability = 1 - variance (clamped)"""
+        return _resonance_compatibility(self.beta1, self.beta2, metrics)
+
+    def total_compatibility(self, p1, p2, r, feasibility: float = 1.0) -> Dict[str, float]:
+        """Scalar CompatibilityModel.total_compatibility for one pair"""
+        feasibility = max(0.0, min(1.0, feasibility))
+        diff = np.asarray(p1.traits, dtype=np.float64) - np.asarray(p2.traits, dtype=np.float64)
+        c_traits = math.exp(-math.sqrt(float((diff * diff) @ self.alphas)))
+        c_res = self.resonance_compatibility(r.metrics)
+        c_total = self.gamma1 * c_traits + self.gamma2 * c_res
+        return {
+            "C_traits": c_traits,
+            "C_res": c_res,
+            "C_total": c_total,
+            "feasibility": feasibility,
+            "S_hat": feasibility * c_total,
+        }
+
+    def soulmate_score(self, y: Sequence[float]) -> float:
+        """S = w1*Y1 + w2*Y2 + w3*Y3 - w4*Y4 + w5*Y5 + w6*Y6 for an outcome vector"""
+        return float(np.asarray(y, dtype=np.float64) @ self.soulmate_weights)
+
+
+def compile_model(model, version: str = MODEL_VERSION) -> CompiledModel:
+    """Pack a CompatibilityModel's weights into a CompiledModel (returned as is if already one)"""
+    if isinstance(model, CompiledModel):
+        return model
+
+    alphas, beta1, beta2, gamma1, gamma2 = model_weights(model)
+    alphas = np.array(alphas, dtype=np.float64)
+    if alphas.shape != (N_TRAITS,):
+        raise ValueError(f"Model expects {N_TRAITS} trait weights, got {alphas.size}")
+    sqrt_alphas = np.sqrt(alphas)
+
+    w = getattr(model, "soulmate_score_weights", None)
+    if w is not None:
+        soulmate_weights = np.array([w.w1, w.w2, w.w3, -w.w4, w.w5, w.w6], dtype=np.float64)
+    else:
+        soulmate_weights = np.array([1.0, 1.0, 1.0, -1.0, 1.0, 1.0])
+
+    for array in (alphas, sqrt_alphas, soulmate_weights):
+        array.setflags(write=False)
+
+    return CompiledModel(
+        version=version,
+        alphas=alphas,
+        sqrt_alphas=sqrt_alphas,
+        beta1=float(beta1),
+        beta2=float(beta2),
+        gamma1=float(gamma1),
+        gamma2=float(gamma2),
+        soulmate_weights=soulmate_weights,
+        default_c_res=_resonance_compatibility(float(beta1), float(beta2), DEFAULT_RESONANCE),
+    )
+
+
+def score_pairs(model, V1: np.ndarray, V2: np.ndarray, R: np.ndarray, feasibility: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    Vectorized CompatibilityModel.total_compatibility over n pairs.
+
+    Returns arrays keyed like the scalar result: C_traits, C_res, C_total, S_hat.
+    """
+    model = compile_model(model)
+    feasibility = max(0.0, min(1.0, feasibility))
+
+    diff = V1 - V2
+    c_traits = np.exp(-np.sqrt((diff * diff) @ model.alphas))
+
+    r_mean = R.mean(axis=1)
+    r_var = R.var(axis=1)
+    r_stab = np.clip(1.0 - r_var, 0.0, 1.0)
+    c_res = model.beta1 * r_mean + model.beta2 * r_stab
+
+    c_total = model.gamma1 * c_traits + model.gamma2 * c_res
+
+    return {
+        "C_traits": c_traits,
+        "C_res": c_res,
+        "C_total": c_total,
+        "S_hat": feasibility * c_total,
+    }
+
+
+class ScaledTraits:
+    """
+    Trait rows scaled by sqrt(alpha), so plain squared distances are the
+    weighted ones, stored as float32 with their squared norms.
+
+    Weighted squared distances are then |a|^2 + |b|^2 - 2<a, b>, a float32
+    dot product per pair, and cancellation leaves near-identical pairs
+    (including a row with itself) off by float32 rounding, about 1e-3.
+    `weights_version` is the CompiledModel version the rows were scaled with.
+    """
+
+    def __init__(self, vectors: np.ndarray, sq_norms: np.ndarray, weights_version: Optional[str] = None):
+        self.vectors = vectors
+        self.sq_norms = sq_norms
+        self.weights_version = weights_version
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def __getitem__(self, idx) -> "ScaledTraits":
+        return ScaledTraits(self.vectors[idx], self.sq_norms[idx], self.weights_version)
+
+
+def scale_traits(model, X: np.ndarray) -> ScaledTraits:
+    """Scale an (n, 32) trait matrix for plain Euclidean distances (see ScaledTraits)"""
+    model = compile_model(model)
+    vectors = (np.asarray(X, dtype=np.float64).reshape(-1, N_TRAITS) * model.sqrt_alphas).astype(np.float32)
+    wide = vectors.astype(np.float64)
+    return ScaledTraits(vectors, np.einsum("ij,ij->i", wide, wide), model.version)
+
+
+def scores_from_sq_distances(
+    model,
+    D2: np.ndarray,
+    resonance: Optional[Sequence[float]] = None,
+    feasibility: float = 1.0,
+) -> np.ndarray:
+    """
+    S_hat from weighted squared trait distances, computed in place on D2.
+
+    All pairs share one resonance vector (the neutral default unless given),
+    so C_res is a constant.
+    """
+    model = compile_model(model)
+    feasibility = max(0.0, min(1.0, feasibility))
+
+    np.maximum(D2, 0.0, out=D2)
+    np.sqrt(D2, out=D2)
+    np.negative(D2, out=D2)
+    np.exp(D2, out=D2)
+
+    c_res = model.default_c_res if resonance is None else model.resonance_compatibility(list(resonance))
+
+    D2 *= model.gamma1 * feasibility
+    D2 += model.gamma2 * c_res * feasibility
+    return D2
+
+
+def pairwise_scores(
+    model,
+    X: np.ndarray,
+    Y: Optional[np.ndarray] = None,
+    resonance: Optional[Sequence[float]] = None,
+    feasibility: float = 1.0,
+) -> np.ndarray:
+    """
+    S_hat for every (row of X, row of Y) pair as an (n, m) float32 matrix.
+
+    Y defaults to X. X and Y may be raw trait matrices or ScaledTraits
+    already scaled with this model (e.g. stored at ingestion). Weighted
+    squared distances come from the Gram matrix of the scaled rows, so the
+    work is one float32 matrix product instead of n*m difference vectors.
+    Cancellation makes near-identical pairs slightly inexact; rescore the
+    pairs you keep with score_pairs. With Y defaulted, each row's distance to
+    itself is set to exactly zero.
+    """
+    A = X if isinstance(X, ScaledTraits) else scale_traits(model, X)
+    if Y is None:
+        B = A
+    else:
+        B = Y if isinstance(Y, ScaledTraits) else scale_traits(model, Y)
+
+    D2 = A.vectors @ B.vectors.T
+    D2 *= -2.0
+    D2 += A.sq_norms[:, None].astype(np.float32)
+    D2 += B.sq_norms[None, :].astype(np.float32)
+    if Y is None:
+        np.fill_diagonal(D2, 0.0)
+    return scores_from_sq_distances(model, D2, resonance=resonance, feasibility=feasibility)
+
+
+def dimension_alignment(V1: np.ndarray, V2: np.ndarray) -> Dict[str, np.ndarray]:
+    """Vectorized dimension-specific alignments (1 - mean absolute difference, clamped)"""
+    abs_diff = np.abs(V1 - V2)
+    return {
+        name: np.clip(1.0 - abs_diff[:, start:stop].mean(axis=1), 0.0, 1.0)
+        for name, (start, stop) in DIMENSION_GROUPS.items()
+    }
+
+
+@lru_cache(maxsize=65536)
+def life_path_number(birthdate: str) -> int:
+    """Numerology life path number (digit sum reduced to 1-9)"""
+    digits = birthdate.replace("-", "").replace("/", "")
+    total = sum(int(d) for d in digits if d.isdigit())
+    while total > 9:
+        total = sum(int(d) for d in str(total))
+    return total
+
+
+@lru_cache(maxsize=65536)
+def zodiac_element(birthdate: str) -> int:
+    """Index into ELEMENTS for the zodiac sign of a birthdate (Capricorn if unparseable)"""
+    try:
+        parts = birthdate.split("-") if "-" in birthdate else birthdate.split("/")
+        month, day = int(parts[1]), int(parts[2])
+    except (IndexError, ValueError):
+        return _SIGN_ELEMENTS["Capricorn"]
+
+    for name, (m1, d1), (m2, d2) in _ZODIAC_SIGNS:
+        if (month == m1 and day >= d1) or (month == m2 and day <= d2) or (m1 > m2 and month in [m1, m2]):
+            return _SIGN_ELEMENTS[name]
+    return _SIGN_ELEMENTS["Capricorn"]
+
+
+def numerology_scores(birthdates: List[Tuple[str, str]]) -> np.ndarray:
+    """Vectorized numerology compatibility (1.0 same path, 0.7 within 2, else 0.3)"""
+    lp = np.array([(life_path_number(a), life_path_number(b)) for a, b in birthdates], dtype=np.int64).reshape(-1, 2)
+    gap = np.abs(lp[:, 0] - lp[:, 1])
+    return np.where(gap == 0, 1.0, np.where(gap <= 2, 0.7, 0.3))
+
+
+def astrology_scores(birthdates: List[Tuple[str, str]]) -> np.ndarray:
+    """Vectorized element-based astrology compatibility"""
+    el = np.array([(zodiac_element(a), zodiac_element(b)) for a, b in birthdates], dtype=np.int64).reshape(-1, 2)
+    return _ELEMENT_SCORES[el[:, 0], el[:, 1]]
+
+
+def score_packed(model, packed: PackedPairs) -> Dict[str, np.ndarray]:
+    """
+    Score all valid rows of a PackedPairs in one vectorized pass.
+
+    Numerology/astrology columns are NaN where the pair did not request them.
+    """
+    result = score_pairs(model, packed.V1, packed.V2, packed.R)
+    result.update(dimension_alignment(packed.V1, packed.V2))
+
+    n = len(packed)
+    numerology = np.full(n, np.nan)
+    if len(packed.numerology_idx):
+        numerology[packed.numerology_idx] = numerology_scores(packed.numerology_bd)
+    astrology = np.full(n, np.nan)
+    if len(packed.astrology_idx):
+        astrology[packed.astrology_idx] = astrology_scores(packed.astrology_bd)
+
+    result["numerology"] = numerology
+    result["astrology"] = astrology
+    return result
+
+
+# Public column names for the score arrays
+RESULT_COLUMNS = {
+    "S_hat": "compatibility_score",
+    "C_traits": "trait_compatibility",
+    "C_res": "resonance_compatibility",
+    "C_total": "total_compatibility",
+    "numerology": "numerology_score",
+    "astrology": "astrology_score",
+}
+
+
+def result_columns(scores: Dict[str, np.ndarray], dtype=np.float32) -> Dict[str, np.ndarray]:
+    """Score arrays under their public names (dimension columns keep theirs)"""
+    return {RESULT_COLUMNS.get(name, name): np.asarray(value, dtype=dtype) for name, value in scores.items()}
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if value != value else value
+
+
+def unpack_results(packed: PackedPairs, scores: Dict[str, np.ndarray]) -> List[Optional[Dict]]:
+    """
+    Turn columnar scores back into per-pair dicts aligned with the request.
+
+    Positions of rejected pairs are None; see `packed.errors` for the reason.
+    """
+    results: List[Optional[Dict]] = [None] * packed.total
+    columns = {key: value.tolist() for key, value in scores.items()}
+    dimensions = list(DIMENSION_GROUPS)
+
+    for row, i in enumerate(packed.index.tolist()):
+        results[i] = {
+            "compatibility_score": columns["S_hat"][row],
+            "trait_compatibility": columns["C_traits"][row],
+            "resonance_compatibility": columns["C_res"][row],
+            "total_compatibility": columns["C_total"][row],
+            "dimension_breakdown": {name: columns[name][row] for name in dimensions},
+            "numerology_score": _optional(columns["numerology"][row]),
+            "astrology_score": _optional(columns["astrology"][row]),
+        }
+    return results
@@ -0,0 +1,392 @@
+"""
+Response Serialization
+Fast JSON rendering for the hot endpoints, columnar batch results and
+lightweight serializers for ORM rows
+
+FastJSONResponse renders with orjson when it is installed and with the
+stdlib json module otherwise; numpy scalars and arrays, datetimes, UUIDs and
+enums are encoded directly, so endpoints can hand over plain dicts without a
+pydantic model or jsonable_encoder pass per item. Endpoints that return one
+keep their response_model for the OpenAPI schema only.
+
+Batch results can also be returned in columnar form, selected with
+`?format=columnar` or `Accept: application/vnd.soulmate.columnar+json`:
+
+  {
+    "format": "columnar",
+    "index": [0, 2, ...],                 request position of each row
+    "columns": {
+      "compatibility_score": [...],
+      ...
+      "dimension_breakdown": {"attachment": [...], ...}
+    },
+    "errors": [{"index": 1, "detail": "..."}],
+    "count": ..., "total": ..., "batch_id": ..., "timestamp": ...
+  }
+
+Rows only exist for scored pairs; numerology_score and astrology_score are
+null where they were not requested. Result i of the object format has the
+request_id "<batch_id>-<i>".
+
+Machine-to-machine clients can ask for binary formats instead (when the
+library is installed):
+
+  msgpack  (application/msgpack) the columnar layout as MessagePack, scores
+           packed as 32-bit floats
+  arrow    (application/vnd.apache.arrow.stream) an Arrow IPC stream with
+           one row per request pair: an int64 `index` column, float32 score
+           and dimension columns (null where a pair failed or a score was not
+           requested) and a string `error` column; batch_id, timestamp and
+           count are in the schema metadata
+
+The bulk endpoint streams one chunk at a time in the same formats: NDJSON
+lines (objects, or columnar chunks), a sequence of MessagePack maps ending
+with {"summary": ...}, or one Arrow record batch per chunk ending with an
+empty batch whose custom metadata holds the summary as JSON.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+import enum
+import io
+import json
+import uuid
+
+import numpy as np
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from api.scoring import DIMENSION_GROUPS, RESULT_COLUMNS, PackedPairs, unpack_results
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.soulmate.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Response formats by name (?format=...) and media type (Accept)
+RESPONSE_FORMATS = {
+    "json": "application/json",
+    "columnar": COLUMNAR_MEDIA_TYPE,
+    "msgpack": MSGPACK_MEDIA_TYPE,
+    "arrow": ARROW_MEDIA_TYPE,
+}
+
+# Other media types clients send for the same formats
+_MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": "msgpack",
+    "application/vnd.apache.arrow.file": "arrow",
+}
+
+# Library each binary format needs
+_FORMAT_LIBRARIES = {
+    "msgpack": ("msgpack", msgpack),
+    "arrow": ("pyarrow", pa),
+}
+
+# Score columns that are NaN where the score was not requested
+_OPTIONAL_COLUMNS = ("numerology", "astrology")
+
+
+def _default(obj: Any) -> Any:
+    """Encode the types the JSON encoders don't handle themselves"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        """Render `content` as compact UTF-8 JSON"""
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+    # orjson.JSONDecodeError is a ValueError, like json's
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(content: Any) -> bytes:
+        """Render `content` as compact UTF-8 JSON"""
+        return _encoder.encode(content).encode("utf-8")
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps() instead of json.dumps"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def format_available(name: str) -> bool:
+    """Whether the library a response format needs is installed"""
+    return _FORMAT_LIBRARIES.get(name, (None, True))[1] is not None
+
+
+def response_format(request: Request, requested: Optional[str] = None) -> str:
+    """
+    Response format name for a request: the `format` query value if given,
+    else the first available format in Accept, else "json". Unknown format
+    names, and binary formats whose library is not installed, raise
+    ValueError.
+    """
+    if requested:
+        if requested not in RESPONSE_FORMATS:
+            raise ValueError(f"Unknown format '{requested}' (expected one of: {', '.join(RESPONSE_FORMATS)})")
+        if not format_available(requested):
+            raise ValueError(f"Format '{requested}' is not available: {_FORMAT_LIBRARIES[requested][0]} is not installed")
+        return requested
+    by_media_type = {media_type: name for name, media_type in RESPONSE_FORMATS.items()}
+    by_media_type.update(_MEDIA_TYPE_ALIASES)
+    for entry in request.headers.get("accept", "").split(","):
+        name = by_media_type.get(entry.split(";", 1)[0].strip().lower())
+        if name is not None and format_available(name):
+            return name
+    return "json"
+
+
+def packb(content: Any) -> bytes:
+    """Render `content` as MessagePack, floats as 32-bit"""
+    return msgpack.packb(content, default=_default, use_bin_type=True, use_single_float=True)
+
+
+# Batch results ----------------------------------------------------------------
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    """Column as a list with NaN as None"""
+    missing = np.isnan(values)
+    if not missing.any():
+        return values.tolist()
+    return [None if skip else value for value, skip in zip(values.tolist(), missing.tolist())]
+
+
+def columnar_results(packed: PackedPairs, scores: Dict[str, np.ndarray], offset: int = 0) -> Dict[str, Any]:
+    """Index, score columns and errors of a chunk, positions shifted by `offset`"""
+    columns: Dict[str, Any] = {}
+    for name, public in RESULT_COLUMNS.items():
+        values = np.asarray(scores[name], dtype=np.float64)
+        columns[public] = _nullable(values) if name in _OPTIONAL_COLUMNS else values.tolist()
+    columns["dimension_breakdown"] = {
+        name: np.asarray(scores[name], dtype=np.float64).tolist() for name in DIMENSION_GROUPS
+    }
+    return {
+        "index": (packed.index + offset).tolist(),
+        "columns": columns,
+        "errors": [{"index": offset + i, "detail": detail} for i, detail in sorted(packed.errors.items())],
+    }
+
+
+def columnar_batch(
+    packed: PackedPairs,
+    scores: Dict[str, np.ndarray],
+    timestamp: str,
+    batch_id: str,
+) -> Dict[str, Any]:
+    """Batch results as one list per score column (see the module docstring)"""
+    return {
+        "format": "columnar",
+        **columnar_results(packed, scores),
+        "count": len(packed),
+        "total": packed.total,
+        "batch_id": batch_id,
+        "timestamp": timestamp,
+    }
+
+
+# Arrow ------------------------------------------------------------------------
+
+# (score key, column name) in column order
+_ARROW_SCORE_COLUMNS = list(RESULT_COLUMNS.items()) + [(name, name) for name in DIMENSION_GROUPS]
+
+
+def arrow_schema(metadata: Optional[Dict[str, str]] = None):
+    """Schema of the Arrow results (see the module docstring)"""
+    fields = [pa.field("index", pa.int64(), nullable=False)]
+    fields += [pa.field(column, pa.float32()) for _, column in _ARROW_SCORE_COLUMNS]
+    fields.append(pa.field("error", pa.string()))
+    return pa.schema(fields, metadata=metadata)
+
+
+def arrow_record_batch(packed: PackedPairs, scores: Dict[str, np.ndarray], offset: int = 0, schema=None):
+    """One row per request pair, scores scattered to their request positions"""
+    schema = schema if schema is not None else arrow_schema()
+    arrays = [pa.array(np.arange(offset, offset + packed.total, dtype=np.int64))]
+    for name, _ in _ARROW_SCORE_COLUMNS:
+        values = np.full(packed.total, np.nan, dtype=np.float32)
+        values[packed.index] = scores[name]
+        arrays.append(pa.array(values, mask=np.isnan(values)))
+    errors: List[Optional[str]] = [None] * packed.total
+    for i, detail in packed.errors.items():
+        errors[i] = detail
+    arrays.append(pa.array(errors, type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def arrow_batch(packed: PackedPairs, scores: Dict[str, np.ndarray], timestamp: str, batch_id: str) -> bytes:
+    """Batch results as a complete Arrow IPC stream"""
+    schema = arrow_schema({"batch_id": batch_id, "timestamp": timestamp, "count": str(len(packed))})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(arrow_record_batch(packed, scores, schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
+class _PendingBytes(io.RawIOBase):
+    """Write-only file that hands out what was written since the last take()"""
+
+    mode = "wb"
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+# Bulk stream encoders ---------------------------------------------------------
+
+class NDJSONEncoder:
+    """One JSON object per pair (errors as {"index", "error"})"""
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    def chunk(self, packed: PackedPairs, scores: Dict[str, np.ndarray], offset: int) -> bytes:
+        lines = []
+        for i, result in enumerate(unpack_results(packed, scores)):
+            if result is None:
+                lines.append(dumps({"index": offset + i, "error": packed.errors[i]}))
+            else:
+                result["index"] = offset + i
+                lines.append(dumps(result))
+        return b"\n".join(lines) + b"\n"
+
+    def summary(self, summary: Dict[str, Any]) -> bytes:
+        return dumps({"summary": summary}) + b"\n"
+
+
+class ColumnarNDJSONEncoder(NDJSONEncoder):
+    """One columnar JSON object per chunk"""
+
+    def chunk(self, packed: PackedPairs, scores: Dict[str, np.ndarray], offset: int) -> bytes:
+        return dumps(columnar_results(packed, scores, offset)) + b"\n"
+
+
+class MsgpackEncoder:
+    """One columnar MessagePack map per chunk"""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def chunk(self, packed: PackedPairs, scores: Dict[str, np.ndarray], offset: int) -> bytes:
+        return packb(columnar_results(packed, scores, offset))
+
+    def summary(self, summary: Dict[str, Any]) -> bytes:
+        return packb({"summary": summary})
+
+
+class ArrowStreamEncoder:
+    """One Arrow record batch per chunk, in a single IPC stream"""
+
+    media_type = ARROW_MEDIA_TYPE
+
+    def __init__(self):
+        self._schema = arrow_schema()
+        self._sink = _PendingBytes()
+        self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def chunk(self, packed: PackedPairs, scores: Dict[str, np.ndarray], offset: int) -> bytes:
+        self._writer.write_batch(arrow_record_batch(packed, scores, offset, self._schema))
+        return self._sink.take()
+
+    def summary(self, summary: Dict[str, Any]) -> bytes:
+        empty = pa.RecordBatch.from_pylist([], schema=self._schema)
+        self._writer.write_batch(empty, custom_metadata={"summary": dumps(summary).decode()})
+        self._writer.close()
+        return self._sink.take()
+
+
+_STREAM_ENCODERS = {
+    "json": NDJSONEncoder,
+    "columnar": ColumnarNDJSONEncoder,
+    "msgpack": MsgpackEncoder,
+    "arrow": ArrowStreamEncoder,
+}
+
+
+def stream_encoder(name: str):
+    """New bulk stream encoder for a response format name"""
+    return _STREAM_ENCODERS[name]()
+
+
+# ORM rows ---------------------------------------------------------------------
+
+_row_fields: Dict[type, List[str]] = {}
+
+
+def serialize_row(obj: Any) -> Optional[Dict[str, Any]]:
+    """
+    Column values of an ORM row as a plain dict (relationships are left out).
+
+    Same keys as FastAPI's jsonable_encoder output for a loaded row, without
+    walking the instance state.
+    """
+    if obj is None:
+        return None
+    cls = type(obj)
+    fields = _row_fields.get(cls)
+    if fields is None:
+        fields = _row_fields[cls] = [column.key for column in cls.__table__.columns]
+    row = {}
+    for field in fields:
+        value = getattr(obj, field)
+        row[field] = value.value if isinstance(value, enum.Enum) else value
+    return row
+
+
+def serialize_rows(rows) -> List[Dict[str, Any]]:
+    """serialize_row for each row of a query result"""
+    return [serialize_row(row) for row in rows]
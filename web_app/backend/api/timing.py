@@ -0,0 +1,297 @@
+"""
+Request Timing
+Per-stage request latency from perf_counter_ns spans, exported as Prometheus
+text (GET /metrics) and Server-Timing response headers
+
+TimingMiddleware starts a RequestTiming for every HTTP request; code inside
+the request marks its stages with `with span("scoring"):` or `@timed(...)`.
+Spans outside a request (job workers, scripts) cost a context variable
+lookup and record nothing.
+
+Stages:
+  api_key        API key lookup and partner checks
+  rate_limit     rate-limit and pair-quota queries
+  validation     parsing and validating the request body and pairs
+  scoring        compatibility scoring and matching
+  db_write       usage tracking and other writes
+  serialization  building and rendering the response
+
+Routers created with route_class=TimedRoute also count the time from the
+request's start to the endpoint being called (FastAPI body parsing, pydantic
+validation and dependencies, less any spans inside them) as validation, and
+the time from the endpoint's return to the response start (response_model
+validation and JSON rendering) as serialization.
+
+Metrics live in the process that served the request; with several workers,
+each is scraped (or aggregated) separately. Neither is public by default:
+/metrics needs METRICS_TOKEN as a bearer token, and Server-Timing headers
+go only to requests with a valid X-Profile token unless SERVER_TIMING is on.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import functools
+import inspect
+import os
+import threading
+import time
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+from api.profiling import PROFILE_HEADER, verify_profile_token
+
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bearer token for GET /metrics; while unset the endpoint answers 403
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+STAGES = ("api_key", "rate_limit", "validation", "scoring", "db_write", "serialization")
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestTiming:
+    """Stage durations (nanoseconds) of one request"""
+
+    __slots__ = ("start_ns", "stages", "_endpoint_exit_ns")
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.stages: Dict[str, int] = {}
+        self._endpoint_exit_ns: Optional[int] = None
+
+    def add(self, stage: str, duration_ns: int) -> None:
+        self.stages[stage] = self.stages.get(stage, 0) + duration_ns
+
+    def elapsed_ns(self) -> int:
+        return time.perf_counter_ns() - self.start_ns
+
+    def endpoint_entered(self) -> None:
+        """Count the time before the endpoint not spent in spans as validation"""
+        self.add("validation", max(0, self.elapsed_ns() - sum(self.stages.values())))
+
+    def endpoint_exited(self) -> None:
+        self._endpoint_exit_ns = time.perf_counter_ns()
+
+    def response_started(self) -> None:
+        """Count the time since the endpoint returned as serialization"""
+        if self._endpoint_exit_ns is not None:
+            self.add("serialization", time.perf_counter_ns() - self._endpoint_exit_ns)
+            self._endpoint_exit_ns = None
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f"{stage};dur={ns / 1e6:.3f}" for stage, ns in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed_ns() / 1e6:.3f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """Timing of the request being served, if any"""
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Add the time spent in the block to `stage` of the current request"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        timing.add(stage, time.perf_counter_ns() - start)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator form of span() for plain and async functions"""
+    def decorate(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Metrics ----------------------------------------------------------------------
+
+class _Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.9f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class TimingMetrics:
+    """Request and stage latency histograms, keyed by route template"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, int], _Histogram] = {}
+        self._stages: Dict[Tuple[str, str], _Histogram] = {}
+
+    def observe(self, method: str, route: str, status_code: int, timing: RequestTiming) -> None:
+        """Record a finished request"""
+        total = timing.elapsed_ns() / 1e9
+        with self._lock:
+            self._requests.setdefault((method, route, status_code), _Histogram()).observe(total)
+            for stage, ns in timing.stages.items():
+                self._stages.setdefault((route, stage), _Histogram()).observe(ns / 1e9)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP http_request_duration_seconds Time from request start to the end of the response.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, route, status_code), histogram in sorted(self._requests.items()):
+                labels = f'method="{method}",route="{_label(route)}",status="{status_code}"'
+                lines += histogram.lines("http_request_duration_seconds", labels)
+            lines += [
+                "# HELP http_request_stage_duration_seconds Time spent per request in each stage.",
+                "# TYPE http_request_stage_duration_seconds histogram",
+            ]
+            for (route, stage), histogram in sorted(self._stages.items()):
+                labels = f'route="{_label(route)}",stage="{stage}"'
+                lines += histogram.lines("http_request_stage_duration_seconds", labels)
+        return "\n".join(lines) + "\n"
+
+
+metrics = TimingMetrics()
+
+
+# ASGI -------------------------------------------------------------------------
+
+class TimingMiddleware:
+    """
+    Times every HTTP request, adds a Server-Timing header with the stages
+    finished before the response starts, and records the request into
+    `metrics` once the response is complete (streamed bodies included).
+
+    Without `server_timing` the header is only added for requests carrying
+    a valid X-Profile token, so partners don't see internal stage timings.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING, registry: TimingMetrics = metrics):
+        self.app = app
+        self.server_timing = server_timing
+        self.registry = registry
+
+    def _wants_server_timing(self, scope) -> bool:
+        if self.server_timing:
+            return True
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                return verify_profile_token(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        status_code = 500
+        server_timing = self._wants_server_timing(scope)
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing.response_started()
+                if server_timing:
+                    message["headers"] = list(message.get("headers", []))
+                    MutableHeaders(scope=message).append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # Route templates keep the label set bounded; unmatched paths share one
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.registry.observe(scope["method"], route, status_code, timing)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an endpoint to mark when it is called and when it returns"""
+    if getattr(endpoint, "_timed_endpoint", False):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return await endpoint(*args, **kwargs)
+            timing.endpoint_entered()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timing.endpoint_exited()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return endpoint(*args, **kwargs)
+            timing.endpoint_entered()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                timing.endpoint_exited()
+
+    wrapper._timed_endpoint = True
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that times request validation and response serialization around the endpoint"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
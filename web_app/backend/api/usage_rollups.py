@@ -0,0 +1,276 @@
+"""
+Usage Rollups
+Per-minute and per-hour usage buckets with latency histograms, and
+retention-based compaction of raw api_usage rows
+
+With USAGE_ROLLUPS enabled, each tracked request is counted into its minute
+and its hour row of api_usage_rollup with one upsert, in the same
+transaction as the api_usage row. A rollup row holds, per partner, endpoint
+and status code, the request count (error counts come from the status
+codes), the response time sum and count, and a mergeable latency histogram
+(api/latency_histogram.py) for percentiles over any range.
+
+compact_usage keeps storage bounded and should run periodically (e.g. from
+cron with scripts/compact_usage.py):
+  - minute rows older than USAGE_MINUTE_RETENTION_HOURS are deleted; their
+    hour rows hold the same counts
+  - raw api_usage rows older than USAGE_RAW_RETENTION_DAYS are deleted
+    (only while rollups are enabled, and never less than a day back, which
+    rate limiting reads)
+Stats for ranges older than the raw retention therefore only count the
+whole hours in them.
+
+Run rebuild_usage_rollups once when enabling rollups on a database that
+already has usage.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Integer, Text, delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import array, insert as pg_insert
+from sqlalchemy.orm import Session
+from database.models import APIUsage, APIUsageRollup
+from api.latency_histogram import LatencyHistogram, bucket_index
+import os
+import uuid
+
+
+USAGE_ROLLUPS = os.getenv("USAGE_ROLLUPS", "false").lower() in ("1", "true", "yes")
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+}
+
+USAGE_MINUTE_RETENTION = timedelta(hours=int(os.getenv("USAGE_MINUTE_RETENTION_HOURS", "48")))
+# Raw rows back the minute edges of ranges and the daily rate limits, so
+# they are kept at least as long as either needs them
+USAGE_RAW_RETENTION = max(
+    timedelta(days=int(os.getenv("USAGE_RAW_RETENTION_DAYS", "30"))),
+    USAGE_MINUTE_RETENTION,
+    timedelta(days=1),
+)
+
+COMPACT_BATCH_SIZE = 10000
+REBUILD_BATCH_SIZE = 10000
+
+# (granularity, or None for raw api_usage rows; start; end; end inclusive)
+RangePiece = Tuple[Optional[str], Optional[datetime], Optional[datetime], bool]
+
+_KEY_COLUMNS = ["partner_id", "granularity", "bucket_start", "endpoint", "status_code"]
+
+
+def bucket_floor(ts: datetime, granularity: str) -> datetime:
+    """Start of the minute/hour containing `ts`"""
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(second=0, microsecond=0)
+
+
+def bucket_ceil(ts: datetime, granularity: str) -> datetime:
+    """First minute/hour boundary at or after `ts`"""
+    floor = bucket_floor(ts, granularity)
+    return floor if floor == ts else floor + GRANULARITIES[granularity]
+
+
+def minute_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Minute rows start before this may have been compacted away"""
+    return bucket_floor((now or datetime.utcnow()) - USAGE_MINUTE_RETENTION, "minute")
+
+
+def raw_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Raw api_usage rows before this may have been compacted away"""
+    return (now or datetime.utcnow()) - USAGE_RAW_RETENTION
+
+
+# Maintenance on write -----------------------------------------------------------
+
+def add_to_rollups(usage: APIUsage, db: Session) -> None:
+    """Count one usage row into its minute and hour rollup rows (one upsert, same transaction)"""
+    timed = (usage.response_time or 0) > 0
+    histogram = LatencyHistogram()
+    if timed:
+        histogram.add(usage.response_time)
+
+    stmt = pg_insert(APIUsageRollup).values([
+        {
+            "partner_id": usage.partner_id,
+            "granularity": granularity,
+            "bucket_start": bucket_floor(usage.timestamp, granularity),
+            "endpoint": usage.endpoint,
+            "status_code": usage.status_code,
+            "request_count": 1,
+            "response_time_total": usage.response_time if timed else 0,
+            "response_time_count": 1 if timed else 0,
+            "latency_histogram": histogram.to_dict(),
+        }
+        for granularity in GRANULARITIES
+    ])
+    set_ = {
+        "request_count": APIUsageRollup.request_count + stmt.excluded.request_count,
+        "response_time_total": APIUsageRollup.response_time_total + stmt.excluded.response_time_total,
+        "response_time_count": APIUsageRollup.response_time_count + stmt.excluded.response_time_count,
+    }
+    if timed:
+        # Increment the request's histogram bucket in place
+        key = str(bucket_index(usage.response_time))
+        current = APIUsageRollup.latency_histogram
+        set_["latency_histogram"] = func.jsonb_set(
+            current,
+            array([literal(key, Text)]),
+            func.to_jsonb(func.coalesce(current[key].astext.cast(Integer), 0) + 1),
+        )
+    db.execute(stmt.on_conflict_do_update(index_elements=_KEY_COLUMNS, set_=set_))
+
+
+# Range planning -----------------------------------------------------------------
+
+def plan_range(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    now: Optional[datetime] = None,
+) -> List[RangePiece]:
+    """
+    Split [start, end] into pieces read from hour rows, minute rows and raw
+    api_usage rows: whole hours from hour rows, whole minutes at either
+    edge from minute rows, and the partial minutes from raw rows. Edges
+    older than the minute retention skip the minute rows and read raw rows
+    directly.
+    """
+    return _split_range(start, end, True, ("hour", "minute"), minute_cutoff(now))
+
+
+def _split_range(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    end_inclusive: bool,
+    granularities: Tuple[str, ...],
+    minute_start: datetime,
+) -> List[RangePiece]:
+    if granularities[:1] == ("minute",) and (start is None or start < minute_start):
+        granularities = granularities[1:]
+    if not granularities:
+        return [(None, start, end, end_inclusive)]
+
+    granularity, finer = granularities[0], granularities[1:]
+    first = bucket_ceil(start, granularity) if start else None
+    last = bucket_floor(end, granularity) if end else None
+    if first and last and first >= last:
+        # No whole bucket in the range
+        return _split_range(start, end, end_inclusive, finer, minute_start)
+
+    pieces = [(granularity, first, last, False)]
+    if start and start < first:
+        pieces += _split_range(start, first, False, finer, minute_start)
+    if end and (end > last or end_inclusive):
+        pieces += _split_range(last, end, end_inclusive, finer, minute_start)
+    return pieces
+
+
+# Backfill and compaction --------------------------------------------------------
+
+def rebuild_usage_rollups(
+    db: Session,
+    partner_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Recompute api_usage_rollup from api_usage (for one partner, and from
+    the hour containing `since`, if given). Minute rows are only rebuilt
+    inside the minute retention. Returns the rollup rows written.
+
+    Only rebuild ranges whose raw rows are still there: once compact_usage
+    has run, that is the last USAGE_RAW_RETENTION_DAYS.
+    """
+    hour_start = bucket_floor(since, "hour") if since else None
+    minute_start = minute_cutoff(now)
+    if since:
+        minute_start = max(minute_start, bucket_floor(since, "minute"))
+
+    source = db.query(
+        APIUsage.partner_id,
+        APIUsage.timestamp,
+        APIUsage.endpoint,
+        APIUsage.status_code,
+        APIUsage.response_time,
+    )
+    stale_hours = APIUsageRollup.granularity == "hour"
+    if hour_start:
+        stale_hours &= APIUsageRollup.bucket_start >= hour_start
+    stale_minutes = (APIUsageRollup.granularity == "minute") & (APIUsageRollup.bucket_start >= minute_start)
+    stale = db.query(APIUsageRollup).filter(stale_hours | stale_minutes)
+    if partner_id:
+        source = source.filter(APIUsage.partner_id == uuid.UUID(partner_id))
+        stale = stale.filter(APIUsageRollup.partner_id == uuid.UUID(partner_id))
+    if hour_start:
+        source = source.filter(APIUsage.timestamp >= hour_start)
+
+    # (count, response time total, timed count, histogram) per rollup key
+    buckets: Dict[tuple, list] = defaultdict(lambda: [0, 0, 0, LatencyHistogram()])
+    for partner, timestamp, endpoint, status_code, response_time in source.yield_per(REBUILD_BATCH_SIZE):
+        timed = (response_time or 0) > 0
+        for granularity in GRANULARITIES:
+            if granularity == "minute" and timestamp < minute_start:
+                continue
+            bucket = buckets[(partner, granularity, bucket_floor(timestamp, granularity), endpoint, status_code)]
+            bucket[0] += 1
+            if timed:
+                bucket[1] += response_time
+                bucket[2] += 1
+                bucket[3].add(response_time)
+
+    rows = [
+        dict(
+            zip(_KEY_COLUMNS, key),
+            request_count=count,
+            response_time_total=total,
+            response_time_count=timed_count,
+            latency_histogram=histogram.to_dict(),
+        )
+        for key, (count, total, timed_count, histogram) in buckets.items()
+    ]
+    try:
+        stale.delete(synchronize_session=False)
+        for offset in range(0, len(rows), REBUILD_BATCH_SIZE):
+            db.execute(insert(APIUsageRollup), rows[offset:offset + REBUILD_BATCH_SIZE])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
+def compact_usage(
+    db: Session,
+    now: Optional[datetime] = None,
+    batch_size: int = COMPACT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Delete minute rollup rows and raw api_usage rows past their retention.
+    Raw rows are deleted in batches of `batch_size` (one transaction each)
+    and only while rollups are enabled, since otherwise nothing else holds
+    their counts. Returns the number of rows deleted of each kind.
+    """
+    now = now or datetime.utcnow()
+    try:
+        minute_rows = db.query(APIUsageRollup).filter(
+            APIUsageRollup.granularity == "minute",
+            APIUsageRollup.bucket_start < minute_cutoff(now),
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        raw_rows = 0
+        if USAGE_ROLLUPS:
+            expired = select(APIUsage.id).where(APIUsage.timestamp < raw_cutoff(now)).limit(batch_size)
+            while True:
+                deleted = db.execute(delete(APIUsage).where(APIUsage.id.in_(expired.scalar_subquery()))).rowcount
+                db.commit()
+                raw_rows += deleted
+                if deleted < batch_size:
+                    break
+    except Exception:
+        db.rollback()
+        raise
+    return {"minute_rows": minute_rows, "raw_rows": raw_rows}
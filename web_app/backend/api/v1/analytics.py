@@ -26,7 +26,10 @@ class UsageStatsResponse(BaseModel):
     failed_requests: int
     average_response_time: float
     endpoints: Dict[str, int]
+    endpoint_errors: Dict[str, int] = {}
     status_codes: Dict[int, int]
+    latency_ms: Dict[str, float] = {}  # p50/p95/p99 response time
+    endpoint_latency_ms: Dict[str, Dict[str, float]] = {}
     start_date: Optional[str] = None
     end_date: Optional[str] = None
 
@@ -77,7 +80,10 @@ async def get_partner_usage_stats(
         failed_requests=stats["failed_requests"],
         average_response_time=stats["average_response_time"],
         endpoints=stats["endpoints"],
+        endpoint_errors=stats["endpoint_errors"],
         status_codes=stats["status_codes"],
+        latency_ms=stats["latency_ms"],
+        endpoint_latency_ms=stats["endpoint_latency_ms"],
         start_date=start_date,
         end_date=end_date,
     )
@@ -128,6 +134,7 @@ async def get_usage_summary(
                 (stats_24h["successful_requests"] / stats_24h["total_requests"] * 100)
                 if stats_24h["total_requests"] > 0 else 0
             ),
+            "latency_ms": stats_24h["latency_ms"],
         },
         "last_7_days": {
             "total_requests": stats_7d["total_requests"],
@@ -135,6 +142,7 @@ async def get_usage_summary(
                 (stats_7d["successful_requests"] / stats_7d["total_requests"] * 100)
                 if stats_7d["total_requests"] > 0 else 0
             ),
+            "latency_ms": stats_7d["latency_ms"],
         },
         "last_30_days": {
             "total_requests": stats_30d["total_requests"],
@@ -142,6 +150,7 @@ async def get_usage_summary(
                 (stats_30d["successful_requests"] / stats_30d["total_requests"] * 100)
                 if stats_30d["total_requests"] > 0 else 0
             ),
+            "latency_ms": stats_30d["latency_ms"],
         },
     }
 
@@ -3,18 +3,41 @@ B2B Compatibility Calculation API (v1)
 Research-backed API design with authentication and rate limiting
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, AsyncIterator
 from datetime import datetime
+import math
 import uuid
 from sqlalchemy.orm import Session
 
-from database.connection import get_db
+from database.connection import get_db, SessionLocal
 from database.models import APIUsage, Partner
-from api.auth import verify_api_key_dependency, check_rate_limit
+from api.auth import verify_api_key_dependency, check_rate_limit, get_remaining_pair_quota
 from api.analytics import track_api_usage
-import uuid
+from api.timing import TimedRoute, span
+from api.serialization import (
+    RESPONSE_FORMATS,
+    FastJSONResponse,
+    arrow_batch,
+    columnar_batch,
+    loads,
+    packb,
+    response_format,
+    stream_encoder,
+)
+from api.model_registry import registry as model_registry
+from api.scoring import (
+    CompiledModel,
+    PairInput,
+    pack_pairs,
+    score_packed,
+    unpack_results,
+    numerology_scores,
+    astrology_scores,
+)
 
 # Import compatibility calculation logic
 # Note: In production, these should be imported from a shared package
@@ -24,16 +47,16 @@ import sys
 import os
 from pathlib import Path
 
-# Add project root to path
-project_root = Path(__file__).parent.parent.parent.parent.parent
-sys.path.insert(0, str(project_root))
+# Add project root to path (unless another module already did)
+project_root = str(Path(__file__).parent.parent.parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
 try:
-    from base_model import PersonVector32, ResonanceVector7, CompatibilityModel
+    from base_model import PersonVector32, ResonanceVector7
 except ImportError:
-    # Fallback: use simplified compatibility functions
+    # Fallback: minimal input vectors; weights always come from config/models
     from typing import List
-    import math
     
     class PersonVector32:
         def __init__(self, traits: List[float]):
@@ -57,30 +80,40 @@ except ImportError:
                 return 1.0
             variance = sum((x - self.mean) ** 2 for x in self.metrics) / len(self.metrics)
             return max(0.0, min(1.0, 1.0 - variance))
-    
-    class CompatibilityModel:
-        def trait_distance(self, p1, p2):
-            return math.sqrt(sum((a - b) ** 2 for a, b in zip(p1.traits, p2.traits)))
-        
-        def trait_compatibility(self, p1, p2):
-            return math.exp(-self.trait_distance(p1, p2))
-        
-        def resonance_compatibility(self, r):
-            return 0.5 * r.mean + 0.5 * r.stability
-        
-        def total_compatibility(self, p1, p2, r, feasibility=1.0):
-            c_traits = self.trait_compatibility(p1, p2)
-            c_res = self.resonance_compatibility(r)
-            c_total = 0.6 * c_traits + 0.4 * c_res
-            s_hat = feasibility * c_total
-            return {
-                "C_traits": c_traits,
-                "C_res": c_res,
-                "C_total": c_total,
-                "S_hat": s_hat,
-            }
 
-router = APIRouter(prefix="/api/v1/compatibility", tags=["compatibility"])
+try:
+    from calibration import get_calibration
+except ImportError:
+    # Calibration module not deployed alongside the backend
+    get_calibration = None
+
+
+def get_compiled_model(version: Optional[str] = None) -> CompiledModel:
+    """
+    Compiled weights for a model version (the active one by default), shared
+    by every request, batch and job in the process; see api.model_registry.
+    Raises ValueError for versions not in the model store.
+    """
+    return model_registry.get(version)
+
+
+# Response header naming the weights version that scored the request
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+
+def _requested_model(version: Optional[str]) -> CompiledModel:
+    try:
+        return get_compiled_model(version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def record_scores(values) -> None:
+    """Feed computed S_hat scores into the shared percentile calibration"""
+    if get_calibration is not None:
+        get_calibration().record_many(values)
+
+router = APIRouter(prefix="/api/v1/compatibility", tags=["compatibility"], route_class=TimedRoute)
 
 
 # Request/Response Models
@@ -108,15 +141,26 @@ class CompatibilityResponse(BaseModel):
     request_id: str = Field(..., description="Unique request ID")
 
 
+# Hard cap on pairs per batch request; per-tier limits are in RATE_LIMITS
+MAX_BATCH_PAIRS = 10000
+
+
 class BatchCompatibilityRequest(BaseModel):
     """Request model for batch compatibility calculation"""
-    pairs: List[CompatibilityRequest] = Field(..., max_items=100, description="List of pairs (max 100)")
+    pairs: List[CompatibilityRequest] = Field(..., max_length=MAX_BATCH_PAIRS, description="List of pairs (max 10,000, tier dependent)")
+
+
+class BatchItemError(BaseModel):
+    """Error for a single pair in a batch"""
+    index: int = Field(..., description="Position of the pair in the request")
+    detail: str = Field(..., description="Why the pair was rejected")
 
 
 class BatchCompatibilityResponse(BaseModel):
     """Response model for batch compatibility calculation"""
-    results: List[CompatibilityResponse] = Field(..., description="Compatibility results")
-    count: int = Field(..., description="Number of pairs processed")
+    results: List[Optional[CompatibilityResponse]] = Field(..., description="Compatibility results, aligned with request pairs (null where the pair failed)")
+    errors: List[BatchItemError] = Field(default_factory=list, description="Per-pair errors")
+    count: int = Field(..., description="Number of pairs processed successfully")
     timestamp: str = Field(..., description="ISO timestamp")
 
 
@@ -167,92 +211,28 @@ def calculate_dimension_alignment(p1: PersonVector32, p2: PersonVector32) -> Dic
 
 def compute_numerology_score(birthdate1: str, birthdate2: str) -> float:
     """Calculate numerology compatibility"""
-    def life_path(bd: str) -> int:
-        digits = bd.replace("-", "").replace("/", "")
-        total = sum(int(d) for d in digits if d.isdigit())
-        while total > 9:
-            total = sum(int(d) for d in str(total))
-        return total
-    
-    try:
-        lp1 = life_path(birthdate1)
-        lp2 = life_path(birthdate2)
-        
-        if lp1 == lp2:
-            return 1.0
-        elif abs(lp1 - lp2) <= 2:
-            return 0.7
-        else:
-            return 0.3
-    except:
-        return 0.5
+    return float(numerology_scores([(birthdate1, birthdate2)])[0])
 
 
 def compute_astrology_score(birthdate1: str, birthdate2: str) -> float:
     """Calculate astrology compatibility"""
-    def zodiac(bd: str) -> str:
-        try:
-            parts = bd.split("-") if "-" in bd else bd.split("/")
-            month, day = int(parts[1]), int(parts[2])
-            
-            signs = [
-                ("Aquarius", (1, 20), (2, 18)),
-                ("Pisces", (2, 19), (3, 20)),
-                ("Aries", (3, 21), (4, 19)),
-                ("Taurus", (4, 20), (5, 20)),
-                ("Gemini", (5, 21), (6, 20)),
-                ("Cancer", (6, 21), (7, 22)),
-                ("Leo", (7, 23), (8, 22)),
-                ("Virgo", (8, 23), (9, 22)),
-                ("Libra", (9, 23), (10, 22)),
-                ("Scorpio", (10, 23), (11, 21)),
-                ("Sagittarius", (11, 22), (12, 21)),
-                ("Capricorn", (12, 22), (1, 19)),
-            ]
-            
-            for name, (m1, d1), (m2, d2) in signs:
-                if (month == m1 and day >= d1) or (month == m2 and day <= d2) or (m1 > m2 and month in [m1, m2]):
-                    return name
-            return "Capricorn"
-        except:
-            return "Capricorn"
-    
-    def element(sign: str) -> str:
-        if sign in ["Aries", "Leo", "Sagittarius"]:
-            return "Fire"
-        elif sign in ["Taurus", "Virgo", "Capricorn"]:
-            return "Earth"
-        elif sign in ["Gemini", "Libra", "Aquarius"]:
-            return "Air"
-        else:
-            return "Water"
-    
-    try:
-        sign1 = zodiac(birthdate1)
-        sign2 = zodiac(birthdate2)
-        elem1 = element(sign1)
-        elem2 = element(sign2)
-        
-        if elem1 == elem2:
-            return 1.0
-        elif (elem1, elem2) in [("Fire", "Air"), ("Air", "Fire"), ("Earth", "Water"), ("Water", "Earth")]:
-            return 0.7
-        else:
-            return 0.4
-    except:
-        return 0.5
+    return float(astrology_scores([(birthdate1, birthdate2)])[0])
 
 
-def calculate_compatibility_internal(request: CompatibilityRequest) -> Dict:
-    """Internal compatibility calculation"""
+def calculate_compatibility_internal(request: CompatibilityRequest, model: Optional[CompiledModel] = None) -> Dict:
+    """Internal compatibility calculation (with the active model unless given)"""
     # Extract traits
     traits1 = request.person1.get("traits", [])
     traits2 = request.person2.get("traits", [])
     
+    if not isinstance(traits1, (list, tuple)) or not isinstance(traits2, (list, tuple)):
+        raise HTTPException(status_code=400, detail="Traits and resonance must be numeric")
     if len(traits1) != 32:
         raise HTTPException(status_code=400, detail="Person1 must have 32 traits")
     if len(traits2) != 32:
         raise HTTPException(status_code=400, detail="Person2 must have 32 traits")
+    if not all(isinstance(v, (int, float)) and math.isfinite(v) for v in [*traits1, *traits2, *(request.resonance or [])]):
+        raise HTTPException(status_code=400, detail="Traits and resonance must be numeric")
     
     # Create person vectors
     p1 = PersonVector32(traits=traits1)
@@ -265,8 +245,7 @@ def calculate_compatibility_internal(request: CompatibilityRequest) -> Dict:
         r = ResonanceVector7(metrics=[0.5] * 7)
     
     # Calculate compatibility
-    model = CompatibilityModel()
-    result = model.total_compatibility(p1, p2, r, feasibility=1.0)
+    result = (model or get_compiled_model()).total_compatibility(p1, p2, r, feasibility=1.0)
     
     # Calculate dimension breakdown
     dimension_breakdown = calculate_dimension_alignment(p1, p2)
@@ -295,6 +274,7 @@ def calculate_compatibility_internal(request: CompatibilityRequest) -> Dict:
 @router.post("/calculate", response_model=CompatibilityResponse)
 async def calculate_compatibility(
     request: CompatibilityRequest,
+    model_version: Optional[str] = Query(None, description="Model weights version to score with (default: the active one)"),
     partner: Dict = Depends(verify_api_key_dependency),
     db: Session = Depends(get_db)
 ):
@@ -302,10 +282,13 @@ async def calculate_compatibility(
     Calculate compatibility between two people.
     
     Requires API key authentication.
-    Rate limited per partner tier.
+    Rate limited per partner tier. `model_version` scores with another
+    resident weights version, e.g. for A/B comparisons; the version used is
+    returned in the X-Model-Version header.
     """
     start_time = datetime.utcnow()
     request_id = str(uuid.uuid4())
+    model = _requested_model(model_version)
     
     try:
         # Check rate limits
@@ -314,7 +297,9 @@ async def calculate_compatibility(
             raise HTTPException(status_code=429, detail=error_msg)
         
         # Calculate compatibility
-        result = calculate_compatibility_internal(request)
+        with span("scoring"):
+            result = calculate_compatibility_internal(request, model)
+            record_scores([result["compatibility_score"]])
         
         # Track usage
         response_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
@@ -327,17 +312,11 @@ async def calculate_compatibility(
             db=db
         )
         
-        return CompatibilityResponse(
-            compatibility_score=result["compatibility_score"],
-            trait_compatibility=result["trait_compatibility"],
-            resonance_compatibility=result["resonance_compatibility"],
-            total_compatibility=result["total_compatibility"],
-            dimension_breakdown=result["dimension_breakdown"],
-            numerology_score=result["numerology_score"],
-            astrology_score=result["astrology_score"],
-            timestamp=datetime.utcnow().isoformat(),
-            request_id=request_id,
-        )
+        # Rendered directly; CompatibilityResponse documents the shape
+        with span("serialization"):
+            result["timestamp"] = datetime.utcnow().isoformat()
+            result["request_id"] = request_id
+            return FastJSONResponse(result, headers={MODEL_VERSION_HEADER: model.version})
     
     except HTTPException:
         raise
@@ -358,17 +337,34 @@ async def calculate_compatibility(
 @router.post("/batch", response_model=BatchCompatibilityResponse)
 async def batch_calculate(
     request: BatchCompatibilityRequest,
+    http_request: Request,
+    format: Optional[str] = Query(None, description="Response format: json (default), columnar, msgpack or arrow"),
+    model_version: Optional[str] = Query(None, description="Model weights version to score with (default: the active one)"),
     partner: Dict = Depends(verify_api_key_dependency),
     db: Session = Depends(get_db)
 ):
     """
     Calculate compatibility for multiple pairs.
     
-    Limited to 100 pairs per request.
-    Higher rate limits for enterprise partners.
+    Pairs are validated and scored together as arrays; invalid pairs are
+    reported in `errors` at their index instead of being dropped.
+    Batch size is limited per tier (up to 10,000 pairs for enterprise partners).
+    
+    With `?format=columnar` (or `Accept: application/vnd.soulmate.columnar+json`)
+    results come back as one array per score instead of one object per pair.
+    `msgpack` (application/msgpack) returns the columnar layout as MessagePack
+    and `arrow` (application/vnd.apache.arrow.stream) an Arrow IPC stream with
+    float32 columns; see api/serialization.py. `model_version` works as
+    on /calculate.
     """
     start_time = datetime.utcnow()
     
+    try:
+        output_format = response_format(http_request, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    model = _requested_model(model_version)
+    
     # Check batch limits
     from api.auth import get_rate_limits_for_tier
     limits = get_rate_limits_for_tier(partner["tier"])
@@ -384,25 +380,38 @@ async def batch_calculate(
     if not is_allowed:
         raise HTTPException(status_code=429, detail=error_msg)
     
-    # Calculate compatibility for all pairs
-    results = []
-    for pair_request in request.pairs:
-        try:
-            result = calculate_compatibility_internal(pair_request)
-            results.append(CompatibilityResponse(
-                compatibility_score=result["compatibility_score"],
-                trait_compatibility=result["trait_compatibility"],
-                resonance_compatibility=result["resonance_compatibility"],
-                total_compatibility=result["total_compatibility"],
-                dimension_breakdown=result["dimension_breakdown"],
-                numerology_score=result["numerology_score"],
-                astrology_score=result["astrology_score"],
-                timestamp=datetime.utcnow().isoformat(),
-                request_id=str(uuid.uuid4()),
-            ))
-        except Exception as e:
-            # Skip invalid pairs, continue with others
-            continue
+    # Validate and pack all pairs into arrays, then score them in one pass
+    with span("validation"):
+        packed = pack_pairs(request.pairs)
+    with span("scoring"):
+        scores = score_packed(model, packed)
+        record_scores(scores["S_hat"])
+    timestamp = datetime.utcnow().isoformat()
+    batch_id = str(uuid.uuid4())
+    
+    with span("serialization"):
+        if output_format == "arrow":
+            response = Response(arrow_batch(packed, scores, timestamp, batch_id), media_type=RESPONSE_FORMATS["arrow"])
+        elif output_format == "msgpack":
+            content = columnar_batch(packed, scores, timestamp, batch_id)
+            response = Response(packb(content), media_type=RESPONSE_FORMATS["msgpack"])
+        elif output_format == "columnar":
+            content = columnar_batch(packed, scores, timestamp, batch_id)
+            response = FastJSONResponse(content, media_type=RESPONSE_FORMATS["columnar"])
+        else:
+            results = unpack_results(packed, scores)
+            for i, result in enumerate(results):
+                if result is not None:
+                    result["timestamp"] = timestamp
+                    result["request_id"] = f"{batch_id}-{i}"
+            content = {
+                "results": results,
+                "errors": [{"index": i, "detail": detail} for i, detail in sorted(packed.errors.items())],
+                "count": len(packed),
+                "timestamp": timestamp,
+            }
+            response = FastJSONResponse(content)
+        response.headers[MODEL_VERSION_HEADER] = model.version
     
     # Track usage
     response_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
@@ -413,12 +422,159 @@ async def batch_calculate(
         status_code=200,
         response_time=response_time,
         db=db,
-        metadata={"batch_size": len(request.pairs), "results_count": len(results)}
+        metadata={"pairs": len(request.pairs), "batch_size": len(request.pairs), "results_count": len(packed), "error_count": len(packed.errors), "model_version": model.version}
     )
     
-    return BatchCompatibilityResponse(
-        results=results,
-        count=len(results),
-        timestamp=datetime.utcnow().isoformat(),
-    )
+    return response
+
+
+
+# Pairs scored per array chunk on the bulk endpoint
+BULK_CHUNK_SIZE = 2048
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves `receive` to the request body reader.
+    
+    The default implementation may listen for disconnects on `receive`, which
+    would swallow request body chunks that are still being consumed.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _iter_ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield complete lines from a (possibly chunked) NDJSON request body"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def _score_chunk(model, chunk: List, offset: int, encoder) -> Tuple[bytes, int]:
+    """Score one chunk of parsed lines and render it with the stream encoder"""
+    with span("validation"):
+        pairs = [PairInput(item) if isinstance(item, dict) else PairInput({}) for item in chunk]
+        packed = pack_pairs(pairs)
+        for i, item in enumerate(chunk):
+            if not isinstance(item, dict):
+                packed.errors[i] = item if isinstance(item, str) else "Each line must be a JSON object"
+    with span("scoring"):
+        scores = score_packed(model, packed)
+        record_scores(scores["S_hat"])
+    
+    with span("serialization"):
+        body = encoder.chunk(packed, scores, offset)
+    return body, len(packed)
 
+
+@router.post("/bulk")
+async def bulk_calculate(
+    request: Request,
+    format: Optional[str] = Query(None, description="Response format: json (default), columnar, msgpack or arrow"),
+    model_version: Optional[str] = Query(None, description="Model weights version to score with (default: the active one)"),
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Score a stream of pairs sent as NDJSON (one CompatibilityRequest per line).
+    
+    Pairs are scored in fixed-size array chunks and results are streamed back
+    as NDJSON in request order, so memory stays constant regardless of job size.
+    Quota is counted per pair; once the partner's daily allowance runs out the
+    stream ends with a `quota_exceeded` line. One aggregated usage row is
+    recorded per job.
+    
+    `format` (or Accept) selects columnar NDJSON chunks, MessagePack maps or
+    Arrow record batches instead of one line per pair, as on /batch, and
+    `model_version` works as on /calculate; the whole stream is scored with
+    one version even if the active one changes meanwhile.
+    """
+    start_time = datetime.utcnow()
+    
+    try:
+        output_format = response_format(request, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    encoder = stream_encoder(output_format)
+    model = _requested_model(model_version)
+    
+    is_allowed, error_msg = check_rate_limit(partner["id"], "/api/v1/compatibility/bulk", db)
+    if not is_allowed:
+        raise HTTPException(status_code=429, detail=error_msg)
+    
+    remaining = get_remaining_pair_quota(partner["id"], partner["tier"], db)
+    if remaining <= 0:
+        raise HTTPException(status_code=429, detail="Daily pair quota exhausted")
+    
+    async def generate() -> AsyncIterator[bytes]:
+        total = 0
+        scored = 0
+        quota_exceeded = False
+        chunk: List = []
+        
+        try:
+            async for line in _iter_ndjson_lines(request):
+                if total + len(chunk) >= remaining:
+                    quota_exceeded = True
+                    break
+                try:
+                    chunk.append(loads(line))
+                except ValueError:
+                    chunk.append("Invalid JSON")
+                
+                if len(chunk) >= BULK_CHUNK_SIZE:
+                    body, ok = await run_in_threadpool(_score_chunk, model, chunk, total, encoder)
+                    total += len(chunk)
+                    scored += ok
+                    chunk = []
+                    yield body
+            
+            if chunk:
+                body, ok = await run_in_threadpool(_score_chunk, model, chunk, total, encoder)
+                total += len(chunk)
+                scored += ok
+                yield body
+            
+            summary = {"pairs": total, "scored": scored, "errors": total - scored}
+            if quota_exceeded:
+                summary["error"] = "quota_exceeded"
+            yield encoder.summary(summary)
+        finally:
+            # The request-scoped session may already be closed while streaming
+            response_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+            usage_db = SessionLocal()
+            try:
+                await track_api_usage(
+                    partner_id=partner["id"],
+                    endpoint="/api/v1/compatibility/bulk",
+                    method="POST",
+                    status_code=200,
+                    response_time=response_time,
+                    db=usage_db,
+                    metadata={
+                        "pairs": total,
+                        "results_count": scored,
+                        "error_count": total - scored,
+                        "quota_exceeded": quota_exceeded,
+                        "model_version": model.version,
+                    },
+                )
+            finally:
+                usage_db.close()
+    
+    return _DuplexStreamingResponse(
+        generate(),
+        media_type=encoder.media_type,
+        headers={MODEL_VERSION_HEADER: model.version},
+    )
@@ -0,0 +1,270 @@
+"""
+Event Matching API (v1)
+Event rosters and attendee matching for event sponsorship partners
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Annotated, Optional, List, Dict
+from datetime import datetime
+import uuid
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from database.models import Event, EventAttendee, EventMatch
+from api.auth import verify_api_key_dependency, check_rate_limit
+from api.analytics import track_api_usage
+from api.event_matching import match_event, scaled_columns
+from api.scoring import scale_traits
+from api.timing import TimedRoute, span
+from api.v1.compatibility import get_compiled_model
+
+router = APIRouter(prefix="/api/v1/events", tags=["events"], route_class=TimedRoute)
+
+# Attendees accepted per roster upload
+MAX_ATTENDEES_PER_REQUEST = 5000
+
+
+class EventCreateRequest(BaseModel):
+    """Request to create an event"""
+    name: str = Field(..., min_length=1, max_length=255)
+    description: Optional[str] = None
+    event_date: Optional[datetime] = None
+    location: Optional[str] = Field(None, max_length=255)
+
+
+class EventResponse(BaseModel):
+    """Event information response"""
+    id: str
+    name: str
+    description: Optional[str]
+    event_date: Optional[str]
+    location: Optional[str]
+    attendee_count: int
+    matched: bool
+    created_at: str
+
+
+class AttendeeInput(BaseModel):
+    """One attendee and their 32 trait values"""
+    attendee_id: str = Field(..., min_length=1, max_length=255)
+    traits: List[Annotated[float, Field(allow_inf_nan=False)]] = Field(..., min_length=32, max_length=32)
+    group: Optional[str] = Field(None, max_length=50, description="Side for two-sided matching (assignment/stable modes)")
+
+
+class AttendeesRequest(BaseModel):
+    """Roster upload; existing attendee_ids are updated"""
+    attendees: List[AttendeeInput] = Field(..., min_length=1, max_length=MAX_ATTENDEES_PER_REQUEST)
+
+
+class MatchRequest(BaseModel):
+    """Matching options"""
+    mode: str = Field(default="top_k", pattern="^(top_k|greedy|assignment|stable)$", description="top_k, greedy, assignment or stable")
+    k: int = Field(default=5, ge=1, le=50, description="Matches per attendee in top_k mode")
+    min_score: Optional[float] = Field(None, ge=0, le=1, description="Skip pairs scoring below this")
+    candidates: int = Field(default=50, ge=1, le=500, description="Best partners considered per attendee when an event is too large for the full score matrix")
+    proposing_group: Optional[str] = Field(None, max_length=50, description="Group that proposes in stable mode (default: first group by name)")
+
+
+class MatchSummaryResponse(BaseModel):
+    """Result of a matching run"""
+    event_id: str
+    mode: str
+    attendee_count: int
+    match_count: int
+    duration_ms: int
+
+
+class EventMatchResponse(BaseModel):
+    """One stored event match"""
+    attendee1_id: str
+    attendee2_id: str
+    compatibility_score: float
+    dimension_breakdown: Optional[Dict[str, float]]
+
+
+def _event_response(event: Event) -> EventResponse:
+    return EventResponse(
+        id=str(event.id),
+        name=event.name,
+        description=event.description,
+        event_date=event.event_date.isoformat() if event.event_date else None,
+        location=event.location,
+        attendee_count=event.attendee_count or 0,
+        matched=bool(event.matched),
+        created_at=event.created_at.isoformat() if event.created_at else datetime.utcnow().isoformat(),
+    )
+
+
+def _get_owned_event(event_id: str, partner: Dict, db: Session) -> Event:
+    try:
+        event_uuid = uuid.UUID(event_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    event = db.query(Event).filter(Event.id == event_uuid).first()
+    if not event or str(event.partner_id) != str(partner["id"]):
+        raise HTTPException(status_code=404, detail="Event not found")
+    return event
+
+
+@router.post("", response_model=EventResponse)
+async def create_event(
+    request: EventCreateRequest,
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """Create an event for attendee matching"""
+    event = Event(
+        id=uuid.uuid4(),
+        partner_id=partner["id"],
+        name=request.name,
+        description=request.description,
+        event_date=request.event_date,
+        location=request.location,
+    )
+    db.add(event)
+    db.commit()
+    db.refresh(event)
+
+    return _event_response(event)
+
+
+@router.get("/{event_id}", response_model=EventResponse)
+async def get_event(
+    event_id: str,
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """Get event details"""
+    return _event_response(_get_owned_event(event_id, partner, db))
+
+
+@router.post("/{event_id}/attendees", response_model=EventResponse)
+async def upload_attendees(
+    event_id: str,
+    request: AttendeesRequest,
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Add or update attendees in one bulk upsert.
+
+    Changing the roster marks the event as unmatched until it is matched again.
+    An attendee_id given more than once keeps its last entry. Traits are
+    stored along with their sqrt(alpha)-scaled float32 form, so matching
+    works on plain dot products.
+    """
+    event = _get_owned_event(event_id, partner, db)
+
+    with span("validation"):
+        # One upsert can't touch a row twice
+        attendees = list({a.attendee_id: a for a in request.attendees}.values())
+        scaled = scaled_columns(scale_traits(get_compiled_model(), [a.traits for a in attendees]))
+
+    with span("db_write"):
+        stmt = insert(EventAttendee)
+        stmt = stmt.on_conflict_do_update(
+            constraint="unique_attendee",
+            set_={
+                column: getattr(stmt.excluded, column)
+                for column in ("traits", "attendee_group", "scaled_traits", "sq_norm", "weights_version")
+            },
+        )
+        db.execute(stmt, [
+            dict(
+                columns,
+                id=uuid.uuid4(),
+                event_id=event.id,
+                attendee_id=a.attendee_id,
+                traits=a.traits,
+                attendee_group=a.group,
+            )
+            for a, columns in zip(attendees, scaled)
+        ])
+
+        event.attendee_count = db.query(EventAttendee).filter(EventAttendee.event_id == event.id).count()
+        event.matched = False
+        db.commit()
+        db.refresh(event)
+
+    return _event_response(event)
+
+
+@router.post("/{event_id}/match", response_model=MatchSummaryResponse)
+async def run_event_matching(
+    event_id: str,
+    request: MatchRequest,
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Match the event's attendees, replacing any previous matches.
+
+    - `top_k` stores each attendee's k best partners
+    - `greedy` pairs attendees off so everyone gets at most one match,
+      taking the best remaining pair first (approximate, not the best total)
+    - `assignment` pairs the two attendee groups for the best total score
+    - `stable` pairs the two groups so no two people would both rather be
+      with each other than with their match (Gale-Shapley)
+    """
+    start_time = datetime.utcnow()
+
+    is_allowed, error_msg = check_rate_limit(partner["id"], "/api/v1/events/match", db)
+    if not is_allowed:
+        raise HTTPException(status_code=429, detail=error_msg)
+
+    event = _get_owned_event(event_id, partner, db)
+    try:
+        summary = await run_in_threadpool(
+            match_event, db, event, get_compiled_model(),
+            mode=request.mode, k=request.k, min_score=request.min_score,
+            candidates=request.candidates, proposing_group=request.proposing_group,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+    await track_api_usage(
+        partner_id=partner["id"],
+        endpoint="/api/v1/events/match",
+        method="POST",
+        status_code=200,
+        response_time=response_time,
+        db=db,
+        metadata={"event_id": event_id, "mode": request.mode, "attendee_count": summary["attendee_count"], "match_count": summary["match_count"]}
+    )
+
+    return MatchSummaryResponse(**summary)
+
+
+@router.get("/{event_id}/matches", response_model=List[EventMatchResponse])
+async def list_event_matches(
+    event_id: str,
+    attendee_id: Optional[str] = Query(None, description="Only matches involving this attendee"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """List stored matches, best first"""
+    event = _get_owned_event(event_id, partner, db)
+
+    query = db.query(EventMatch).filter(EventMatch.event_id == event.id)
+    if attendee_id:
+        query = query.filter(
+            (EventMatch.attendee1_id == attendee_id) | (EventMatch.attendee2_id == attendee_id)
+        )
+    matches = query.order_by(EventMatch.compatibility_score.desc()).offset(offset).limit(limit).all()
+
+    return [
+        EventMatchResponse(
+            attendee1_id=m.attendee1_id,
+            attendee2_id=m.attendee2_id,
+            compatibility_score=m.compatibility_score,
+            dimension_breakdown=m.dimension_breakdown,
+        )
+        for m in matches
+    ]
@@ -0,0 +1,188 @@
+"""
+Bulk Scoring Jobs API (v1)
+Asynchronous compatibility scoring for datasets too large for one request
+"""
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Optional, Dict
+from datetime import datetime
+import os
+import shutil
+import uuid
+from sqlalchemy.orm import Session
+
+from database.connection import get_db
+from api.auth import verify_api_key_dependency, check_rate_limit, get_rate_limits_for_tier, get_remaining_pair_quota
+from api.analytics import track_api_usage
+from api import job_queue
+from api.timing import TimedRoute, span
+
+router = APIRouter(prefix="/api/v1/compatibility/jobs", tags=["compatibility"], route_class=TimedRoute)
+
+# Upload is copied to disk in blocks of this size
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+
+class JobResponse(BaseModel):
+    """Bulk scoring job status"""
+    job_id: str
+    status: str = Field(..., description="queued, running, completed, failed or cancelled")
+    processed: int = Field(..., description="Pairs read so far")
+    scored: int = Field(..., description="Pairs scored successfully so far")
+    errors: int = Field(..., description="Pairs rejected so far")
+    attempts: int = Field(..., description="Times a worker picked up the job")
+    error: Optional[str] = None
+    result_url: Optional[str] = None
+    created_at: str
+    updated_at: str
+
+
+def _job_response(job: Dict) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        processed=job["processed"],
+        scored=job["scored"],
+        errors=job["processed"] - job["scored"],
+        attempts=job["attempts"],
+        error=job["error"],
+        result_url=f"{router.prefix}/{job['id']}/results" if job["status"] == "completed" else None,
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+def _get_owned_job(job_id: str, partner: Dict) -> Dict:
+    job = job_queue.get_job(job_id)
+    if not job or job["partner_id"] != partner["id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("", response_model=JobResponse, status_code=202)
+async def submit_job(
+    file: Optional[UploadFile] = File(None, description="NDJSON file, one CompatibilityRequest per line"),
+    dataset_uri: Optional[str] = Form(None, description="http(s) URI of an NDJSON dataset"),
+    partner: Dict = Depends(verify_api_key_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    Submit a bulk scoring job.
+
+    Provide either an uploaded NDJSON file or a dataset URI. The job runs in
+    the background; poll `GET /jobs/{job_id}` for progress and download the
+    columnar results (.npz) once it completes. Running jobs per partner are
+    limited by tier, as are queued and running jobs together; uploads are
+    limited to JOB_MAX_DOWNLOAD_BYTES like downloads. Pairs count against the daily pair quota as on /bulk;
+    a job that runs out of quota completes with the pairs read until then.
+    """
+    start_time = datetime.utcnow()
+
+    if (file is None) == (dataset_uri is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of file or dataset_uri")
+    if dataset_uri is not None:
+        try:
+            await run_in_threadpool(job_queue.check_source_uri, dataset_uri)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    is_allowed, error_msg = check_rate_limit(partner["id"], "/api/v1/compatibility/jobs", db)
+    if not is_allowed:
+        raise HTTPException(status_code=429, detail=error_msg)
+
+    if get_remaining_pair_quota(partner["id"], partner["tier"], db) <= 0:
+        raise HTTPException(status_code=429, detail="Daily pair quota exhausted")
+
+    max_queued = get_rate_limits_for_tier(partner["tier"])["max_queued_jobs"]
+    if job_queue.count_active_jobs(partner["id"]) >= max_queued:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Maximum {max_queued} queued or running jobs for {partner['tier']} tier"
+        )
+
+    job_id = str(uuid.uuid4())
+    source = dataset_uri
+    with span("db_write"):
+        if file is not None:
+            directory = job_queue.job_dir(job_id)
+            os.makedirs(directory, exist_ok=True)
+            source = os.path.join(directory, "input.ndjson")
+            size = 0
+            with open(source, "wb") as out:
+                while True:
+                    block = await file.read(UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > job_queue.JOB_MAX_DOWNLOAD_BYTES:
+                        break
+                    out.write(block)
+            if size > job_queue.JOB_MAX_DOWNLOAD_BYTES:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Dataset is larger than {job_queue.JOB_MAX_DOWNLOAD_BYTES} bytes"
+                )
+
+        job = job_queue.create_job(partner["id"], partner["tier"], source, job_id=job_id)
+        job_queue.get_runner().notify()
+
+    response_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+    await track_api_usage(
+        partner_id=partner["id"],
+        endpoint="/api/v1/compatibility/jobs",
+        method="POST",
+        status_code=202,
+        response_time=response_time,
+        db=db,
+        # Pairs are charged by the worker as they are read
+        metadata={"job_id": job_id, "pairs": 0},
+    )
+
+    return _job_response(job)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job_status(
+    job_id: str,
+    partner: Dict = Depends(verify_api_key_dependency),
+):
+    """Get status and progress of a bulk scoring job"""
+    return _job_response(_get_owned_job(job_id, partner))
+
+
+@router.get("/{job_id}/results")
+async def download_job_results(
+    job_id: str,
+    partner: Dict = Depends(verify_api_key_dependency),
+):
+    """
+    Download results as a NumPy .npz archive of columns.
+
+    Score columns are float32 and aligned with `index` (line number in the
+    dataset); rejected lines are listed in `error_index` / `error_detail`.
+    """
+    job = _get_owned_job(job_id, partner)
+    if job["status"] != "completed" or not job["result_path"]:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    return FileResponse(
+        job["result_path"],
+        media_type="application/octet-stream",
+        filename=f"{job_id}.npz",
+    )
+
+
+@router.delete("/{job_id}", response_model=JobResponse)
+async def cancel_job(
+    job_id: str,
+    partner: Dict = Depends(verify_api_key_dependency),
+):
+    """Cancel a queued or running job"""
+    _get_owned_job(job_id, partner)
+    if not job_queue.cancel_job(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return _job_response(job_queue.get_job(job_id))
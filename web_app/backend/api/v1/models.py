@@ -0,0 +1,77 @@
+"""
+Model Admin API (v1)
+Lists the compatibility weight versions and switches the active one without a restart
+
+Operator endpoints, authenticated with the X-Admin-Token header against
+MODEL_ADMIN_TOKEN; while that is unset they answer 403.
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import hmac
+import os
+
+from api.model_registry import MODEL_RELOAD_INTERVAL, registry
+from api.timing import TimedRoute
+
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+
+router = APIRouter(prefix="/api/v1/models", tags=["models"], route_class=TimedRoute)
+
+
+class ModelsResponse(BaseModel):
+    """Weight versions known to this process"""
+    active: str = Field(..., description="Version scored with by default")
+    resident: List[str] = Field(..., description="Versions compiled in memory, least recently used first")
+    available: List[str] = Field(..., description="Versions in the model store")
+    reload_interval: float = Field(..., description="Seconds between checks of the active version by each worker (0: off)")
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    """FastAPI dependency checking the model admin token"""
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model administration is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def _models_response() -> ModelsResponse:
+    return ModelsResponse(
+        active=registry.active().version,
+        resident=registry.resident_versions(),
+        available=registry.available(),
+        reload_interval=MODEL_RELOAD_INTERVAL,
+    )
+
+
+@router.get("", response_model=ModelsResponse, dependencies=[Depends(verify_admin_token)])
+async def list_models():
+    """Active, resident and available model versions"""
+    return _models_response()
+
+
+@router.post("/{version}/activate", response_model=ModelsResponse, dependencies=[Depends(verify_admin_token)])
+async def activate_model(version: str):
+    """
+    Load, warm and activate a model version.
+
+    This process switches as soon as the version is warm; other workers
+    follow within MODEL_RELOAD_INTERVAL seconds.
+    """
+    try:
+        await run_in_threadpool(registry.activate, version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _models_response()
+
+
+@router.post("/{version}/load", response_model=ModelsResponse, dependencies=[Depends(verify_admin_token)])
+async def load_model(version: str):
+    """Load and warm a model version in this process without activating it (e.g. for A/B scoring)"""
+    try:
+        await run_in_threadpool(registry.get, version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _models_response()
@@ -9,7 +9,6 @@ from typing import Optional
 import uuid
 import os
 from datetime import datetime, timedelta
-from jose import jwt
 
 from database.connection import get_db
 from database.soulmates_models import User
@@ -53,6 +52,8 @@ async def request_magic_link(
         db.commit()
         db.refresh(user)
     
+    from jose import jwt
+    
     # Create JWT token (expires in 15 minutes)
     token_data = {
         "sub": str(user.id),
@@ -85,6 +86,8 @@ async def verify_token(
     """
     Verify a magic link token and return user info.
     """
+    from jose import jwt
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
@@ -15,6 +15,7 @@ from database.soulmates_models import (
     BondStatus, BondType, BondInviteStatus
 )
 from core_domain import logSoulmatesEvent, SoulmatesEvent
+from api.serialization import FastJSONResponse, serialize_row, serialize_rows
 from .auth import get_current_user_id
 
 router = APIRouter()
@@ -60,7 +61,7 @@ async def create_bond_invite(
         payload={"invite_id": str(invite.id)},
     ))
     
-    return {"success": True, "invite": invite}
+    return FastJSONResponse({"success": True, "invite": serialize_row(invite)})
 
 
 @router.post("/bonds/accept")
@@ -112,7 +113,7 @@ async def accept_bond_invite(
         bondId=str(bond.id),
     ))
     
-    return {"success": True, "bond": bond}
+    return FastJSONResponse({"success": True, "bond": serialize_row(bond)})
 
 
 @router.post("/bonds/end")
@@ -171,7 +172,7 @@ async def list_bonds(
     
     bonds = query.order_by(RelationshipBond.created_at.desc()).all()
     
-    return {"bonds": bonds}
+    return FastJSONResponse({"bonds": serialize_rows(bonds)})
 
 
 @router.get("/bonds/{bond_id}")
@@ -197,7 +198,7 @@ async def get_bond(
         bondId=str(bond.id),
     ))
     
-    return bond
+    return FastJSONResponse(serialize_row(bond))
 
 
 @router.get("/bonds/{bond_id}/compatibility")
@@ -232,5 +233,5 @@ async def get_bond_compatibility(
     if not snapshot:
         raise HTTPException(status_code=404, detail="No compatibility snapshot found for this bond")
     
-    return {"snapshot": snapshot}
+    return FastJSONResponse({"snapshot": serialize_row(snapshot)})
 
@@ -10,7 +10,7 @@ import uuid
 
 from database.connection import get_db
 from database.soulmates_models import CompatibilitySnapshot, User
-from soulmates_engine import computeCompatibilitySnapshot, CompatibilityOptions
+import soulmates_engine
 from core_domain import logSoulmatesEvent, SoulmatesEvent
 from .auth import get_current_user_id
 
@@ -36,7 +36,7 @@ async def explore_compatibility(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Compute compatibility
-    options = CompatibilityOptions(
+    options = soulmates_engine.CompatibilityOptions(
         allow_astrology=allow_astrology,
         allow_numerology=allow_numerology,
     )
@@ -47,7 +47,7 @@ async def explore_compatibility(
     else:
         target["hypotheticalProfile"] = hypothetical_profile
     
-    snapshot_result = await computeCompatibilitySnapshot(
+    snapshot_result = await soulmates_engine.computeCompatibilitySnapshot(
         user_id,
         target,
         options,
@@ -11,6 +11,7 @@ import uuid
 from database.connection import get_db
 from database.soulmates_models import SoulProfile, User
 from core_domain import logSoulmatesEvent, SoulmatesEvent
+from api.serialization import FastJSONResponse, serialize_row
 from .auth import get_current_user_id
 
 router = APIRouter()
@@ -25,7 +26,7 @@ async def get_profile(
     profile = db.query(SoulProfile).filter(SoulProfile.user_id == uuid.UUID(user_id)).first()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return profile
+    return FastJSONResponse(serialize_row(profile))
 
 
 @router.post("/profile")
@@ -86,5 +87,5 @@ async def create_or_update_profile(
         userId=user_id,
     ))
     
-    return {"success": True, "profile": profile}
+    return FastJSONResponse({"success": True, "profile": serialize_row(profile)})
 
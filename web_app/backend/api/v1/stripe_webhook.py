@@ -6,7 +6,6 @@ Handles Stripe billing events for partner subscriptions
 from fastapi import APIRouter, Request, HTTPException, Header, Depends
 from pydantic import BaseModel
 from typing import Optional
-import stripe
 import os
 from sqlalchemy.orm import Session
 
@@ -15,8 +14,8 @@ from database.models import Partner, PartnerSubscription
 
 router = APIRouter(prefix="/api/v1/webhooks", tags=["webhooks"])
 
-# Stripe configuration
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# Stripe configuration (the SDK is imported on first use; it is slow to import)
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
 
@@ -39,6 +38,9 @@ async def stripe_webhook(
     if not webhook_secret:
         raise HTTPException(status_code=500, detail="Webhook secret not configured")
     
+    import stripe
+    stripe.api_key = STRIPE_SECRET_KEY
+    
     payload = await request.body()
     
     try:
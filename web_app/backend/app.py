@@ -1,16 +1,28 @@
 """
 Main FastAPI Application for B2B Monetization API
 Integrates all API routes and middleware
+
+`app` is built by create_app() at import time for `uvicorn app:app`; tests
+and benchmarks can call create_app() for a fresh instance. Startup time is
+tracked with scripts/startup_benchmark.py.
 """
 
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Iterable, List, Optional
+import hmac
+import importlib
 import os
+import time
+import traceback
 from contextlib import asynccontextmanager
 
 from database.connection import init_db
-from api.v1 import compatibility, partners
+from api import job_queue
+from api.model_registry import registry as model_registry
+from api.profiling import ProfilingMiddleware
+from api.timing import METRICS_ENABLED, METRICS_TOKEN, PROMETHEUS_CONTENT_TYPE, TimingMiddleware, metrics
 
 # Environment variables
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
@@ -29,88 +41,69 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Warning: Database initialization failed: {e}")
         print("Continuing without database (for testing)")
-        import traceback
         traceback.print_exc()
     
+    # Resume bulk scoring jobs left over from a previous run
+    try:
+        job_queue.resume_jobs()
+    except Exception as e:
+        print(f"Warning: Could not resume bulk scoring jobs: {e}")
+    
+    # Load and warm the active compatibility model before the first request,
+    # then follow versions activated in other workers
+    try:
+        print(f"Compatibility model {model_registry.active().version} active")
+    except Exception as e:
+        print(f"Warning: Could not load compatibility model: {e}")
+    model_registry.start_watching()
+    
     yield
     
     # Shutdown
     print("Shutting down...")
+    model_registry.stop_watching()
+    job_queue.shutdown_runner()
+
+
+# Routers in registration order: (name, module with a `router`). Each is
+# imported and included once; ENABLED_ROUTERS (comma-separated names)
+# limits which are loaded, e.g. to keep the soulmates routes off a B2B-only
+# deployment's startup path.
+ROUTERS = [
+    ("compatibility", "api.v1.compatibility"),
+    ("jobs", "api.v1.jobs"),
+    ("events", "api.v1.events"),
+    ("partners", "api.v1.partners"),
+    ("soulmates", "api.v1.soulmates"),
+    ("analytics", "api.v1.analytics"),
+    ("auth", "api.v1.auth"),
+    ("stripe_webhook", "api.v1.stripe_webhook"),
+    ("models", "api.v1.models"),
+]
+ENABLED_ROUTERS = [name.strip() for name in os.getenv("ENABLED_ROUTERS", "").split(",") if name.strip()]
+
+
+def include_routers(app: FastAPI, names: Optional[Iterable[str]] = None) -> List[str]:
+    """Import and include the named routers (all by default); returns those loaded"""
+    wanted = set(names) if names else None
+    unknown = (wanted or set()) - {name for name, _ in ROUTERS}
+    if unknown:
+        print(f"Warning: Unknown routers in ENABLED_ROUTERS: {', '.join(sorted(unknown))}")
+    
+    loaded = []
+    for name, module_name in ROUTERS:
+        if wanted is not None and name not in wanted:
+            continue
+        try:
+            module = importlib.import_module(module_name)
+            app.include_router(module.router)
+            loaded.append(name)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not load {name} router: {e}")
+            traceback.print_exc()
+    return loaded
 
 
-# Create FastAPI app
-app = FastAPI(
-    title="Soulmate Compatibility B2B API",
-    description="B2B API for compatibility calculation, partner management, and monetization",
-    version="1.0.0",
-    lifespan=lifespan,
-)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=ALLOWED_ORIGINS if "*" not in ALLOWED_ORIGINS else ["*"],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
-    allow_headers=["*"],
-)
-
-
-# Include API routers
-try:
-    app.include_router(compatibility.router)
-    app.include_router(partners.router)
-    print("✅ Compatibility and Partners routers loaded")
-except Exception as e:
-    print(f"❌ Error loading compatibility/partners routers: {e}")
-    import traceback
-    traceback.print_exc()
-
-# Include Soulmates router
-try:
-    from api.v1.soulmates import router as soulmates_router
-    app.include_router(soulmates_router)
-    print("✅ Soulmates router loaded")
-except Exception as e:
-    print(f"⚠️ Warning: Could not import soulmates router: {e}")
-    import traceback
-    traceback.print_exc()
-
-# Include analytics router
-try:
-    from api.v1 import analytics, auth as auth_router
-    app.include_router(analytics.router)
-    app.include_router(auth_router.router)
-    print("✅ Analytics and Auth routers loaded")
-except ImportError as e:
-    print(f"⚠️ Warning: Could not import analytics/auth routers: {e}")
-
-# Include Stripe webhook router
-try:
-    from api.v1 import stripe_webhook
-    app.include_router(stripe_webhook.router)
-    print("✅ Stripe webhook router loaded")
-except ImportError as e:
-    print(f"⚠️ Warning: Could not import stripe_webhook router: {e}")
-
-# Import and include analytics and auth routers
-try:
-    from api.v1 import analytics, auth as auth_router
-    app.include_router(analytics.router)
-    app.include_router(auth_router.router)
-except ImportError as e:
-    print(f"Warning: Analytics or auth modules not available: {e}")
-
-# Import Stripe webhook handler (optional)
-try:
-    from api.v1 import stripe_webhook
-    app.include_router(stripe_webhook.router)
-except ImportError as e:
-    print(f"Warning: Stripe webhook module not available: {e}")
-
-
-# Health check endpoint
-@app.get("/")
 async def root():
     """Root endpoint"""
     return {
@@ -121,7 +114,6 @@ async def root():
     }
 
 
-@app.get("/health")
 async def health():
     """Health check endpoint"""
     return {
@@ -130,8 +122,21 @@ async def health():
     }
 
 
+def verify_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    """FastAPI dependency checking the `Authorization: Bearer <METRICS_TOKEN>` header"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Metrics are disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+
+async def prometheus_metrics():
+    """Request and stage latency histograms (Prometheus text format)"""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 # Error handlers
-@app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
     return JSONResponse(
         status_code=404,
@@ -139,7 +144,6 @@ async def not_found_handler(request: Request, exc):
     )
 
 
-@app.exception_handler(500)
 async def internal_error_handler(request: Request, exc):
     return JSONResponse(
         status_code=500,
@@ -147,6 +151,59 @@ async def internal_error_handler(request: Request, exc):
     )
 
 
+def create_app(routers: Optional[Iterable[str]] = None) -> FastAPI:
+    """
+    Build the FastAPI application.
+    
+    `routers` limits the routers loaded (names from ROUTERS); defaults to
+    ENABLED_ROUTERS, or all of them.
+    """
+    start = time.perf_counter()
+    
+    app = FastAPI(
+        title="Soulmate Compatibility B2B API",
+        description="B2B API for compatibility calculation, partner management, and monetization",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS if "*" not in ALLOWED_ORIGINS else ["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing", "X-Profile-Id"],
+    )
+    
+    # Opt-in stack profiles of single requests (signed X-Profile header or
+    # PROFILE_SAMPLE_RATE)
+    app.add_middleware(ProfilingMiddleware)
+    
+    # Per-stage request timings (Server-Timing headers and /metrics); outermost,
+    # so the total covers the other middleware too
+    app.add_middleware(TimingMiddleware)
+    
+    loaded = include_routers(app, routers if routers is not None else ENABLED_ROUTERS)
+    
+    # Health check endpoints
+    app.get("/")(root)
+    app.get("/health")(health)
+    if METRICS_ENABLED:
+        app.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_metrics_token)])(prometheus_metrics)
+    
+    app.add_exception_handler(404, not_found_handler)
+    app.add_exception_handler(500, internal_error_handler)
+    
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"✅ Routers loaded ({elapsed_ms:.0f} ms): {', '.join(loaded) or 'none'}")
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -3,7 +3,7 @@ Database models for B2B monetization
 Using SQLAlchemy for ORM
 """
 
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Text, JSON, ARRAY, CheckConstraint, UniqueConstraint
+from sqlalchemy import Column, String, Integer, BigInteger, Float, REAL, Boolean, DateTime, ForeignKey, Text, JSON, ARRAY, CheckConstraint, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -77,6 +77,27 @@ class APIUsage(Base):
     
     __table_args__ = (
         CheckConstraint("method IN ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')", name="valid_method"),
+        # Usage stats and rate limits filter by partner over a time range
+        Index("idx_api_usage_partner", "partner_id", "timestamp"),
+    )
+
+
+class APIUsageRollup(Base):
+    """Per-minute and per-hour usage rollup per partner, endpoint and status code (optional; see api/usage_rollups.py)"""
+    __tablename__ = "api_usage_rollup"
+    
+    partner_id = Column(UUID(as_uuid=True), ForeignKey("partners.id", ondelete="CASCADE"), primary_key=True)
+    granularity = Column(String(6), primary_key=True)  # 'minute' or 'hour'
+    bucket_start = Column(DateTime, primary_key=True)  # start of the minute/hour (UTC)
+    endpoint = Column(String(255), primary_key=True)
+    status_code = Column(Integer, primary_key=True)
+    request_count = Column(Integer, nullable=False, default=0)
+    response_time_total = Column(BigInteger, nullable=False, default=0)  # milliseconds, over timed requests
+    response_time_count = Column(Integer, nullable=False, default=0)  # requests with a response time
+    latency_histogram = Column(JSONB, nullable=False, default=dict)  # {log bucket: count}, see api/latency_histogram.py
+    
+    __table_args__ = (
+        CheckConstraint("granularity IN ('minute', 'hour')", name="valid_granularity"),
     )
 
 
@@ -98,6 +119,29 @@ class Event(Base):
     # Relationships
     partner = relationship("Partner", back_populates="events")
     matches = relationship("EventMatch", back_populates="event", cascade="all, delete-orphan")
+    attendees = relationship("EventAttendee", back_populates="event", cascade="all, delete-orphan")
+
+
+class EventAttendee(Base):
+    """Event attendee with the trait vector used for matching"""
+    __tablename__ = "event_attendees"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    event_id = Column(UUID(as_uuid=True), ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+    attendee_id = Column(String(255), nullable=False)  # Partner-supplied identifier
+    traits = Column(ARRAY(Float), nullable=False)  # 32 trait values
+    attendee_group = Column(String(50), nullable=True)  # Side for two-sided matching
+    scaled_traits = Column(ARRAY(REAL), nullable=True)  # traits * sqrt(alpha), float32
+    sq_norm = Column(Float, nullable=True)  # Squared norm of scaled_traits
+    weights_version = Column(String(50), nullable=True)  # Model version scaled_traits was computed with
+    created_at = Column(DateTime, server_default=func.now())
+    
+    # Relationships
+    event = relationship("Event", back_populates="attendees")
+    
+    __table_args__ = (
+        UniqueConstraint("event_id", "attendee_id", name="unique_attendee"),
+    )
 
 
 class EventMatch(Base):
@@ -52,6 +52,21 @@ CREATE INDEX IF NOT EXISTS idx_api_usage_partner ON api_usage(partner_id, timest
 CREATE INDEX IF NOT EXISTS idx_api_usage_endpoint ON api_usage(endpoint, timestamp);
 CREATE INDEX IF NOT EXISTS idx_api_usage_timestamp ON api_usage(timestamp);
 
+-- Per-minute and per-hour usage rollup (maintained when USAGE_ROLLUPS is enabled)
+CREATE TABLE IF NOT EXISTS api_usage_rollup (
+    partner_id UUID NOT NULL REFERENCES partners(id) ON DELETE CASCADE,
+    granularity VARCHAR(6) NOT NULL, -- 'minute' or 'hour'
+    bucket_start TIMESTAMP NOT NULL, -- start of the minute/hour (UTC)
+    endpoint VARCHAR(255) NOT NULL,
+    status_code INTEGER NOT NULL,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    response_time_total BIGINT NOT NULL DEFAULT 0, -- milliseconds, over timed requests
+    response_time_count INTEGER NOT NULL DEFAULT 0, -- requests with a response time
+    latency_histogram JSONB NOT NULL DEFAULT '{}', -- {log bucket: count} of timed requests
+    PRIMARY KEY (partner_id, granularity, bucket_start, endpoint, status_code),
+    CONSTRAINT valid_granularity CHECK (granularity IN ('minute', 'hour'))
+);
+
 -- Events table (for event sponsorship)
 CREATE TABLE IF NOT EXISTS events (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -66,6 +81,28 @@ CREATE TABLE IF NOT EXISTS events (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Event Attendees table (trait vectors used for event matching)
+CREATE TABLE IF NOT EXISTS event_attendees (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    event_id UUID NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    attendee_id VARCHAR(255) NOT NULL,
+    traits FLOAT[] NOT NULL,
+    attendee_group VARCHAR(50),
+    scaled_traits REAL[],
+    sq_norm FLOAT,
+    weights_version VARCHAR(50),
+    created_at TIMESTAMP DEFAULT NOW(),
+    CONSTRAINT unique_attendee UNIQUE (event_id, attendee_id)
+);
+
+-- Pre-scaled traits for databases created before they were stored; fill
+-- them with scripts/rescale_attendees.py (or let matching rescale lazily)
+ALTER TABLE event_attendees ADD COLUMN IF NOT EXISTS scaled_traits REAL[];
+ALTER TABLE event_attendees ADD COLUMN IF NOT EXISTS sq_norm FLOAT;
+ALTER TABLE event_attendees ADD COLUMN IF NOT EXISTS weights_version VARCHAR(50);
+
+CREATE INDEX IF NOT EXISTS idx_event_attendees_event ON event_attendees(event_id);
+
 -- Event Matches table
 CREATE TABLE IF NOT EXISTS event_matches (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
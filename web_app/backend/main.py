@@ -8,6 +8,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import math
+import sys
+from pathlib import Path
+
+# Score calibration lives in the project root; without it, fall back to the
+# uncalibrated placeholders
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+try:
+    from calibration import get_calibration
+except ImportError:
+    get_calibration = None
 
 app = FastAPI(
     title="Soulmate Compatibility API",
@@ -48,10 +58,10 @@ def resonance_compatibility(r: List[float]) -> float:
     return 0.5 * mean + 0.5 * stability
 
 def total_compatibility(p1: List[float], p2: List[float], r: List[float]) -> dict:
-    """Calculate total compatibility"""
+    """Calculate total compatibility (γ₁ = γ₂ = 0.5, model 1.0.0 in config/models)"""
     c_traits = trait_compatibility(p1, p2)
     c_res = resonance_compatibility(r)
-    c_total = 0.6 * c_traits + 0.4 * c_res
+    c_total = 0.5 * c_traits + 0.5 * c_res
     s_hat = c_total  # Simplified
     
     return {
@@ -61,6 +71,15 @@ def total_compatibility(p1: List[float], p2: List[float], r: List[float]) -> dic
         "s_hat": s_hat,
     }
 
+def percentile_and_tier(s_hat: float) -> tuple:
+    """Percentile (0-100) and top-10% soulmate tier for an S_hat score"""
+    if get_calibration is None:
+        return min(100.0, max(0.0, s_hat * 100)), s_hat >= 0.7
+    calibration = get_calibration()
+    result = calibration.percentile(s_hat), calibration.is_soulmate_tier(s_hat)
+    calibration.record(s_hat)
+    return result
+
 def numerology_score(birthdate1: str, birthdate2: str) -> float:
     """Calculate numerology compatibility"""
     def life_path(bd: str) -> int:
@@ -140,6 +159,7 @@ async def calculate_compatibility(pair: PairInput):
         r = pair.resonance if pair.resonance else [0.5] * 7
         
         result = total_compatibility(pair.person1.traits, pair.person2.traits, r)
+        percentile, soulmate_tier = percentile_and_tier(result["s_hat"])
         
         numerology = None
         astrology = None
@@ -159,8 +179,8 @@ async def calculate_compatibility(pair: PairInput):
                 "numerology_score": numerology,
                 "astrology_score": astrology,
             },
-            "soulmate_tier": result["s_hat"] >= 0.7,
-            "percentile": min(100.0, max(0.0, result["s_hat"] * 100)),
+            "soulmate_tier": soulmate_tier,
+            "percentile": percentile,
             "recommendations": ["Strong compatibility across key dimensions!"],
         }
     except Exception as e:
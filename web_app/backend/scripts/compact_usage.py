@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Compact API usage storage
+Deletes per-minute rollup rows and raw api_usage rows past their retention
+(see api/usage_rollups.py); meant to run periodically, e.g. hourly from cron
+
+Usage:
+    python scripts/compact_usage.py
+    python scripts/compact_usage.py --rebuild            # backfill rollups first
+    python scripts/compact_usage.py --rebuild --since 2024-01-01 --partner-id <uuid>
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.connection import SessionLocal
+from api.usage_rollups import USAGE_ROLLUPS, compact_usage, rebuild_usage_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rebuild", action="store_true", help="recompute rollups from raw usage before compacting")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="only rebuild from this time (ISO format)")
+    parser.add_argument("--partner-id", default=None, help="only rebuild this partner's rollups")
+    args = parser.parse_args()
+
+    if not USAGE_ROLLUPS:
+        print("USAGE_ROLLUPS is not enabled: raw usage rows are kept")
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            rows = rebuild_usage_rollups(db, partner_id=args.partner_id, since=args.since)
+            print(f"Rebuilt {rows} rollup rows")
+        deleted = compact_usage(db)
+        print(f"Deleted {deleted['minute_rows']} minute rollup rows and {deleted['raw_rows']} raw usage rows")
+        return 0
+    except Exception as e:
+        print(f"Error compacting usage: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
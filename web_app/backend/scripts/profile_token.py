@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Generate a signed X-Profile header value
+Requests sent with it are profiled (see api/profiling.py); PROFILE_SECRET
+must match the server's
+
+Usage:
+    PROFILE_SECRET=... python scripts/profile_token.py
+    PROFILE_SECRET=... python scripts/profile_token.py --minutes 30
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.profiling import PROFILE_SECRET, sign_profile_token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--minutes", type=int, default=10, help="how long the token stays valid")
+    args = parser.parse_args()
+
+    if not PROFILE_SECRET:
+        print("PROFILE_SECRET is not set")
+        return 1
+
+    token = sign_profile_token(int(time.time()) + args.minutes * 60)
+    print("X-Profile: " + token)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Rescale stored attendee traits
+Recomputes the sqrt(alpha)-scaled traits and squared norms of event
+attendees scaled with other trait weights (see api/event_matching.py); run
+after activating a new model version, before matching events
+
+Usage:
+    python scripts/rescale_attendees.py
+    python scripts/rescale_attendees.py --event-id <uuid>
+"""
+
+import argparse
+import sys
+import uuid
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.connection import SessionLocal
+from api.event_matching import refresh_scaled_traits
+from api.v1.compatibility import get_compiled_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--event-id", type=uuid.UUID, default=None, help="only rescale this event's attendees")
+    args = parser.parse_args()
+
+    model = get_compiled_model()
+    db = SessionLocal()
+    try:
+        rows = refresh_scaled_traits(db, model, event_id=args.event_id)
+        print(f"Rescaled {rows} attendees to model version {model.version}")
+        return 0
+    except Exception as e:
+        print(f"Error rescaling attendees: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Measures cold-start cost of the backend in fresh interpreters and fails when
+it exceeds a budget, so import-time regressions show up before deploying
+
+Each run starts a new Python process that imports `app` (building it with
+create_app()) and serves one GET /health through the ASGI stack. The medians
+of the import time and of the time to the first response are checked
+against the budgets. One extra run under `python -X importtime` reports
+where import time goes, summed per top-level package.
+
+Usage:
+    python scripts/startup_benchmark.py
+    python scripts/startup_benchmark.py --runs 10 --import-budget-ms 1500
+    STARTUP_IMPORT_BUDGET_MS=2000 python scripts/startup_benchmark.py
+
+Exit code is 1 when a budget is exceeded (or a run fails), 0 otherwise.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Budgets with headroom over a warm local run; cold starts on small
+# instances are slower, so CI on such machines should raise them
+DEFAULT_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+DEFAULT_FIRST_REQUEST_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1800"))
+
+_PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+async def first_request():
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "path": "/health", "raw_path": b"/health",
+        "query_string": b"", "root_path": "", "headers": [], "scheme": "http",
+        "server": ("benchmark", 80), "client": ("127.0.0.1", 0),
+    }
+    await app.app(scope, receive, send)
+    return messages[0]["status"]
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (done - start) * 1000,
+    "status": status,
+}))
+"""
+
+
+def _run_probe(importtime: bool = False) -> Tuple[Dict, str]:
+    """One fresh interpreter; returns (probe timings, stderr)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", _PROBE]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"probe exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = process_ms
+    return timings, result.stderr
+
+
+def import_breakdown(stderr: str) -> Counter:
+    """Self import time (ms) per top-level package from -X importtime output"""
+    totals: Counter = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            totals[name.split(".")[0]] += int(self_us) / 1000
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to time (default 5)")
+    parser.add_argument("--import-budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS, help="median `import app` budget")
+    parser.add_argument("--startup-budget-ms", type=float, default=DEFAULT_FIRST_REQUEST_BUDGET_MS, help="median import + first response budget")
+    parser.add_argument("--top", type=int, default=15, help="packages to list in the import breakdown")
+    args = parser.parse_args()
+
+    try:
+        runs: List[Dict] = [_run_probe()[0] for _ in range(args.runs)]
+        _, importtime_stderr = _run_probe(importtime=True)
+    except Exception as e:
+        print(f"Error running startup probe: {e}")
+        return 1
+
+    print("Import time by top-level package (-X importtime, self ms):")
+    for package, ms in import_breakdown(importtime_stderr).most_common(args.top):
+        print(f"  {package:<32} {ms:8.1f}")
+
+    medians = {key: statistics.median(run[key] for run in runs) for key in ("import_ms", "first_request_ms", "process_ms")}
+    print(f"\nMedian over {args.runs} runs:")
+    print(f"  import app            {medians['import_ms']:8.1f} ms  (budget {args.import_budget_ms:.0f})")
+    print(f"  first response        {medians['first_request_ms']:8.1f} ms  (budget {args.startup_budget_ms:.0f})")
+    print(f"  whole process         {medians['process_ms']:8.1f} ms")
+
+    failed = []
+    if any(run["status"] != 200 for run in runs):
+        failed.append("GET /health did not return 200")
+    if medians["import_ms"] > args.import_budget_ms:
+        failed.append(f"import time {medians['import_ms']:.0f} ms over budget {args.import_budget_ms:.0f} ms")
+    if medians["first_request_ms"] > args.startup_budget_ms:
+        failed.append(f"time to first response {medians['first_request_ms']:.0f} ms over budget {args.startup_budget_ms:.0f} ms")
+
+    if failed:
+        for reason in failed:
+            print(f"❌ {reason}")
+        return 1
+    print("✅ Startup within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())